@@ -17,9 +17,14 @@ PARTICULAR PURPOSE.  See the GNU General Public License for more details.
 You should have received a copy of the GNU General Public License along with
 this program.  If not, see http://www.gnu.org/licenses/.
 
-Version: 0.5.0                                        Date: 5 July 2020
+Version: 0.5.1                                        Date: 16 October 2026
 
   Revision History
+    16 October 2026     v0.5.1
+        - loop, archive and upload processing reworked to reduce per packet
+          cost, refer to the changelog for details
+        - added skip_unchanged, gzip_file, http_server and checkpoint_file
+          config options, refer to the changelog for details
     5 July 2020         v0.5.0
         - added ability to rsync gauge-data.txt to an rsync capable server,
           thanks to John Kline
@@ -198,6 +203,37 @@ https://github.com/mcrossley/SteelSeries-Weather-Gauges/tree/master/weather_serv
     # gauge-data.txt.
     rtgd_file_name = gauge-data.txt
 
+    # Whether to also write a gzip compressed copy of gauge-data.txt, eg
+    # gauge-data.txt.gz, for serving by a web server without compressing on
+    # every request. gzip_level sets the compression level (1-9). Optional,
+    # defaults are False and 6.
+    gzip_file = False
+    gzip_level = 6
+
+    # Whether to serve the latest gauge-data.txt data from memory via a built
+    # in HTTP server. The data is available at http://<http_host>:<http_port>
+    # <http_path>. Optional, defaults are False, all interfaces, 8080 and
+    # /gauge-data.txt.
+    http_server = False
+    http_host = ''
+    http_port = 8080
+    http_path = /gauge-data.txt
+
+    # Path of the Server-Sent Events stream on the built in HTTP server. Each
+    # new snapshot is pushed to subscribers of the stream. A subscriber with
+    # more than http_events_max_pending events waiting to be sent is
+    # disconnected, http_events_max_pending must be at least 1. Optional,
+    # defaults are /events and 10. Set http_events_path to an empty string to
+    # disable the stream.
+    http_events_path = /events
+    http_events_max_pending = 10
+
+    # Subscribers to <http_events_path>?delta=1 receive a delta stream, each
+    # event contains only those fields that have changed since the previous
+    # event. A keyframe containing all fields is sent every
+    # http_delta_keyframe_interval events. Optional, default is 60.
+    http_delta_keyframe_interval = 60
+
     # Remote URL to which the gauge-data.txt data will be posted via HTTP POST.
     # Optional, omit to disable HTTP POST.
     # If remote_server_url is specified, do not specify an rsync server.
@@ -263,6 +299,31 @@ https://github.com/mcrossley/SteelSeries-Weather-Gauges/tree/master/weather_serv
     #rsync_ssh_options = "-o ConnectTimeout=1"
     #rsync_timeout = 1
     #rsync_skip_if_older_than = 4
+    #
+    # Each rsync normally opens a new ssh connection. Setting
+    # rsync_ssh_multiplex = True has ssh keep a multiplexed master connection
+    # open that is shared by each rsync, avoiding an ssh handshake per rsync.
+    #   rsync_ssh_multiplex      : True to use a multiplexed ssh master
+    #                              connection. Default is False.
+    #   rsync_control_path       : Path of the ssh master connection socket,
+    #                              must not contain spaces, quotes or
+    #                              backslashes.
+    #                              Default is /var/tmp/rtgd_ssh_%r@%h:%p
+    #   rsync_control_persist    : Seconds the idle master connection remains
+    #                              open. Default is 300.
+    #rsync_ssh_multiplex = True
+    #rsync_control_path = /var/tmp/rtgd_ssh_%r@%h:%p
+    #rsync_control_persist = 300
+
+    # Number of consecutive failed posts or rsyncs after which uploads to the
+    # remote destination are suspended. Optional, default is 3.
+    failure_threshold = 3
+
+    # Period in seconds for which uploads to a failing remote destination are
+    # suspended. The period is doubled each time a re-try fails up to a
+    # maximum of max_backoff seconds. Optional, defaults are 5 and 300.
+    backoff = 5
+    max_backoff = 300
 
     # Minimum interval (seconds) between file generation. Ideally
     # gauge-data.txt would be generated on receipt of every loop packet (there
@@ -276,6 +337,16 @@ https://github.com/mcrossley/SteelSeries-Weather-Gauges/tree/master/weather_serv
     # period). Optional, default is 0.
     min_interval =
 
+    # Whether to skip writing and uploading gauge-data.txt if nothing has
+    # changed since the last generation. Fields listed in
+    # skip_unchanged_ignore are ignored when checking for changes. An
+    # unchanged gauge-data.txt is still written at least every
+    # max_unchanged_age seconds (0 to never write an unchanged
+    # gauge-data.txt). Optional, defaults are False, 'timeUTC, date' and 60.
+    skip_unchanged = False
+    skip_unchanged_ignore = timeUTC, date
+    max_unchanged_age = 60
+
     # Number of compass points to include in WindRoseData, normally
     # 8 or 16. Optional, default 16.
     windrose_points = 16
@@ -287,6 +358,14 @@ https://github.com/mcrossley/SteelSeries-Weather-Gauges/tree/master/weather_serv
     # Binding to use for appTemp data. Optional, default 'wx_binding'.
     apptemp_binding = wx_binding
 
+    # Alltime barometer min/max and month/year to date rain are maintained
+    # incrementally from archive records. The aggregate state is saved to a
+    # checkpoint file so that a restart does not require the database to be
+    # rescanned. Relative paths are relative to WEEWX_ROOT. Each weeWX
+    # instance should use its own checkpoint file. Optional, default is no
+    # checkpoint file.
+    checkpoint_file =
+
     # The SteelSeries Weather Gauges displays the content of the gauge-data.txt
     # 'forecast' field in the scrolling text display. The RTGD service can
     # populate the 'forecast' field from a number of sources. The available 
@@ -329,6 +408,14 @@ https://github.com/mcrossley/SteelSeries-Weather-Gauges/tree/master/weather_serv
     # legitimate sensor lost contact state. Optional, default is False.
     ignore_lost_contact = False
 
+    # Additional loop packet obs for which today's low and high are to be
+    # included in gauge-data.txt, eg extra_loop_stats = extraTemp1, soilMoist1.
+    # For each obs the fields <obs>TL, <obs>TH, T<obs>TL and T<obs>TH are
+    # added, eg extraTemp1TL. Values are converted to the gauge-data.txt units
+    # for the obs unit group where there is one. Optional, default is no
+    # additional obs.
+    extra_loop_stats =
+
     # Parameters used in/required by rtgd calculations
     [[Calculate]]
         # Atmospheric transmission coefficient [0.7-0.91]. Optional, default
@@ -591,21 +678,28 @@ Handy things/conditions noted from analysis of SteelSeries Weather Gauges:
 """
 
 # python imports
+import bisect
+import collections
 import datetime
 import errno
+import gzip
 import json
 import logging
 import math
+import operator
 import os
 import os.path
 import socket
+import subprocess
 import threading
 import time
 
 # Python 2/3 compatibility shims
 import six
+from six.moves import BaseHTTPServer
 from six.moves import http_client
 from six.moves import queue
+from six.moves import socketserver
 from six.moves import urllib
 
 # weeWX imports
@@ -623,10 +717,14 @@ from weeutil.weeutil import to_bool, to_int, startOfDay, max_with_none, min_with
 log = logging.getLogger(__name__)
 
 # version number of this script
-RTGD_VERSION = '0.5.0'
+RTGD_VERSION = '0.5.1'
 # version number (format) of the generated gauge-data.txt
 GAUGE_DATA_VERSION = '14'
 
+# number of bits an exact_value() is scaled by, every finite float is an
+# integer multiple of 2**-1074
+EXACT_SCALE_BITS = 1074
+
 # ordinal compass points supported
 COMPASS_POINTS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
                   'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW', 'N']
@@ -667,6 +765,18 @@ STATION_LOST_CONTACT = {'Vantage': {'field': 'rxCheckPercent', 'value': 0},
 ARCHIVE_STATIONS = ['Vantage']
 # stations supporting lost contact reporting through their loop packet
 LOOP_STATIONS = ['FineOffsetUSB']
+# loop packet obs for which loop period lows (min) and highs (max) are tracked
+LOOP_STATS = [('outTemp', 'min'), ('outTemp', 'max'),
+              ('inTemp', 'min'), ('inTemp', 'max'),
+              ('dewpoint', 'min'), ('dewpoint', 'max'),
+              ('appTemp', 'min'), ('appTemp', 'max'),
+              ('windchill', 'min'),
+              ('heatindex', 'max'),
+              ('barometer', 'min'), ('barometer', 'max'),
+              ('rainRate', 'max'),
+              ('outHumidity', 'min'), ('outHumidity', 'max'),
+              ('UV', 'max'),
+              ('radiation', 'max')]
 
 
 # ============================================================================
@@ -689,7 +799,9 @@ class RealtimeGaugeData(StdService):
     The RealtimeGaugeData class creates and controls a threaded object of class
     RealtimeGaugeDataThread that generates gauge-data.txt. Class
     RealtimeGaugeData feeds the RealtimeGaugeDataThread object with data via an
-    instance of queue.Queue.
+    instance of queue.Queue. The same queue is used by the scroller text block
+    to pass scroller text to the RealtimeGaugeDataThread object so that the
+    RealtimeGaugeDataThread object has a single inbox.
     """
 
     def __init__(self, engine, config_dict):
@@ -701,7 +813,6 @@ class RealtimeGaugeData(StdService):
         rtgd_config_dict = config_dict.get('RealtimeGaugeData', {})
         manager_dict = weewx.manager.get_manager_dict_from_config(config_dict,
                                                                   'wx_binding')
-        self.db_manager = weewx.manager.open_manager(manager_dict)
 
         # get a source object that will provide the scroller text
         self.source = self.source_factory(config_dict, rtgd_config_dict, engine)
@@ -710,26 +821,21 @@ class RealtimeGaugeData(StdService):
         # get an instance of class RealtimeGaugeDataThread and start the
         # thread running
         self.rtgd_thread = RealtimeGaugeDataThread(self.rtgd_ctl_queue,
-                                                   self.result_queue,
                                                    config_dict,
                                                    manager_dict,
                                                    latitude=engine.stn_info.latitude_f,
                                                    longitude=engine.stn_info.longitude_f,
                                                    altitude=convert(engine.stn_info.altitude_vt, 'meter').value)
         self.rtgd_thread.start()
+        # the loop packet fields used by the rtgd thread
+        self.packet_fields = self.rtgd_thread.packet_fields
 
-        # are we providing month and/or year to date rain, default is no we are 
-        # not
-        self.mtd_rain = to_bool(rtgd_config_dict.get('mtd_rain', False))
-        self.ytd_rain = to_bool(rtgd_config_dict.get('ytd_rain', False))
-        
         # bind our self to the relevant weeWX events
         self.bind(weewx.NEW_LOOP_PACKET, self.new_loop_packet)
         self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
         self.bind(weewx.END_ARCHIVE_PERIOD, self.end_archive_period)
 
         self.source_ctl_queue = None
-        self.result_queue = None
 
     def source_factory(self, config_dict, rtgd_config_dict, engine):
         """Factory to produce a block object."""
@@ -747,23 +853,30 @@ class RealtimeGaugeData(StdService):
             # scroller text.
             log.info("Unknown block specified for scroller_text")
             source_class = Source
-        # create queues for passing data and controlling our block object
+        # create a queue for controlling our block object, the block object
+        # passes data to the rtgd thread via the rtgd queue
         self.source_ctl_queue = queue.Queue()
-        self.result_queue = queue.Queue()
         # get the block object
         source_object = source_class(self.source_ctl_queue,
-                                     self.result_queue,
+                                     self.rtgd_ctl_queue,
                                      engine,
                                      config_dict)
         return source_object
 
     def new_loop_packet(self, event):
-        """Puts new loop packets in the rtgd queue."""
+        """Puts new loop packets in the rtgd queue.
+
+        Only those loop packet fields used by the rtgd thread are queued. As
+        the queued packet is a new dict the rtgd thread may use it without
+        copying it.
+        """
 
+        _packet = event.packet
         # package the loop packet in a dict since this is not the only data
         # we send via the queue
         _package = {'type': 'loop',
-                    'payload': event.packet}
+                    'payload': dict((obs, _packet[obs]) for obs in self.packet_fields
+                                    if obs in _packet)}
         self.rtgd_ctl_queue.put(_package)
         if weewx.debug == 2:
             log.debug("queued loop packet (%s)" % _package['payload']['dateTime'])
@@ -771,7 +884,12 @@ class RealtimeGaugeData(StdService):
             log.debug("queued loop packet: %s" % _package['payload'])
 
     def new_archive_record(self, event):
-        """Puts archive records in the rtgd queue."""
+        """Puts archive records in the rtgd queue.
+
+        Any database aggregation required as a result of the new archive
+        record is performed by the rtgd thread so as to not delay the weeWX
+        engine.
+        """
 
         # package the archive record in a dict since this is not the only data
         # we send via the queue
@@ -782,50 +900,7 @@ class RealtimeGaugeData(StdService):
             log.debug("queued archive record (%s)" % _package['payload']['dateTime'])
         elif weewx.debug >= 3:
             log.debug("queued archive record: %s" % _package['payload'])
-        # get alltime min max baro and put in the queue
-        # get the min and max values (incl usUnits)
-        _minmax_baro = self.get_minmax_obs('barometer')
-        # if we have some data then package it in a dict since this is not the
-        # only data we send via the queue
-        if _minmax_baro:
-            _package = {'type': 'stats',
-                        'payload': _minmax_baro}
-            self.rtgd_ctl_queue.put(_package)
-            if weewx.debug == 2:
-                log.debug("queued min/max barometer values")
-            elif weewx.debug >= 3:
-                log.debug("queued min/max barometer values: %s" % _package['payload'])
-        # if required get updated month to date rainfall and put in the queue
-        if self.mtd_rain:
-            _tspan = weeutil.weeutil.archiveMonthSpan(event.record['dateTime']) 
-            _rain = self.get_rain(_tspan)
-            # if we have some data then package it in a dict since this is not the
-            # only data we send via the queue
-            if _rain:
-                _payload = {'month_rain': _rain}
-                _package = {'type': 'stats',
-                            'payload': _payload}
-                self.rtgd_ctl_queue.put(_package)
-                if weewx.debug == 2:
-                    log.debug("queued month to date rain")
-                elif weewx.debug >= 3:
-                    log.debug("queued month to date rain: %s" % _package['payload'])
-        # if required get updated year to date rainfall and put in the queue
-        if self.ytd_rain:
-            _tspan = weeutil.weeutil.archiveYearSpan(event.record['dateTime']) 
-            _rain = self.get_rain(_tspan)
-            # if we have some data then package it in a dict since this is not the
-            # only data we send via the queue
-            if _rain:
-                _payload = {'year_rain': _rain}
-                _package = {'type': 'stats',
-                            'payload': _payload}
-                self.rtgd_ctl_queue.put(_package)
-                if weewx.debug == 2:
-                    log.debug("queued year to date rain")
-                elif weewx.debug >= 3:
-                    log.debug("queued year to date rain: %s" % _package['payload'])
-    
+
     def end_archive_period(self, event):
         """Puts END_ARCHIVE_PERIOD event in the rtgd queue."""
 
@@ -871,32 +946,6 @@ class RealtimeGaugeData(StdService):
             else:
                 log.debug("Shut down %s thread." % self.source_thread.name)
 
-    def get_minmax_obs(self, obs_type):
-        """Obtain the alltime max/min values for an observation."""
-
-        # create an interpolation dict
-        inter_dict = {'table_name': self.db_manager.table_name,
-                      'obs_type': obs_type}
-        # the query to be used
-        minmax_sql = "SELECT MIN(min), MAX(max) FROM %(table_name)s_day_%(obs_type)s"
-        # execute the query
-        _row = self.db_manager.getSql(minmax_sql % inter_dict)
-        if not _row or None in _row:
-            return {'min_%s' % obs_type: None,
-                    'max_%s' % obs_type: None}
-        else:
-            return {'min_%s' % obs_type: _row[0],
-                    'max_%s' % obs_type: _row[1]}
-
-    def get_rain(self, tspan):
-        """Calculate rainfall over a given timespan."""
-
-        _result = {}
-        _rain_vt = self.db_manager.getAggregate(tspan, 'rain', 'sum')
-        if _rain_vt:
-            return _rain_vt
-        else:
-            return None
 
 # ============================================================================
 #                       class RealtimeGaugeDataThread
@@ -906,7 +955,7 @@ class RealtimeGaugeData(StdService):
 class RealtimeGaugeDataThread(threading.Thread):
     """Thread that generates gauge-data.txt in near realtime."""
 
-    def __init__(self, control_queue, result_queue, config_dict, manager_dict,
+    def __init__(self, control_queue, config_dict, manager_dict,
                  latitude, longitude, altitude):
         # Initialize my superclass:
         threading.Thread.__init__(self)
@@ -916,7 +965,18 @@ class RealtimeGaugeDataThread(threading.Thread):
         self.setDaemon(True)
 
         self.control_queue = control_queue
-        self.result_queue = result_queue
+        # number of times the thread has woken to process a package
+        self.wake_count = 0
+        # number of loop packets coalesced into a newer packet and dropped
+        # when processing a backlog
+        self.coalesced_count = 0
+        self.dropped_count = 0
+        # number of loop packets ingested and number of times gauge-data.txt
+        # has been generated
+        self.ingested_count = 0
+        self.generated_count = 0
+        # timestamp of the last loop packet processed
+        self.last_packet_ts = None
         self.config_dict = config_dict
         self.manager_dict = manager_dict
 
@@ -926,6 +986,20 @@ class RealtimeGaugeDataThread(threading.Thread):
         # setup file generation timing
         self.min_interval = rtgd_config_dict.get('min_interval', None)
         self.last_write = 0  # ts (actual) of last generation
+        # Optionally skip writing and uploading gauge-data.txt if nothing other
+        # than the ignored (timestamp) fields has changed since the last
+        # generation. An unchanged snapshot is still written at least every
+        # max_unchanged_age seconds so clients do not see the data as stale.
+        self.skip_unchanged = to_bool(rtgd_config_dict.get('skip_unchanged', False))
+        self.skip_unchanged_ignore = set(weeutil.weeutil.option_as_list(
+            rtgd_config_dict.get('skip_unchanged_ignore', ['timeUTC', 'date'])))
+        self.max_unchanged_age = to_int(rtgd_config_dict.get('max_unchanged_age', 60))
+        # fingerprint of the last snapshot generated
+        self.last_fingerprint = None
+        # serialiser used to encode each snapshot once for all outputs
+        self.encoder = SnapshotEncoder()
+        # number of unchanged snapshots that were skipped
+        self.unchanged_count = 0
 
         # get our file paths and names
         _path = rtgd_config_dict.get('rtgd_path', '/var/tmp')
@@ -937,6 +1011,15 @@ class RealtimeGaugeDataThread(threading.Thread):
                                            rtgd_config_dict.get('rtgd_file_name',
                                                                 'gauge-data.txt'))
         self.rtgd_path_file_tmp = self.rtgd_path_file + '.tmp'
+        # optionally write a gzip compressed copy of our file, eg for serving
+        # by a web server without compressing on every request
+        self.gzip_file = to_bool(rtgd_config_dict.get('gzip_file', False))
+        self.gzip_level = to_int(rtgd_config_dict.get('gzip_level', 6))
+        if not 1 <= self.gzip_level <= 9:
+            log.error("Invalid gzip_level '%s', using 6" % self.gzip_level)
+            self.gzip_level = 6
+        self.rtgd_path_gz = self.rtgd_path_file + '.gz'
+        self.rtgd_path_gz_tmp = self.rtgd_path_gz + '.tmp'
 
         # get the remote server URL if it exists, if it doesn't set it to None
         self.remote_server_url = rtgd_config_dict.get('remote_server_url', None)
@@ -944,6 +1027,11 @@ class RealtimeGaugeDataThread(threading.Thread):
         self.timeout = to_int(rtgd_config_dict.get('timeout', 2))
         # response text from remote URL if post was successful
         self.response = rtgd_config_dict.get('response_text', None)
+        # HTTP client used to post to the remote URL
+        self.post_client = None
+        if self.remote_server_url is not None:
+            self.post_client = KeepAliveHttpClient(self.remote_server_url,
+                                                   timeout=self.timeout)
 
         # get server/user/remote_rtgd_path for rsync if they exist;
         # else set to None.
@@ -968,6 +1056,75 @@ class RealtimeGaugeDataThread(threading.Thread):
                 self.rsync_timeout = rtgd_config_dict.get('rsync_timeout', None)
                 self.rsync_skip_if_older_than = to_int(rtgd_config_dict.get(
                     'rsync_skip_if_older_than', 4))
+                # Optionally have ssh keep a multiplexed master connection open
+                # so that each rsync does not incur an ssh handshake. The
+                # master connection persists between rsyncs and is closed when
+                # the thread exits.
+                self.rsync_ssh_multiplex = to_bool(rtgd_config_dict.get(
+                    'rsync_ssh_multiplex', False))
+                self.rsync_control_path = rtgd_config_dict.get(
+                    'rsync_control_path', '/var/tmp/rtgd_ssh_%r@%h:%p')
+                # the control path is passed to ssh within the rsync -e option
+                # string and then parsed again by ssh so it cannot be safely
+                # quoted, do not multiplex if it contains spaces, quotes or
+                # backslashes
+                if self.rsync_ssh_multiplex and any(c.isspace() or c in '\'"\\'
+                                                    for c in self.rsync_control_path):
+                    log.error("Invalid rsync_control_path '%s', must not contain spaces, quotes or backslashes. "
+                              "Multiplexed ssh connection disabled" % self.rsync_control_path)
+                    self.rsync_ssh_multiplex = False
+                if self.rsync_ssh_multiplex:
+                    _persist = to_int(rtgd_config_dict.get(
+                        'rsync_control_persist', 300))
+                    self.rsync_ssh_options = ' '.join([self.rsync_ssh_options,
+                                                       '-o ControlMaster=auto',
+                                                       '-o ControlPath=%s' % self.rsync_control_path,
+                                                       '-o ControlPersist=%d' % _persist])
+                # most recent rsync latencies in seconds
+                self.rsync_latencies = collections.deque(maxlen=1000)
+                # number of successful rsyncs
+                self.rsync_count = 0
+
+        # Failing remote destinations are not re-tried until a backoff period
+        # has expired. The backoff period doubles on each failed re-try.
+        _threshold = to_int(rtgd_config_dict.get('failure_threshold', 3))
+        _backoff = to_int(rtgd_config_dict.get('backoff', 5))
+        _max_backoff = to_int(rtgd_config_dict.get('max_backoff', 300))
+        self.post_breaker = CircuitBreaker('rtgd post', threshold=_threshold,
+                                           backoff=_backoff,
+                                           max_backoff=_max_backoff)
+        self.rsync_breaker = CircuitBreaker('rtgd rsync', threshold=_threshold,
+                                            backoff=_backoff,
+                                            max_backoff=_max_backoff)
+        # optionally serve the latest snapshot from memory via HTTP
+        self.snapshot_server = None
+        if to_bool(rtgd_config_dict.get('http_server', False)):
+            _http_port = to_int(rtgd_config_dict.get('http_port', 8080))
+            try:
+                self.snapshot_server = SnapshotServer(host=rtgd_config_dict.get('http_host', ''),
+                                                      port=_http_port,
+                                                      path=rtgd_config_dict.get('http_path',
+                                                                                '/gauge-data.txt'),
+                                                      events_path=rtgd_config_dict.get('http_events_path',
+                                                                                       '/events'),
+                                                      max_pending=to_int(rtgd_config_dict.get('http_events_max_pending',
+                                                                                              10)),
+                                                      keyframe_interval=to_int(rtgd_config_dict.get('http_delta_keyframe_interval',
+                                                                                                    60)))
+            except (socket.error, OSError) as e:
+                # the HTTP server is optional, do not let a failure to bind
+                # stop weeWX from starting
+                log.error("Unable to start HTTP server on port %s: %s" % (_http_port, e))
+                self.snapshot_server = None
+        # Uploads are performed by separate threads so that a slow or
+        # unreachable remote does not stall generation. Each thread only ever
+        # uploads the latest data submitted.
+        self.post_thread = None
+        if self.remote_server_url is not None:
+            self.post_thread = UploadThread('RtgdPostThread', self.post_data)
+        self.rsync_thread = None
+        if self.rsync_server is not None:
+            self.rsync_thread = UploadThread('RtgdRsyncThread', self.rsync_data)
 
         # get windrose settings
         try:
@@ -1061,12 +1218,27 @@ class RealtimeGaugeDataThread(threading.Thread):
         self.alt_format = rtgd_config_dict['StringFormats'].get(self.alt_group,
                                                                 '%.1f')
         self.flag_format = '%.0f'
+        # gauge-data.txt units and formats for each weeWX unit group, used for
+        # any extra_loop_stats obs
+        self.group_units = {'group_temperature': (self.temp_group, self.temp_format),
+                            'group_percent': (self.hum_group, self.hum_format),
+                            'group_pressure': (self.pres_group, self.pres_format),
+                            'group_speed': (self.wind_group, self.wind_format),
+                            'group_rain': (self.rain_group, self.rain_format),
+                            'group_rainrate': (self.rainrate_group, self.rainrate_format),
+                            'group_direction': (self.dir_group, self.dir_format),
+                            'group_radiation': (self.rad_group, self.rad_format),
+                            'group_uv': (self.uv_group, self.uv_format),
+                            'group_altitude': (self.alt_group, self.alt_format)}
 
         # what units are incoming packets using
         self.packet_units = None
+        # unit conversions from our packet units to our output units, compiled
+        # when the packet units are known
+        self.conv = None
 
         # get max cache age
-        self.max_cache_age = rtgd_config_dict.get('max_cache_age', 600)
+        self.max_cache_age = to_int(rtgd_config_dict.get('max_cache_age', 600))
 
         # initialise last wind directions for use when respective direction is
         # None. We need latest and average
@@ -1086,8 +1258,14 @@ class RealtimeGaugeDataThread(threading.Thread):
         self.apptemp_binding = rtgd_config_dict.get('apptemp_binding',
                                                     'wx_binding')
 
+        # additional loop packet obs for which we provide today's low and high
+        self.extra_loop_stats = [_obs for _obs in weeutil.weeutil.option_as_list(
+            rtgd_config_dict.get('extra_loop_stats', [])) if _obs]
+        # unit conversions and formats for our extra_loop_stats obs, compiled
+        # when the packet units are known
+        self.extra_conv = []
         # create a RtgdBuffer object to hold our loop 'stats'
-        self.buffer = RtgdBuffer()
+        self.buffer = RtgdBuffer(self.extra_loop_stats)
 
         # Lost contact
         # do we ignore the lost contact 'calculation'
@@ -1104,11 +1282,20 @@ class RealtimeGaugeDataThread(threading.Thread):
 
         self.db_manager = None
         self.apptemp_manager = None
+        # timestamp of the most recent archive record
+        self.last_archive_ts = None
+        # number of database queries made when processing the most recent
+        # loop packet, the steady state loop packet path should make none
+        self.packet_db_queries = 0
         self.day_stats = None
         self.apptemp_day_stats = None
 
         self.packet_cache = None
 
+        # create an ArchiveCache object to hold recent archive records for
+        # use in trend calculations
+        self.archive_cache = ArchiveCache()
+
         # initialise packet obs types and unit groups
         self.p_temp_type = None
         self.p_temp_group = None
@@ -1123,6 +1310,8 @@ class RealtimeGaugeDataThread(threading.Thread):
         self.p_alt_type = None
         self.p_alt_group = None
 
+        # create a WindroseAccumulator to maintain our windrose data
+        self.windrose = WindroseAccumulator(self.wr_period, self.wr_points)
         self.rose = None
 
         # initialise the scroller text
@@ -1133,6 +1322,17 @@ class RealtimeGaugeDataThread(threading.Thread):
         self.longitude = longitude
         self.altitude_m = altitude
         self.station_type = config_dict['Station']['station_type']
+        # the field used to determine lost sensor contact, if any
+        if not self.ignore_lost_contact and self.station_type in STATION_LOST_CONTACT:
+            self.lost_contact_obs = [STATION_LOST_CONTACT[self.station_type]['field']]
+        else:
+            self.lost_contact_obs = []
+        # the loop packet fields used to generate our output, the
+        # RealtimeGaugeData service only passes us these fields
+        self.packet_fields = ['dateTime', 'usUnits']
+        for _obs in CachedPacket.OBS + RtgdBuffer.OBS + self.extra_loop_stats + self.lost_contact_obs:
+            if _obs not in self.packet_fields:
+                self.packet_fields.append(_obs)
 
         # gauge-data.txt version
         self.version = str(GAUGE_DATA_VERSION)
@@ -1148,6 +1348,16 @@ class RealtimeGaugeDataThread(threading.Thread):
         if self.ytd_rain:
             self.year_rain = None
 
+        # create an AggregateStore object to maintain our alltime and to date
+        # aggregates, month and year to date rain are only maintained if they
+        # are being provided, get the checkpoint file to be used if any
+        _checkpoint = rtgd_config_dict.get('checkpoint_file')
+        if _checkpoint:
+            _checkpoint = os.path.join(config_dict['WEEWX_ROOT'], _checkpoint)
+        self.aggregates = AggregateStore(_checkpoint if _checkpoint else None,
+                                         month_rain=self.mtd_rain,
+                                         year_rain=self.ytd_rain)
+
         # notify the user of a couple of things that we will do
         # frequency of generation
         if self.min_interval is None:
@@ -1177,34 +1387,49 @@ class RealtimeGaugeDataThread(threading.Thread):
         # running in a thread we need to wait until the thread is actually
         # running before getting db managers
 
-        # get a db manager
-        self.db_manager = weewx.manager.open_manager(self.manager_dict)
+        # start our upload and HTTP server threads
+        for _thread in (self.post_thread, self.rsync_thread, self.snapshot_server):
+            if _thread is not None:
+                _thread.start()
+
+        # get a db manager, wrap it so we can count our database queries
+        self.db_manager = DbQueryCounter(weewx.manager.open_manager(self.manager_dict))
         # get a db manager for appTemp
-        self.apptemp_manager = weewx.manager.open_manager_with_config(self.config_dict,
-                                                                      self.apptemp_binding)
+        self.apptemp_manager = DbQueryCounter(weewx.manager.open_manager_with_config(self.config_dict,
+                                                                                     self.apptemp_binding))
         # initialise our day stats
         self.day_stats = self.db_manager._get_day_summary(time.time())
         # initialise our day stats from our appTemp block
         self.apptemp_day_stats = self.apptemp_manager._get_day_summary(time.time())
+        # initialise our alltime and to date aggregates
+        self.aggregates.setup(self.db_manager, self.day_stats)
+        self.process_aggregates()
         # get a windrose to start with since it is only on receipt of an
-        # archive record
-        self.rose = calc_windrose(int(time.time()),
-                                  self.db_manager,
-                                  self.wr_period,
-                                  self.wr_points)
+        # archive record, the windrose accumulator is seeded once from the
+        # database and then maintained from archive records
+        self.windrose.prime(self.db_manager, int(time.time()))
+        self.rose = self.windrose.get_rose()
         if weewx.debug == 2:
             log.debug("windrose data calculated")
         elif weewx.debug >= 3:
             log.debug("windrose data calculated: %s" % (self.rose,))
+        # prime our archive record cache with recent archive records
+        self.archive_cache.prime(self.db_manager, int(time.time()))
+        if weewx.debug == 2:
+            log.debug("archive record cache initialised")
         # setup our loop cache and set some starting wind values
         _ts = self.db_manager.lastGoodStamp()
+        # save the timestamp of the last archive record, we will track this
+        # ourselves from now on
+        self.last_archive_ts = _ts
         if _ts is not None:
             _rec = self.db_manager.getRecord(_ts)
         else:
             _rec = {'usUnits': None}
         # get a CachedPacket object as our loop packet cache and prime it with
-        # values from the last good archive record if available
-        self.packet_cache = CachedPacket(_rec)
+        # values from the last good archive record if available, the cache
+        # also needs to convert our lost contact field if we are using it
+        self.packet_cache = CachedPacket(_rec, extra_obs=self.lost_contact_obs)
         if weewx.debug == 2:
             log.debug("loop packet cache initialised")
         # save the windSpeed value to use as our archive period average, this
@@ -1215,147 +1440,260 @@ class RealtimeGaugeDataThread(threading.Thread):
         if 'windDir' in _rec:
             self.windDirAvg = _rec['windDir']
 
-        # now run a continuous loop, waiting for records to appear in the rtgd
-        # queue then processing them.
+        # now process packages from the rtgd queue until told to stop
+        self.process_queue()
+
+    def process_queue(self):
+        """Process packages from the rtgd queue until a None package is received.
+
+        Runs a continuous loop, waiting for packages to appear in the rtgd
+        queue then processing them. The rtgd queue is our only inbox; loop
+        packets, archive records, events, stats, scroller text and the
+        shutdown signal all arrive via the rtgd queue so we can block until
+        there is something to do.
+        """
+
         while True:
-            # inner loop to monitor the queues
+            # block until we receive a package
+            _packages = [self.control_queue.get()]
+            self.wake_count += 1
+            # If packages have backed up in the queue gather them as well. No
+            # package is discarded; every package is processed in order, but
+            # only the newest loop packet is used to generate output.
             while True:
-                # If we have a result queue check to see if we have received
-                # any forecast data. Use get_nowait() so we don't block the
-                # rtgd control queue. Wrap in a try..except to catch the error
-                # if there is nothing in the queue.
-                if self.result_queue:
-                    try:
-                        # use nowait() so we don't block
-                        _package = self.result_queue.get_nowait()
-                    except queue.Empty:
-                        # nothing in the queue so continue
-                        pass
-                    else:
-                        # we did get something in the queue but was it a
-                        # 'forecast' package
-                        if isinstance(_package, dict):
-                            if 'type' in _package and _package['type'] == 'forecast':
-                                # we have forecast text so log and save it
-                                if weewx.debug == 2:
-                                    log.debug("received forecast text: %s" % _package['payload'])
-                                self.scroller_text = _package['payload']
-                # now deal with the control queue
                 try:
-                    # block for one second waiting for package, if nothing
-                    # received throw queue.Empty
-                    _package = self.control_queue.get(True, 1.0)
+                    _packages.append(self.control_queue.get_nowait())
                 except queue.Empty:
-                    # nothing in the queue so continue
-                    pass
-                else:
-                    # a None record is our signal to exit
-                    if _package is None:
-                        return
-                    elif _package['type'] == 'archive':
-                        if weewx.debug == 2:
-                            log.debug("received archive record (%s)" % _package['payload']['dateTime'])
-                        elif weewx.debug >= 3:
-                            log.debug("received archive record: %s" % _package['payload'])
-                        self.new_archive_record(_package['payload'])
-                        self.rose = calc_windrose(_package['payload']['dateTime'],
-                                                  self.db_manager,
-                                                  self.wr_period,
-                                                  self.wr_points)
-                        if weewx.debug == 2:
-                            log.debug("windrose data calculated")
-                        elif weewx.debug >= 3:
-                            log.debug("windrose data calculated: %s" % (self.rose,))
-                        continue
-                    elif _package['type'] == 'event':
-                        if _package['payload'] == weewx.END_ARCHIVE_PERIOD:
-                            if weewx.debug == 2:
-                                log.debug("received event - END_ARCHIVE_PERIOD")
-                            self.end_archive_period()
-                        continue
-                    elif _package['type'] == 'stats':
+                    break
+            # find the newest loop packet in the backlog
+            _batch = []
+            _newest_loop = None
+            for _idx, _package in enumerate(_packages):
+                if _package is not None and _package['type'] == 'loop':
+                    _newest_loop = _idx
+            for _idx, _package in enumerate(_packages):
+                # a None record is our signal to exit
+                if _package is None:
+                    self.stop_outputs()
+                    return
+                elif _package['type'] == 'forecast':
+                    # we have forecast text so log and save it
+                    if weewx.debug == 2:
+                        log.debug("received forecast text: %s" % _package['payload'])
+                    self.scroller_text = _package['payload']
+                elif _package['type'] == 'archive':
+                    if weewx.debug == 2:
+                        log.debug("received archive record (%s)" % _package['payload']['dateTime'])
+                    elif weewx.debug >= 3:
+                        log.debug("received archive record: %s" % _package['payload'])
+                    self.new_archive_record(_package['payload'])
+                    self.windrose.add_record(_package['payload'])
+                    self.rose = self.windrose.get_rose()
+                    if weewx.debug == 2:
+                        log.debug("windrose data calculated")
+                    elif weewx.debug >= 3:
+                        log.debug("windrose data calculated: %s" % (self.rose,))
+                elif _package['type'] == 'event':
+                    if _package['payload'] == weewx.END_ARCHIVE_PERIOD:
                         if weewx.debug == 2:
-                            log.debug("received stats package")
-                        elif weewx.debug >= 3:
-                            log.debug("received stats package: %s" % _package['payload'])
-                        self.process_stats(_package['payload'])
+                            log.debug("received event - END_ARCHIVE_PERIOD")
+                        self.end_archive_period()
+                elif _package['type'] == 'stats':
+                    if weewx.debug == 2:
+                        log.debug("received stats package")
+                    elif weewx.debug >= 3:
+                        log.debug("received stats package: %s" % _package['payload'])
+                    self.process_stats(_package['payload'])
+                elif _package['type'] == 'loop':
+                    if weewx.debug == 2:
+                        log.debug("received loop packet (%s)" % _package['payload']['dateTime'])
+                    elif weewx.debug >= 3:
+                        log.debug("received loop packet: %s" % _package['payload'])
+                    _batch.append(_package['payload'])
+                    # consecutive loop packets are processed as a single
+                    # batch, keep gathering unless this is the last loop
+                    # packet in a run
+                    _next = _packages[_idx + 1] if _idx + 1 < len(_packages) else None
+                    if _next is not None and _next['type'] == 'loop':
                         continue
-                    elif _package['type'] == 'loop':
-                        # we now have a packet to process, wrap in a
-                        # try..except so we can catch any errors
-                        try:
-                            if weewx.debug == 2:
-                                log.debug("received loop packet (%s)" % _package['payload']['dateTime'])
-                            elif weewx.debug >= 3:
-                                log.debug("received loop packet: %s" % _package['payload'])
-                            self.process_packet(_package['payload'])
-                            continue
-                        except Exception as e:
-                            # Some unknown exception occurred. This is probably
-                            # a serious problem. Exit.
-                            log.critical("Unexpected exception of type %s" % (type(e), ))
-                            weeutil.logger.log_traceback(log.critical, "    ****  ")
-                            log.critical("Thread exiting. Reason: %s" % (e, ))
-                            return
-                # if packets have backed up in the control queue, trim it until
-                # it's no bigger than the max allowed backlog
-                while self.control_queue.qsize() > 5:
-                    self.control_queue.get()
-
-    def process_packet(self, packet):
-        """Process incoming loop packets and generate gauge-data.txt.
+                    # we now have a batch to process, wrap in a try..except
+                    # so we can catch any errors
+                    try:
+                        self.process_packets(_batch, generate=_idx == _newest_loop)
+                        _batch = []
+                    except Exception as e:
+                        # Some unknown exception occurred. This is probably
+                        # a serious problem. Exit.
+                        log.critical("Unexpected exception of type %s" % (type(e), ))
+                        weeutil.logger.log_traceback(log.critical, "    ****  ")
+                        log.critical("Thread exiting. Reason: %s" % (e, ))
+                        self.stop_outputs()
+                        return
+
+    def stop_outputs(self):
+        """Stop any upload and HTTP server threads.
+
+        Also closes any remote connections.
+        """
+
+        if self.snapshot_server is not None:
+            self.snapshot_server.stop()
+
+        for _thread in (self.post_thread, self.rsync_thread):
+            if _thread is not None:
+                _thread.stop(self.timeout + 1)
+        if self.post_client is not None:
+            self.post_client.close()
+        if self.rsync_server is not None and self.rsync_ssh_multiplex:
+            self.close_ssh_master()
+
+    def process_packet(self, packet, generate=True):
+        """Process an incoming loop packet and generate gauge-data.txt.
+
+        Input:
+            packet:   dict containing the loop packet to be processed
+            generate: whether the packet may be used to generate output
+        """
+
+        self.process_packets([packet], generate=generate)
+
+    def process_packets(self, packets, generate=True):
+        """Process a batch of loop packets and generate gauge-data.txt once.
+
+        Every loop packet in the batch is used to update the packet cache and
+        loop buffer, but only the newest packet is used to generate output.
+        The remaining packets are coalesced. Loop packets that are older than
+        the last loop packet processed are dropped.
 
         Input:
-            packet: dict containing the loop packet to be processed
+            packets:  list of loop packet dicts in dateTime order
+            generate: whether the batch may be used to generate output
         """
 
         # get time for debug timing
         t1 = time.time()
+        # get the number of database queries made so far
+        _queries = self.db_query_count()
+        # ingest each packet in the batch
+        newest = None
+        for packet in packets:
+            if self.ingest_packet(packet):
+                self.ingested_count += 1
+                if newest is not None:
+                    # a newer packet is waiting so coalesce this packet
+                    self.coalesced_count += 1
+                    if weewx.debug == 2:
+                        log.debug("packet (%s) coalesced" % newest['dateTime'])
+                newest = packet
+        if newest is None:
+            # every packet was dropped so there is nothing more to do
+            return
+        # generate if we have no minimum interval setting or if minimum
+        # interval seconds have elapsed since our last generation
+        if not generate:
+            # a newer packet is waiting so coalesce this packet
+            self.coalesced_count += 1
+            if weewx.debug == 2:
+                log.debug("packet (%s) coalesced" % newest['dateTime'])
+        elif self.min_interval is None or (self.last_write + float(self.min_interval)) < time.time():
+            self.generate(newest['dateTime'], t1)
+        else:
+            # we skipped this packet so log it
+            if weewx.debug == 2:
+                log.debug("packet (%s) skipped" % newest['dateTime'])
+        # save the number of database queries made processing this batch
+        self.packet_db_queries = self.db_query_count() - _queries
+        if self.packet_db_queries > 0 and weewx.debug >= 2:
+            log.debug("%d database queries made processing packet (%s)" % (self.packet_db_queries,
+                                                                          newest['dateTime']))
+
+    def ingest_packet(self, packet):
+        """Update the packet cache and loop buffer with a loop packet.
+
+        Input:
+            packet: dict containing the loop packet to be ingested
+
+        Returns True if the packet was ingested or False if it was dropped.
+        """
+
+        # drop the packet if it is older than the last packet processed
+        if self.last_packet_ts is not None and packet['dateTime'] < self.last_packet_ts:
+            self.dropped_count += 1
+            if weewx.debug >= 2:
+                log.debug("packet (%s) dropped, older than last packet (%s)" % (packet['dateTime'],
+                                                                               self.last_packet_ts))
+            return False
+        self.last_packet_ts = packet['dateTime']
         # update the packet cache with this packet
         self.packet_cache.update(packet, packet['dateTime'])
         # do those things that must be done with every loop packet
         # ie update our lows and highs and our 5 and 10 min wind lists
         self.buffer.set_lows_and_highs(packet)
-        # generate if we have no minimum interval setting or if minimum
-        # interval seconds have elapsed since our last generation
-        if self.min_interval is None or (self.last_write + float(self.min_interval)) < time.time():
-            # TODO. Could this try..except be reduced in scope
-            try:
-                # get a cached packet
-                cached_packet = self.packet_cache.get_packet(packet['dateTime'],
-                                                             self.max_cache_age)
-                if weewx.debug == 2:
-                    log.debug("created cached loop packet (%s)" % cached_packet['dateTime'])
-                elif weewx.debug >= 3:
-                    log.debug("created cached loop packet: %s" % (cached_packet,))
-                # set our lost contact flag if applicable
-                self.lost_contact_flag = self.get_lost_contact(cached_packet, 'loop')
-                # get a data dict from which to construct our file
-                data = self.calculate(cached_packet)
-                # write to our file
-                self.write_data(data)
-                # set our write time
-                self.last_write = time.time()
-                # if required send the data to a remote URL via HTTP POST
-                if self.remote_server_url is not None:
-                    # post the data
-                    self.post_data(data)
-                # If an rsync_server is specified, rsync the data.
-                if self.rsync_server is not None:
-                    # rsync the data
-                    ts = cached_packet['dateTime']
-                    packetTime = datetime.datetime.fromtimestamp(ts)
-                    self.rsync_data(packetTime)
-                # log the generation
+        return True
+
+    def generate(self, ts, t1=None):
+        """Generate gauge-data.txt and send it to any remote destinations.
+
+        Input:
+            ts: timestamp of the newest loop packet ingested
+            t1: time processing commenced, used for debug timing
+        """
+
+        t1 = time.time() if t1 is None else t1
+        # TODO. Could this try..except be reduced in scope
+        try:
+            # get a cached packet
+            cached_packet = self.packet_cache.get_packet(ts, self.max_cache_age)
+            if weewx.debug == 2:
+                log.debug("created cached loop packet (%s)" % cached_packet['dateTime'])
+            elif weewx.debug >= 3:
+                log.debug("created cached loop packet: %s" % (cached_packet,))
+            # set our lost contact flag if applicable
+            self.lost_contact_flag = self.get_lost_contact(cached_packet, 'loop')
+            # get a data dict from which to construct our file
+            data = self.calculate(cached_packet)
+            # serialise the snapshot once for all outputs
+            snapshot = self.encoder.encode(data)
+            # skip the snapshot if nothing a client would render has changed
+            if self.skip_unchanged and not self.snapshot_changed():
+                self.unchanged_count += 1
                 if weewx.debug == 2:
-                    log.debug("gauge-data.txt (%s) generated in %.5f seconds" % (cached_packet['dateTime'],
-                                                                           (self.last_write-t1)))
-            except Exception as e:
-                weeutil.logger.log_traceback(log.info, 'rtgdthread: **** ')
-        else:
-            # we skipped this packet so log it
+                    log.debug("gauge-data.txt (%s) unchanged, skipped" % cached_packet['dateTime'])
+                return
+            # write to our file
+            self.write_data(data, snapshot)
+            # make the snapshot available to HTTP clients
+            if self.snapshot_server is not None:
+                self.snapshot_server.publish(snapshot, cached_packet['dateTime'], data)
+            # set our write time
+            self.last_write = time.time()
+            self.generated_count += 1
+            # if required queue the data to be sent to a remote URL via HTTP
+            # POST
+            if self.post_thread is not None:
+                # post the data
+                self.post_thread.submit(snapshot)
+            # If an rsync_server is specified, queue the data to be rsynced.
+            if self.rsync_thread is not None:
+                # rsync the data
+                ts = cached_packet['dateTime']
+                packetTime = datetime.datetime.fromtimestamp(ts)
+                self.rsync_thread.submit(packetTime)
+            # log the generation
             if weewx.debug == 2:
-                log.debug("packet (%s) skipped" % packet['dateTime'])
+                log.debug("gauge-data.txt (%s) generated in %.5f seconds" % (cached_packet['dateTime'],
+                                                                       (self.last_write-t1)))
+        except Exception as e:
+            weeutil.logger.log_traceback(log.info, 'rtgdthread: **** ')
+
+    def db_query_count(self):
+        """Get the total number of database queries made by the thread."""
+
+        _count = 0
+        for _manager in (self.db_manager, self.apptemp_manager):
+            if _manager is not None:
+                _count += _manager.count
+        return _count
 
     def process_stats(self, package):
         """Process a stats package.
@@ -1369,14 +1707,26 @@ class RealtimeGaugeDataThread(threading.Thread):
                 setattr(self, key, value)
 
     def rsync_data(self, packetTime):
+        """Rsync gauge-data.txt to a remote server.
+
+        Returns True if the rsync succeeded or False if it failed or was not
+        attempted.
+        """
+
         # Don't upload if more than rsync_skip_if_older_than seconds behind.
         if self.rsync_skip_if_older_than != 0:
             now = datetime.datetime.now()
             age = now - packetTime
             if age.total_seconds() > self.rsync_skip_if_older_than:
-                loginf("rsync_data",
-                    "skipping packet (%s) with age: %d" % (packetTime, age.total_seconds()))
-                return
+                log.info("rsync_data: skipping packet (%s) with age: %d" % (packetTime,
+                                                                          age.total_seconds()))
+                return False
+        # do not attempt the rsync if our destination is failing
+        _allowed = self.rsync_breaker.allow()
+        if weewx.debug >= 2 and self.rsync_breaker.checks % 100 == 0:
+            log.debug("rsync_data: circuit breaker stats: %s" % (self.rsync_breaker.stats(),))
+        if not _allowed:
+            return False
         rsync_upload = weeutil.rsyncupload.RsyncUpload(
             local_root=self.rtgd_path_file,
             remote_root=self.rsync_dest_path_file,
@@ -1388,11 +1738,44 @@ class RealtimeGaugeDataThread(threading.Thread):
             delete=False,
             log_success=self.rsync_log_success,
             timeout=self.rsync_timeout)
+        t1 = time.time()
         try:
             rsync_upload.run()
-        except IOError as e:
-            (cl, unused_ob, unused_tr) = sys.exc_info()
-            log.error("rtgd.rsync_data: Caught exception %s: %s" % (cl, e))
+        except (IOError, OSError) as e:
+            log.error("rtgd.rsync_data: Caught exception %s: %s" % (type(e), e))
+            self.rsync_breaker.failure()
+            return False
+        else:
+            self.rsync_breaker.success()
+            self.rsync_latencies.append(time.time() - t1)
+            self.rsync_count += 1
+            if weewx.debug == 2:
+                log.debug("rsync_data: rsync'd %s in %.3f seconds" % (packetTime,
+                                                                     self.rsync_latencies[-1]))
+            if weewx.debug >= 2 and self.rsync_count % 100 == 0:
+                log.debug("rsync_data: latency percentiles: %s" % (calc_percentiles(self.rsync_latencies),))
+            return True
+
+    def close_ssh_master(self):
+        """Close any multiplexed ssh master connection used by rsync."""
+
+        _dest = self.rsync_server
+        if self.rsync_user:
+            _dest = '@'.join([self.rsync_user, self.rsync_server])
+        cmd = ['ssh']
+        if self.rsync_port:
+            cmd.extend(['-p', str(self.rsync_port)])
+        cmd.extend(['-o', 'ControlPath=%s' % self.rsync_control_path,
+                    '-O', 'exit', _dest])
+        try:
+            _ssh = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            _output = _ssh.communicate()[0]
+        except OSError as e:
+            log.error("rtgd: Unable to close ssh master connection: %s" % e)
+        else:
+            if weewx.debug >= 2:
+                log.debug("rtgd: ssh master connection exit: %s" % _output.decode('utf-8', 'replace').strip())
 
     def post_data(self, data):
         """Post data to a remote URL via HTTP POST.
@@ -1402,22 +1785,28 @@ class RealtimeGaugeDataThread(threading.Thread):
         remote posts are not working then the user should set debug=1 and
         restart weeWX to see what the log says.
 
-        The data to be posted is sent as a JSON string.
+        The data to be posted is sent as a JSON string over a persistent
+        connection that is re-used for subsequent posts.
 
         Inputs:
-            data: dict to sent as JSON string
+            data: JSON string to be sent
+
+        Returns:
+            True if the data was posted or False if the post failed or was not
+            attempted.
         """
 
-        # get a Request object
-        req = urllib.request.Request(self.remote_server_url)
-        # set our content type to json
-        req.add_header('Content-Type', 'application/json')
+        # do not attempt the POST if our destination is failing
+        _allowed = self.post_breaker.allow()
+        if weewx.debug >= 2 and self.post_breaker.checks % 100 == 0:
+            log.debug("post_data: circuit breaker stats: %s" % (self.post_breaker.stats(),))
+        if not _allowed:
+            return False
         # POST the data but wrap in a try..except so we can trap any errors
         try:
-            response = self.post_request(req, json.dumps(data,
-                                                         separators=(',', ':'),
-                                                         sort_keys=True))
-            if 200 <= response.code <= 299:
+            code, response = self.post_client.post(data,
+                                                   {'Content-Type': 'application/json'})
+            if 200 <= code <= 299:
                 # No exception thrown and we got a good response code, but did
                 # we get self.response back in a return message? Check for
                 # self.response, if its there then we can return. If it's
@@ -1429,51 +1818,45 @@ class RealtimeGaugeDataThread(threading.Thread):
                             log.debug("Successfully posted data")
                     else:
                         # it's possible the POST was successful if a response
-                        # code of 200 was received if under python3, check
-                        # response code and give it the benefit of the doubt
-                        # but log it anyway
-                        if response.code == 200:
+                        # code of 200 was received, give it the benefit of the
+                        # doubt but log it anyway
+                        if code == 200:
                             log.debug("Data may have been posted successfully. "
                                       "Response message was not received but a valid response code was received.")
                         else:
                             log.debug("Failed to post data: Unexpected response")
-                return
+                self.post_breaker.success()
+                if weewx.debug >= 2 and self.post_client.requests % 100 == 0:
+                    log.debug("HTTP POST stats: %s" % (self.post_client.stats(),))
+                return True
             # we received a bad response code, log it and continue
-            log.debug("Failed to post data: Code %s" % response.code())
-        except (urllib.error.URLError, socket.error,
-                http_client.BadStatusLine, http_client.IncompleteRead) as e:
+            log.debug("Failed to post data: Code %s" % code)
+        except (urllib.error.URLError, socket.error, http_client.HTTPException) as e:
             # an exception was thrown, log it and continue
             log.debug("Failed to post data: %s" % e)
+        self.post_breaker.failure()
+        return False
 
-    def post_request(self, request, payload):
-        """Post a Request object.
+    def snapshot_changed(self):
+        """Determine whether the last snapshot encoded differs from the last
+        snapshot generated.
 
-        Inputs:
-            request: urllib2 Request object
-            payload: the data to sent
+        Fields in skip_unchanged_ignore are ignored when fingerprinting the
+        snapshot. A snapshot is always considered changed if max_unchanged_age
+        seconds have elapsed since the last write.
 
         Returns:
-            The urllib2.urlopen() response
+            True if the snapshot has changed otherwise False.
         """
 
-        # Under python 3 POST data should be bytes or an iterable of bytes and
-        # not of type str. So attempt to convert the POST data to bytes, if it
-        # already is of type bytes an error will be thrown under python 3, be
-        # prepared to catch this error.
-        try:
-            payload_b = payload.encode('utf-8')
-        except TypeError:
-            payload_b = payload
-
-        # Do the POST. Python 2.5 and earlier do not have a "timeout" parameter
-        # so we used to be prepared to catch the TypeError, but we no longer
-        # support python 2.5 so we can omit the exception.
-        _response = urllib.request.urlopen(request,
-                                           data=payload_b,
-                                           timeout=self.timeout)
-        return _response
-
-    def write_data(self, data):
+        fingerprint = self.encoder.fingerprint(self.skip_unchanged_ignore)
+        if fingerprint == self.last_fingerprint:
+            if not self.max_unchanged_age or time.time() - self.last_write < self.max_unchanged_age:
+                return False
+        self.last_fingerprint = fingerprint
+        return True
+
+    def write_data(self, data, snapshot=None):
         """Write the gauge-data.txt file.
 
         Takes dictionary of data elements, converts them to JSON format and
@@ -1483,7 +1866,8 @@ class RealtimeGaugeDataThread(threading.Thread):
         Destination directory is created if it does not exist.
 
         Inputs:
-            data: dictionary of gauge-data.txt data elements
+            data:     dictionary of gauge-data.txt data elements
+            snapshot: data already serialised to JSON, optional
         """
 
         # make the destination directory, wrapping it in a try block to catch
@@ -1494,11 +1878,24 @@ class RealtimeGaugeDataThread(threading.Thread):
             # raise if the error is anything other than the dir already exists
             if error.errno != errno.EEXIST:
                 raise
+        # serialise our data if this has not already been done
+        if snapshot is None:
+            snapshot = json.dumps(data, separators=(',', ':'), sort_keys=True)
         # now write to temporary file
         with open(self.rtgd_path_file_tmp, 'w') as f:
-            json.dump(data, f, separators=(',', ':'), sort_keys=True)
+            f.write(snapshot)
         # and copy the temporary file to our destination
         os.rename(self.rtgd_path_file_tmp, self.rtgd_path_file)
+        # if required write a gzip compressed copy alongside our file, again
+        # using an atomic write
+        if self.gzip_file:
+            with open(self.rtgd_path_gz_tmp, 'wb') as f:
+                with gzip.GzipFile(filename=os.path.basename(self.rtgd_path_file),
+                                   mode='wb',
+                                   compresslevel=self.gzip_level,
+                                   fileobj=f) as gz:
+                    gz.write(snapshot.encode('utf-8'))
+            os.rename(self.rtgd_path_gz_tmp, self.rtgd_path_gz)
 
     def calculate(self, packet):
         """Construct a data dict for gauge-data.txt.
@@ -1510,10 +1907,31 @@ class RealtimeGaugeDataThread(threading.Thread):
             Dictionary of gauge-data.txt data elements.
         """
 
-        packet_d = dict(packet)
-        ts = packet_d['dateTime']
-        if self.packet_units is None or self.packet_units != packet_d['usUnits']:
-            self.packet_units = packet_d['usUnits']
+        ts = packet['dateTime']
+        if self.packet_units is None or self.packet_units != packet['usUnits']:
+            self.packet_units = packet['usUnits']
+            # compile the unit conversions from our packet units to our
+            # output units
+            self.conv = ConversionPlan(self.packet_units,
+                                       temp=('outTemp', self.temp_group),
+                                       wind=('windSpeed', self.wind_group),
+                                       baro=('barometer', self.pres_group),
+                                       rain=('rain', self.rain_group),
+                                       rainr=('rainRate', self.rainrate_group),
+                                       alt=('altitude', self.alt_group),
+                                       temp_c=('outTemp', 'degree_C'),
+                                       wind_ms=('windSpeed', 'meter_per_second'),
+                                       wind_knot=('windSpeed', 'knot'))
+            # conversions from fixed units to our output units
+            self.conv_c_temp = self.conv.get('degree_C', self.temp_group)
+            self.conv_hpa_baro = self.conv.get('hPa', self.pres_group)
+            self.conv_m_alt = self.conv.get('meter', self.alt_group)
+            self.zero_temp = self.conv_c_temp(0.0)
+            self.extra_conv = []
+            for _obs in self.extra_loop_stats:
+                (_unit, _group) = getStandardUnitType(self.packet_units, _obs)
+                (_target, _format) = self.group_units.get(_group, (_unit, '%.1f'))
+                self.extra_conv.append((_obs, self.conv.get(_unit, _target), _format))
             (self.p_temp_type, self.p_temp_group) = getStandardUnitType(self.packet_units,
                                                                         'outTemp')
             (self.p_wind_type, self.p_wind_group) = getStandardUnitType(self.packet_units,
@@ -1546,35 +1964,23 @@ class RealtimeGaugeDataThread(threading.Thread):
         data['rainunit'] = UNITS_RAIN[self.rain_group]
         # cloudbaseunit - cloud base units - m, ft
         data['cloudbaseunit'] = UNITS_CLOUD[self.alt_group]
-        # temp - outside temperature
-        temp_vt = ValueTuple(packet_d['outTemp'],
+        # temp - outside temperature, we need a ValueTuple for the trend
+        # calculation
+        temp_vt = ValueTuple(packet['outTemp'],
                              self.p_temp_type,
                              self.p_temp_group)
-        temp = convert(temp_vt, self.temp_group).value
-        temp = temp if temp is not None else convert(ValueTuple(0.0, 'degree_C', 'group_temperature'),
-                                                     self.temp_group).value
+        temp = self.conv.temp(packet['outTemp'])
+        temp = temp if temp is not None else self.zero_temp
         data['temp'] = self.temp_format % temp
         # tempTL - today's low temperature
-        temp_tl_vt = ValueTuple(self.day_stats['outTemp'].min,
-                                self.p_temp_type,
-                                self.p_temp_group)
-        temp_tl = convert(temp_tl_vt, self.temp_group).value
-        temp_tl_loop_vt = ValueTuple(self.buffer.tempL_loop[0],
-                                     self.p_temp_type,
-                                     self.p_temp_group)
-        temp_l_loop = convert(temp_tl_loop_vt, self.temp_group).value
+        temp_tl = self.conv.temp(self.day_stats['outTemp'].min)
+        temp_l_loop = self.conv.temp(self.buffer.stats.low('outTemp'))
         temp_tl = weeutil.weeutil.min_with_none([temp_l_loop, temp_tl])
         temp_tl = temp_tl if temp_tl is not None else temp
         data['tempTL'] = self.temp_format % temp_tl
         # tempTH - today's high temperature
-        temp_th_vt = ValueTuple(self.day_stats['outTemp'].max,
-                                self.p_temp_type,
-                                self.p_temp_group)
-        temp_th = convert(temp_th_vt, self.temp_group).value
-        temp_th_loop_vt = ValueTuple(self.buffer.tempH_loop[0],
-                                     self.p_temp_type,
-                                     self.p_temp_group)
-        temp_h_loop = convert(temp_th_loop_vt, self.temp_group).value
+        temp_th = self.conv.temp(self.day_stats['outTemp'].max)
+        temp_h_loop = self.conv.temp(self.buffer.stats.high('outTemp'))
         temp_th = weeutil.weeutil.max_with_none([temp_h_loop, temp_th])
         temp_th = temp_th if temp_th is not None else temp
         data['tempTH'] = self.temp_format % temp_th
@@ -1582,53 +1988,32 @@ class RealtimeGaugeDataThread(threading.Thread):
         if temp_l_loop is not None and temp_tl is not None and temp_l_loop >= temp_tl:
             ttemp_tl = time.localtime(self.day_stats['outTemp'].mintime)
         else:
-            ttemp_tl = time.localtime(self.buffer.tempL_loop[1])
-        # TODO. Remove following two lines
-        # ttemp_tl = time.localtime(self.day_stats['outTemp'].mintime) if temp_l_loop >= temp_tl else \
-        #    time.localtime(self.buffer.tempL_loop[1])
+            ttemp_tl = time.localtime(self.buffer.stats.low_time('outTemp'))
         data['TtempTL'] = time.strftime(self.time_format, ttemp_tl)
         # TtempTH - time of today's high temp (hh:mm)
         if temp_h_loop is not None and temp_th is not None and temp_h_loop <= temp_th:
             ttemp_th = time.localtime(self.day_stats['outTemp'].maxtime)
         else:
-            ttemp_th = time.localtime(self.buffer.tempH_loop[1])
-        # TODO. Remove following two lines
-        # ttemp_th = time.localtime(self.day_stats['outTemp'].maxtime) if temp_h_loop <= temp_th else \
-        #     time.localtime(self.buffer.tempH_loop[1])
+            ttemp_th = time.localtime(self.buffer.stats.high_time('outTemp'))
         data['TtempTH'] = time.strftime(self.time_format, ttemp_th)
         # temptrend - temperature trend value
         _temp_trend_val = calc_trend('outTemp', temp_vt, self.temp_group,
-                                     self.db_manager, ts - 3600, 300)
+                                     self.archive_cache, ts - 3600, 300)
         temp_trend = _temp_trend_val if _temp_trend_val is not None else 0.0
         data['temptrend'] = self.temp_format % temp_trend
         # intemp - inside temperature
-        intemp_vt = ValueTuple(packet_d['inTemp'],
-                               self.p_temp_type,
-                               self.p_temp_group)
-        intemp = convert(intemp_vt, self.temp_group).value
+        intemp = self.conv.temp(packet['inTemp'])
         intemp = intemp if intemp is not None else 0.0
         data['intemp'] = self.temp_format % intemp
         # intempTL - today's low inside temperature
-        intemp_tl_vt = ValueTuple(self.day_stats['inTemp'].min,
-                                  self.p_temp_type,
-                                  self.p_temp_group)
-        intemp_tl = convert(intemp_tl_vt, self.temp_group).value
-        intemp_tl_loop_vt = ValueTuple(self.buffer.intempL_loop[0],
-                                       self.p_temp_type,
-                                       self.p_temp_group)
-        intemp_l_loop = convert(intemp_tl_loop_vt, self.temp_group).value
+        intemp_tl = self.conv.temp(self.day_stats['inTemp'].min)
+        intemp_l_loop = self.conv.temp(self.buffer.stats.low('inTemp'))
         intemp_tl = weeutil.weeutil.min_with_none([intemp_l_loop, intemp_tl])
         intemp_tl = intemp_tl if intemp_tl is not None else intemp
         data['intempTL'] = self.temp_format % intemp_tl
         # intempTH - today's high inside temperature
-        intemp_th_vt = ValueTuple(self.day_stats['inTemp'].max,
-                                  self.p_temp_type,
-                                  self.p_temp_group)
-        intemp_th = convert(intemp_th_vt, self.temp_group).value
-        intemp_th_loop_vt = ValueTuple(self.buffer.intempH_loop[0],
-                                       self.p_temp_type,
-                                       self.p_temp_group)
-        intemp_h_loop = convert(intemp_th_loop_vt, self.temp_group).value
+        intemp_th = self.conv.temp(self.day_stats['inTemp'].max)
+        intemp_h_loop = self.conv.temp(self.buffer.stats.high('inTemp'))
         intemp_th = weeutil.weeutil.max_with_none([intemp_h_loop, intemp_th])
         intemp_th = intemp_th if intemp_th is not None else intemp
         data['intempTH'] = self.temp_format % intemp_th
@@ -1636,79 +2021,59 @@ class RealtimeGaugeDataThread(threading.Thread):
         if intemp_l_loop is not None and intemp_tl is not None and intemp_l_loop >= intemp_tl:
             tintemp_tl = time.localtime(self.day_stats['inTemp'].mintime)
         else:
-            tintemp_tl = time.localtime(self.buffer.intempL_loop[1])
+            tintemp_tl = time.localtime(self.buffer.stats.low_time('inTemp'))
         data['TintempTL'] = time.strftime(self.time_format, tintemp_tl)
         # TintempTH - time of today's high inside temp (hh:mm)
         if intemp_h_loop is not None and intemp_th is not None and intemp_h_loop <= intemp_th:
             tintemp_th = time.localtime(self.day_stats['inTemp'].maxtime)
         else:
-            tintemp_th = time.localtime(self.buffer.intempH_loop[1])
+            tintemp_th = time.localtime(self.buffer.stats.high_time('inTemp'))
         data['TintempTH'] = time.strftime(self.time_format, tintemp_th)
         # hum - relative humidity
-        hum = packet_d['outHumidity'] if packet_d['outHumidity'] is not None else 0.0
+        hum = packet['outHumidity'] if packet['outHumidity'] is not None else 0.0
         data['hum'] = self.hum_format % hum
         # humTL - today's low relative humidity
-        hum_tl = weeutil.weeutil.min_with_none([self.buffer.humL_loop[0],
+        hum_l_loop = self.buffer.stats.low('outHumidity')
+        hum_tl = weeutil.weeutil.min_with_none([hum_l_loop,
                                                self.day_stats['outHumidity'].min])
         hum_tl = hum_tl if hum_tl is not None else hum
         data['humTL'] = self.hum_format % hum_tl
         # humTH - today's high relative humidity
-        hum_th = weeutil.weeutil.max_with_none([self.buffer.humH_loop[0], self.day_stats['outHumidity'].max, 0.0])
+        hum_h_loop = self.buffer.stats.high('outHumidity')
+        hum_th = weeutil.weeutil.max_with_none([hum_h_loop, self.day_stats['outHumidity'].max, 0.0])
         hum_th = hum_th if hum_th is not None else hum
         data['humTH'] = self.hum_format % hum_th
         # ThumTL - time of today's low relative humidity (hh:mm)
-        if self.buffer.humL_loop[0] is not None and hum_tl is not None and self.buffer.humL_loop[0] >= hum_tl:
+        if hum_l_loop is not None and hum_tl is not None and hum_l_loop >= hum_tl:
             thum_tl = time.localtime(self.day_stats['outHumidity'].mintime)
         else:
-            thum_tl = time.localtime(self.buffer.humL_loop[1])
-        # TODO. Remove following two lines
-        # thum_tl = time.localtime(self.day_stats['outHumidity'].mintime) if self.buffer.humL_loop[0] >= hum_tl else \
-        #    time.localtime(self.buffer.humL_loop[1])
+            thum_tl = time.localtime(self.buffer.stats.low_time('outHumidity'))
         data['ThumTL'] = time.strftime(self.time_format, thum_tl)
         # ThumTH - time of today's high relative humidity (hh:mm)
-        if self.buffer.humH_loop[0] is not None and hum_th is not None and self.buffer.humH_loop[0] <= hum_th:
+        if hum_h_loop is not None and hum_th is not None and hum_h_loop <= hum_th:
             thum_th = time.localtime(self.day_stats['outHumidity'].maxtime)
         else:
-            thum_th = time.localtime(self.buffer.humH_loop[1])
-        # TODO. Remove following two lines
-        # thum_th = time.localtime(self.day_stats['outHumidity'].maxtime) if self.buffer.humH_loop[0] <= hum_th else \
-        #    time.localtime(self.buffer.humH_loop[1])
+            thum_th = time.localtime(self.buffer.stats.high_time('outHumidity'))
         data['ThumTH'] = time.strftime(self.time_format, thum_th)
         # inhum - inside humidity
-        if 'inHumidity' not in packet_d:
+        if 'inHumidity' not in packet:
             data['inhum'] = self.hum_format % 0.0
         else:
-            inhum = packet_d['inHumidity'] if packet_d['inHumidity'] is not None else 0.0
+            inhum = packet['inHumidity'] if packet['inHumidity'] is not None else 0.0
             data['inhum'] = self.hum_format % inhum
         # dew - dew point
-        dew_vt = ValueTuple(packet_d['dewpoint'],
-                            self.p_temp_type,
-                            self.p_temp_group)
-        dew = convert(dew_vt, self.temp_group).value
-        dew = dew if dew is not None else convert(ValueTuple(0.0, 'degree_C', 'group_temperature'),
-                                                  self.temp_group).value
+        dew = self.conv.temp(packet['dewpoint'])
+        dew = dew if dew is not None else self.zero_temp
         data['dew'] = self.temp_format % dew
         # dewpointTL - today's low dew point
-        dewpoint_tl_vt = ValueTuple(self.day_stats['dewpoint'].min,
-                                    self.p_temp_type,
-                                    self.p_temp_group)
-        dewpoint_tl = convert(dewpoint_tl_vt, self.temp_group).value
-        dewpoint_tl_loop_vt = ValueTuple(self.buffer.dewpointL_loop[0],
-                                         self.p_temp_type,
-                                         self.p_temp_group)
-        dewpoint_l_loop = convert(dewpoint_tl_loop_vt, self.temp_group).value
+        dewpoint_tl = self.conv.temp(self.day_stats['dewpoint'].min)
+        dewpoint_l_loop = self.conv.temp(self.buffer.stats.low('dewpoint'))
         dewpoint_tl = weeutil.weeutil.min_with_none([dewpoint_l_loop, dewpoint_tl])
         dewpoint_tl = dewpoint_tl if dewpoint_tl is not None else dew
         data['dewpointTL'] = self.temp_format % dewpoint_tl
         # dewpointTH - today's high dew point
-        dewpoint_th_vt = ValueTuple(self.day_stats['dewpoint'].max,
-                                    self.p_temp_type,
-                                    self.p_temp_group)
-        dewpoint_th = convert(dewpoint_th_vt, self.temp_group).value
-        dewpoint_th_loop_vt = ValueTuple(self.buffer.dewpointH_loop[0],
-                                         self.p_temp_type,
-                                         self.p_temp_group)
-        dewpoint_h_loop = convert(dewpoint_th_loop_vt, self.temp_group).value
+        dewpoint_th = self.conv.temp(self.day_stats['dewpoint'].max)
+        dewpoint_h_loop = self.conv.temp(self.buffer.stats.high('dewpoint'))
         dewpoint_th = weeutil.weeutil.max_with_none([dewpoint_h_loop, dewpoint_th])
         dewpoint_th = dewpoint_th if dewpoint_th is not None else dew
         data['dewpointTH'] = self.temp_format % dewpoint_th
@@ -1716,37 +2081,21 @@ class RealtimeGaugeDataThread(threading.Thread):
         if dewpoint_l_loop is not None and dewpoint_tl is not None and dewpoint_l_loop >= dewpoint_tl:
             tdewpoint_tl = time.localtime(self.day_stats['dewpoint'].mintime)
         else:
-            tdewpoint_tl = time.localtime(self.buffer.dewpointL_loop[1])
-        # TODO. Remove following two lines
-        # tdewpoint_tl = time.localtime(self.day_stats['dewpoint'].mintime) if dewpoint_l_loop >= dewpoint_tl else \
-        #     time.localtime(self.buffer.dewpointL_loop[1])
+            tdewpoint_tl = time.localtime(self.buffer.stats.low_time('dewpoint'))
         data['TdewpointTL'] = time.strftime(self.time_format, tdewpoint_tl)
         # TdewpointTH - time of today's high dew point (hh:mm)
         if dewpoint_h_loop is not None and  dewpoint_th is not None and dewpoint_h_loop <= dewpoint_th:
             tdewpoint_th = time.localtime(self.day_stats['dewpoint'].maxtime)
         else:
-            tdewpoint_th = time.localtime(self.buffer.dewpointH_loop[1])
-        # TODO. Remove following two lines
-        # tdewpoint_th = time.localtime(self.day_stats['dewpoint'].maxtime) if dewpoint_h_loop <= dewpoint_th else \
-        #     time.localtime(self.buffer.dewpointH_loop[1])
+            tdewpoint_th = time.localtime(self.buffer.stats.high_time('dewpoint'))
         data['TdewpointTH'] = time.strftime(self.time_format, tdewpoint_th)
         # wchill - wind chill
-        wchill_vt = ValueTuple(packet_d['windchill'],
-                               self.p_temp_type,
-                               self.p_temp_group)
-        wchill = convert(wchill_vt, self.temp_group).value
-        wchill = wchill if wchill is not None else convert(ValueTuple(0.0, 'degree_C', 'group_temperature'),
-                                                           self.temp_group).value
+        wchill = self.conv.temp(packet['windchill'])
+        wchill = wchill if wchill is not None else self.zero_temp
         data['wchill'] = self.temp_format % wchill
         # wchillTL - today's low wind chill
-        wchill_tl_vt = ValueTuple(self.day_stats['windchill'].min,
-                                  self.p_temp_type,
-                                  self.p_temp_group)
-        wchill_tl = convert(wchill_tl_vt, self.temp_group).value
-        wchill_tl_loop_vt = ValueTuple(self.buffer.wchillL_loop[0],
-                                       self.p_temp_type,
-                                       self.p_temp_group)
-        wchill_l_loop = convert(wchill_tl_loop_vt, self.temp_group).value
+        wchill_tl = self.conv.temp(self.day_stats['windchill'].min)
+        wchill_l_loop = self.conv.temp(self.buffer.stats.low('windchill'))
         wchill_tl = weeutil.weeutil.min_with_none([wchill_l_loop, wchill_tl])
         wchill_tl = wchill_tl if wchill_tl is not None else wchill
         data['wchillTL'] = self.temp_format % wchill_tl
@@ -1754,28 +2103,15 @@ class RealtimeGaugeDataThread(threading.Thread):
         if wchill_l_loop is not None and wchill_tl is not None and wchill_l_loop >= wchill_tl:
             twchill_tl = time.localtime(self.day_stats['windchill'].mintime)
         else:
-            twchill_tl = time.localtime(self.buffer.wchillL_loop[1])
-        # TODO. Remove following two lines
-        # twchill_tl = time.localtime(self.day_stats['windchill'].mintime) if wchill_l_loop >= wchill_tl else \
-        #     time.localtime(self.buffer.wchillL_loop[1])
+            twchill_tl = time.localtime(self.buffer.stats.low_time('windchill'))
         data['TwchillTL'] = time.strftime(self.time_format, twchill_tl)
         # heatindex - heat index
-        heatindex_vt = ValueTuple(packet_d['heatindex'],
-                                  self.p_temp_type,
-                                  self.p_temp_group)
-        heatindex = convert(heatindex_vt, self.temp_group).value
-        heatindex = heatindex if heatindex is not None else convert(ValueTuple(0.0, 'degree_C', 'group_temperature'),
-                                                                    self.temp_group).value
+        heatindex = self.conv.temp(packet['heatindex'])
+        heatindex = heatindex if heatindex is not None else self.zero_temp
         data['heatindex'] = self.temp_format % heatindex
         # heatindexTH - today's high heat index
-        heatindex_th_vt = ValueTuple(self.day_stats['heatindex'].max,
-                                     self.p_temp_type,
-                                     self.p_temp_group)
-        heatindex_th = convert(heatindex_th_vt, self.temp_group).value
-        heatindex_th_loop_vt = ValueTuple(self.buffer.heatindexH_loop[0],
-                                          self.p_temp_type,
-                                          self.p_temp_group)
-        heatindex_h_loop = convert(heatindex_th_loop_vt, self.temp_group).value
+        heatindex_th = self.conv.temp(self.day_stats['heatindex'].max)
+        heatindex_h_loop = self.conv.temp(self.buffer.stats.high('heatindex'))
         heatindex_th = weeutil.weeutil.max_with_none([heatindex_h_loop, heatindex_th])
         heatindex_th = heatindex_th if heatindex_th is not None else heatindex
         data['heatindexTH'] = self.temp_format % heatindex_th
@@ -1783,33 +2119,23 @@ class RealtimeGaugeDataThread(threading.Thread):
         if heatindex_h_loop is not None and heatindex_th is not None and heatindex_h_loop >= heatindex_th:
             theatindex_th = time.localtime(self.day_stats['heatindex'].maxtime)
         else:
-            theatindex_th = time.localtime(self.buffer.heatindexH_loop[1])
-        # TODO. Remove following two lines
-        # theatindex_th = time.localtime(self.day_stats['heatindex'].maxtime) if heatindex_h_loop >= heatindex_th else \
-        #     time.localtime(self.buffer.heatindexH_loop[1])
+            theatindex_th = time.localtime(self.buffer.stats.high_time('heatindex'))
         data['TheatindexTH'] = time.strftime(self.time_format, theatindex_th)
         # apptemp - apparent temperature
-        if 'appTemp' in packet_d:
+        if 'appTemp' in packet:
             # appTemp has been calculated for us so use it
-            apptemp_vt = ValueTuple(packet_d['appTemp'],
-                                    self.p_temp_type,
-                                    self.p_temp_group)
+            apptemp = self.conv.temp(packet['appTemp'])
         else:
             # apptemp not available so calculate it
             # first get the arguments for the calculation
-            temp_c = convert(temp_vt, 'degree_C').value
-            windspeed_vt = ValueTuple(packet_d['windSpeed'],
-                                      self.p_wind_type,
-                                      self.p_wind_group)
-            windspeed_ms = convert(windspeed_vt, 'meter_per_second').value
+            temp_c = self.conv.temp_c(packet['outTemp'])
+            windspeed_ms = self.conv.wind_ms(packet['windSpeed'])
             # now calculate it
             apptemp_c = weewx.wxformulas.apptempC(temp_c,
-                                                  packet_d['outHumidity'],
+                                                  packet['outHumidity'],
                                                   windspeed_ms)
-            apptemp_vt = ValueTuple(apptemp_c, 'degree_C', 'group_temperature')
-        apptemp = convert(apptemp_vt, self.temp_group).value
-        apptemp = apptemp if apptemp is not None else convert(ValueTuple(0.0, 'degree_C', 'group_temperature'),
-                                                              self.temp_group).value
+            apptemp = self.conv_c_temp(apptemp_c)
+        apptemp = apptemp if apptemp is not None else self.zero_temp
         data['apptemp'] = self.temp_format % apptemp
         # apptempTL - today's low apparent temperature
         # apptempTH - today's high apparent temperature
@@ -1817,40 +2143,20 @@ class RealtimeGaugeDataThread(threading.Thread):
         # TapptempTH - time of today's high apparent temperature (hh:mm)
         if 'appTemp' in self.apptemp_day_stats:
             # we have day stats for appTemp
-            apptemp_tl_vt = ValueTuple(self.apptemp_day_stats['appTemp'].min,
-                                       self.p_temp_type,
-                                       self.p_temp_group)
-            apptemp_tl = convert(apptemp_tl_vt, self.temp_group).value
-            apptemp_tl_loop_vt = ValueTuple(self.buffer.apptempL_loop[0],
-                                            self.p_temp_type,
-                                            self.p_temp_group)
-            apptemp_l_loop = convert(apptemp_tl_loop_vt, self.temp_group).value
+            apptemp_tl = self.conv.temp(self.apptemp_day_stats['appTemp'].min)
+            apptemp_l_loop = self.conv.temp(self.buffer.stats.low('appTemp'))
             apptemp_tl = weeutil.weeutil.min_with_none([apptemp_l_loop, apptemp_tl])
-            apptemp_th_vt = ValueTuple(self.apptemp_day_stats['appTemp'].max,
-                                       self.p_temp_type,
-                                       self.p_temp_group)
-            apptemp_th = convert(apptemp_th_vt, self.temp_group).value
-            apptemp_th_loop_vt = ValueTuple(self.buffer.apptempH_loop[0],
-                                            self.p_temp_type,
-                                            self.p_temp_group)
-            apptemp_h_loop = convert(apptemp_th_loop_vt, self.temp_group).value
+            apptemp_th = self.conv.temp(self.apptemp_day_stats['appTemp'].max)
+            apptemp_h_loop = self.conv.temp(self.buffer.stats.high('appTemp'))
             apptemp_th = weeutil.weeutil.max_with_none([apptemp_h_loop, apptemp_th])
             if apptemp_l_loop is not None and apptemp_tl is not None and apptemp_l_loop >= apptemp_tl:
                 tapptemp_tl = time.localtime(self.apptemp_day_stats['appTemp'].mintime)
             else:
-                tapptemp_tl = time.localtime(self.buffer.apptempL_loop[1])
-            # TODO. Remove following three lines
-            # tapptemp_tl = time.localtime(self.apptemp_day_stats['appTemp'].mintime) if \
-            #    apptemp_l_loop >= apptemp_tl else \
-            #     time.localtime(self.buffer.apptempL_loop[1])
+                tapptemp_tl = time.localtime(self.buffer.stats.low_time('appTemp'))
             if apptemp_h_loop is not None and apptemp_th is not None and apptemp_h_loop <= apptemp_th:
                 tapptemp_th = time.localtime(self.apptemp_day_stats['appTemp'].maxtime)
             else:
-                tapptemp_th = time.localtime(self.buffer.apptempH_loop[1])
-            # TODO. Remove following three lines
-            # tapptemp_th = time.localtime(self.apptemp_day_stats['appTemp'].maxtime) if \
-            #     apptemp_h_loop <= apptemp_th else \
-            #     time.localtime(self.buffer.apptempH_loop[1])
+                tapptemp_th = time.localtime(self.buffer.stats.high_time('appTemp'))
         else:
             # There are no appTemp day stats. Normally we would return None but
             # the SteelSeries Gauges do not like None/null. Return the current
@@ -1861,36 +2167,29 @@ class RealtimeGaugeDataThread(threading.Thread):
             apptemp_th = apptemp
             tapptemp_tl = datetime.date.today().timetuple()
             tapptemp_th = datetime.date.today().timetuple()
-        apptemp_tl = apptemp_tl if apptemp_tl is not None else \
-            convert(ValueTuple(0.0, 'degree_C', 'group_temperature'), self.temp_group).value
+        apptemp_tl = apptemp_tl if apptemp_tl is not None else self.zero_temp
         data['apptempTL'] = self.temp_format % apptemp_tl
-        apptemp_th = apptemp_th if apptemp_th is not None else \
-            convert(ValueTuple(0.0, 'degree_C', 'group_temperature'), self.temp_group).value
+        apptemp_th = apptemp_th if apptemp_th is not None else self.zero_temp
         data['apptempTH'] = self.temp_format % apptemp_th
         data['TapptempTL'] = time.strftime(self.time_format, tapptemp_tl)
         data['TapptempTH'] = time.strftime(self.time_format, tapptemp_th)
         # humidex - humidex
-        if 'humidex' in packet_d:
+        if 'humidex' in packet:
             # humidex is in the packet so use it
-            humidex_vt = ValueTuple(packet_d['humidex'],
-                                    self.p_temp_type,
-                                    self.p_temp_group)
-            humidex = convert(humidex_vt, self.temp_group).value
+            humidex = self.conv.temp(packet['humidex'])
         else:   # No humidex in our loop packet so all we can do is calculate it.
             # humidex is not in the packet so calculate it
-            temp_c = convert(temp_vt, 'degree_C').value
+            temp_c = self.conv.temp_c(packet['outTemp'])
             humidex_c = weewx.wxformulas.humidexC(temp_c,
-                                                  packet_d['outHumidity'])
-            humidex_vt = ValueTuple(humidex_c, 'degree_C', 'group_temperature')
-            humidex = convert(humidex_vt, self.temp_group).value
-        humidex = humidex if humidex is not None else \
-            convert(ValueTuple(0.0, 'degree_C', 'group_temperature'), self.temp_group).value
+                                                  packet['outHumidity'])
+            humidex = self.conv_c_temp(humidex_c)
+        humidex = humidex if humidex is not None else self.zero_temp
         data['humidex'] = self.temp_format % humidex
-        # press - barometer
-        press_vt = ValueTuple(packet_d['barometer'],
+        # press - barometer, we need a ValueTuple for the trend calculation
+        press_vt = ValueTuple(packet['barometer'],
                               self.p_baro_type,
                               self.p_baro_group)
-        press = convert(press_vt, self.pres_group).value
+        press = self.conv.baro(packet['barometer'])
         press = press if press is not None else 0.0
         data['press'] = self.pres_format % press
         # pressTL - today's low barometer
@@ -1898,42 +2197,24 @@ class RealtimeGaugeDataThread(threading.Thread):
         # TpressTL - time of today's low barometer (hh:mm)
         # TpressTH - time of today's high barometer (hh:mm)
         if 'barometer' in self.day_stats:
-            press_tl_vt = ValueTuple(self.day_stats['barometer'].min,
-                                     self.p_baro_type,
-                                     self.p_baro_group)
-            press_tl = convert(press_tl_vt, self.pres_group).value
-            press_l_loop_vt = ValueTuple(self.buffer.pressL_loop[0],
-                                         self.p_baro_type,
-                                         self.p_baro_group)
-            press_l_loop = convert(press_l_loop_vt, self.pres_group).value
+            press_tl = self.conv.baro(self.day_stats['barometer'].min)
+            press_l_loop = self.conv.baro(self.buffer.stats.low('barometer'))
             press_tl = weeutil.weeutil.min_with_none([press_l_loop, press_tl])
             press_tl = press_tl if press_tl is not None else press
             data['pressTL'] = self.pres_format % press_tl
-            press_th_vt = ValueTuple(self.day_stats['barometer'].max,
-                                     self.p_baro_type,
-                                     self.p_baro_group)
-            press_th = convert(press_th_vt, self.pres_group).value
-            press_h_loop_vt = ValueTuple(self.buffer.pressH_loop[0],
-                                         self.p_baro_type,
-                                         self.p_baro_group)
-            press_h_loop = convert(press_h_loop_vt, self.pres_group).value
+            press_th = self.conv.baro(self.day_stats['barometer'].max)
+            press_h_loop = self.conv.baro(self.buffer.stats.high('barometer'))
             press_th = weeutil.weeutil.max_with_none([press_h_loop, press_th, 0.0])
             data['pressTH'] = self.pres_format % press_th
             if press_l_loop is not None and press_tl is not None and press_l_loop >= press_tl:
                 tpress_tl = time.localtime(self.day_stats['barometer'].mintime)
             else:
-                tpress_tl = time.localtime(self.buffer.pressL_loop[1])
-            # TODO. Remove following two lines
-            # tpress_tl = time.localtime(self.day_stats['barometer'].mintime) if press_l_loop >= press_tl else \
-            #     time.localtime(self.buffer.pressL_loop[1])
+                tpress_tl = time.localtime(self.buffer.stats.low_time('barometer'))
             data['TpressTL'] = time.strftime(self.time_format, tpress_tl)
             if press_h_loop is not None and press_th is not None and press_h_loop <= press_th:
                 tpress_th = time.localtime(self.day_stats['barometer'].maxtime)
             else:
-                tpress_th = time.localtime(self.buffer.pressH_loop[1])
-            # TODO. Remove following two lines
-            # tpress_th = time.localtime(self.day_stats['barometer'].maxtime) if press_h_loop <= press_th else \
-            #     time.localtime(self.buffer.pressH_loop[1])
+                tpress_th = time.localtime(self.buffer.stats.high_time('barometer'))
             data['TpressTH'] = time.strftime(self.time_format, tpress_th)
         else:
             data['pressTL'] = self.pres_format % 0.0
@@ -1942,52 +2223,38 @@ class RealtimeGaugeDataThread(threading.Thread):
             data['TpressTH'] = None
         # pressL - all time low barometer
         if self.min_barometer is not None:
-            press_l_vt = ValueTuple(self.min_barometer,
-                                    self.p_baro_type,
-                                    self.p_baro_group)
+            press_l = self.conv.baro(self.min_barometer)
         else:
-            press_l_vt = ValueTuple(850, 'hPa', self.p_baro_group)
-        press_l = convert(press_l_vt, self.pres_group).value
+            press_l = self.conv_hpa_baro(850)
         data['pressL'] = self.pres_format % press_l
         # pressH - all time high barometer
         if self.max_barometer is not None:
-            press_h_vt = ValueTuple(self.max_barometer,
-                                    self.p_baro_type,
-                                    self.p_baro_group)
+            press_h = self.conv.baro(self.max_barometer)
         else:
-            press_h_vt = ValueTuple(1100, 'hPa', self.p_baro_group)
-        press_h = convert(press_h_vt, self.pres_group).value
+            press_h = self.conv_hpa_baro(1100)
         data['pressH'] = self.pres_format % press_h
         # presstrendval -  pressure trend value
         _p_trend_val = calc_trend('barometer', press_vt, self.pres_group,
-                                  self.db_manager, ts - 3600, 300)
+                                  self.archive_cache, ts - 3600, 300)
         presstrendval = _p_trend_val if _p_trend_val is not None else 0.0
         data['presstrendval'] = self.pres_format % presstrendval
         # rfall - rain today
         rain_day = self.day_stats['rain'].sum + self.buffer.rainsum
-        rain_t_vt = ValueTuple(rain_day, self.p_rain_type, self.p_rain_group)
-        rain_t = convert(rain_t_vt, self.rain_group).value
+        rain_t = self.conv.rain(rain_day)
         rain_t = rain_t if rain_t is not None else 0.0
         data['rfall'] = self.rain_format % rain_t
         # rrate - current rain rate (per hour)
-        if 'rainRate' in packet_d:
-            rrate_vt = ValueTuple(packet_d['rainRate'],
-                                  self.p_rainr_type,
-                                  self.p_rainr_group)
-            rrate = convert(rrate_vt, self.rainrate_group).value if rrate_vt.value is not None else 0.0
+        if 'rainRate' in packet:
+            rrate = self.conv.rainr(packet['rainRate']) if packet['rainRate'] is not None else 0.0
         else:
             rrate = 0.0
         data['rrate'] = self.rainrate_format % rrate
         # rrateTM - today's maximum rain rate (per hour)
         if 'rainRate' in self.day_stats:
-            rrate_tm_vt = ValueTuple(self.day_stats['rainRate'].max,
-                                     self.p_rainr_type,
-                                     self.p_rainr_group)
-            rrate_tm = convert(rrate_tm_vt, self.rainrate_group).value
+            rrate_tm = self.conv.rainr(self.day_stats['rainRate'].max)
         else:
             rrate_tm = 0
-        rrate_tm_loop_vt = ValueTuple(self.buffer.rrateH_loop[0], self.p_rainr_type, self.p_rainr_group)
-        rrate_h_loop = convert(rrate_tm_loop_vt, self.rainrate_group).value
+        rrate_h_loop = self.conv.rainr(self.buffer.stats.high('rainRate'))
         rrate_tm = weeutil.weeutil.max_with_none([rrate_h_loop, rrate_tm, rrate, 0.0])
         data['rrateTM'] = self.rainrate_format % rrate_tm
         # TrrateTM - time of today's maximum rain rate (per hour)
@@ -1997,10 +2264,7 @@ class RealtimeGaugeDataThread(threading.Thread):
             if rrate_h_loop is not None and rrate_tm is not None and rrate_h_loop <= rrate_tm:
                 trrate_tm = time.localtime(self.day_stats['rainRate'].maxtime)
             else:
-                trrate_tm = time.localtime(self.buffer.rrateH_loop[1])
-            # TODO. Remove following two lines
-            # trrate_tm = time.localtime(self.day_stats['rainRate'].maxtime) if rrate_h_loop <= rrate_tm else \
-            #     time.localtime(self.buffer.rrateH_loop[1])
+                trrate_tm = time.localtime(self.buffer.stats.high_time('rainRate'))
             data['TrrateTM'] = time.strftime(self.time_format, trrate_tm)
         # hourlyrainTH - Today's highest hourly rain
         # FIXME. Need to determine hourlyrainTH
@@ -2012,41 +2276,25 @@ class RealtimeGaugeDataThread(threading.Thread):
         # FIXME. Need to determine LastRainTipISO
         data['LastRainTipISO'] = "00:00"
         # wlatest - latest wind speed reading
-        wlatest_vt = ValueTuple(packet_d['windSpeed'],
-                                self.p_wind_type,
-                                self.p_wind_group)
-        wlatest = convert(wlatest_vt, self.wind_group).value if wlatest_vt.value is not None else 0.0
+        wlatest = self.conv.wind(packet['windSpeed']) if packet['windSpeed'] is not None else 0.0
         data['wlatest'] = self.wind_format % wlatest
         # wspeed - wind speed (average)
-        wspeed = convert(self.windSpeedAvg_vt, self.wind_group).value
+        wspeed = self.conv.get(self.windSpeedAvg_vt.unit, self.wind_group)(self.windSpeedAvg_vt.value)
         wspeed = wspeed if wspeed is not None else 0.0
         data['wspeed'] = self.wind_format % wspeed
         # windTM - today's high wind speed (average)
-        wind_tm_vt = ValueTuple(self.day_stats['windSpeed'].max,
-                                self.p_wind_type,
-                                self.p_wind_group)
-        wind_tm = convert(wind_tm_vt, self.wind_group).value
-        wind_tm_loop_vt = ValueTuple(self.buffer.windM_loop[0],
-                                     self.p_wind_type,
-                                     self.p_wind_group)
-        wind_m_loop = convert(wind_tm_loop_vt, self.wind_group).value
+        wind_tm = self.conv.wind(self.day_stats['windSpeed'].max)
+        wind_m_loop = self.conv.wind(self.buffer.windM_loop[0])
         wind_tm = weeutil.weeutil.max_with_none([wind_m_loop, wind_tm, 0.0])
         data['windTM'] = self.wind_format % wind_tm
         # wgust - 10 minute high gust
         wgust = self.buffer.ten_minute_wind_gust()
-        wgust_vt = ValueTuple(wgust, self.p_wind_type, self.p_wind_group)
-        wgust = convert(wgust_vt, self.wind_group).value
+        wgust = self.conv.wind(wgust)
         wgust = wgust if wgust is not None else 0.0
         data['wgust'] = self.wind_format % wgust
         # wgustTM - today's high wind gust
-        wgust_tm_vt = ValueTuple(self.day_stats['wind'].max,
-                                 self.p_wind_type,
-                                 self.p_wind_group)
-        wgust_tm = convert(wgust_tm_vt, self.wind_group).value
-        wgust_m_loop_vt = ValueTuple(self.buffer.wgustM_loop[0],
-                                     self.p_wind_type,
-                                     self.p_wind_group)
-        wgust_m_loop = convert(wgust_m_loop_vt, self.wind_group).value
+        wgust_tm = self.conv.wind(self.day_stats['wind'].max)
+        wgust_m_loop = self.conv.wind(self.buffer.wgustM_loop[0])
         wgust_tm = weeutil.weeutil.max_with_none([wgust_m_loop, wgust_tm, 0.0])
         data['wgustTM'] = self.wind_format % wgust_tm
         # TwgustTM - time of today's high wind gust (hh:mm)
@@ -2054,12 +2302,9 @@ class RealtimeGaugeDataThread(threading.Thread):
             twgust_tm = time.localtime(self.day_stats['wind'].maxtime)
         else:
             twgust_tm = time.localtime(self.buffer.wgustM_loop[2])
-        # TODO. Remove following two lines
-        # twgust_tm = time.localtime(self.day_stats['wind'].maxtime) if wgust_m_loop <= wgust_tm else \
-        #     time.localtime(self.buffer.wgustM_loop[2])
         data['TwgustTM'] = time.strftime(self.time_format, twgust_tm)
         # bearing - wind bearing (degrees)
-        bearing = packet_d['windDir'] if packet_d['windDir'] is not None else self.last_latest_dir
+        bearing = packet['windDir'] if packet['windDir'] is not None else self.last_latest_dir
         self.last_latest_dir = bearing
         data['bearing'] = self.dir_format % bearing
         # avgbearing - 10-minute average wind bearing (degrees)
@@ -2077,10 +2322,12 @@ class RealtimeGaugeDataThread(threading.Thread):
         # (or as configured using AvgBearingMinutes in cumulus.ini), rounded
         # down to nearest 10 degrees
         if self.windDirAvg is not None:
-            try:
-                from_bearing = weeutil.weeutil.max_with_none([self.windDirAvg-d if ((d-self.windDirAvg) < 0 < s) else
-                                   None for x, y, s, d, t in self.buffer.wind_dir_list])
-            except (TypeError, ValueError):
+            # the amount by which the lowest bearing with a non-zero wind
+            # speed is less than the average bearing, if it is
+            min_dir = self.buffer.wind_window.min_dir()
+            if min_dir is not None and min_dir < self.windDirAvg:
+                from_bearing = self.windDirAvg - min_dir
+            else:
                 from_bearing = None
             bearing_range_from10 = self.windDirAvg - from_bearing if from_bearing is not None else 0.0
             if bearing_range_from10 < 0:
@@ -2094,10 +2341,12 @@ class RealtimeGaugeDataThread(threading.Thread):
         # (or as configured using AvgBearingMinutes in cumulus.ini), rounded
         # up to the nearest 10 degrees
         if self.windDirAvg is not None:
-            try:
-                to_bearing = weeutil.weeutil.max_with_none([d-self.windDirAvg if ((d-self.windDirAvg) > 0 and s > 0) else
-                                 None for x, y, s, d, t in self.buffer.wind_dir_list])
-            except (TypeError, ValueError):
+            # the amount by which the highest bearing with a non-zero wind
+            # speed is greater than the average bearing, if it is
+            max_dir = self.buffer.wind_window.max_dir()
+            if max_dir is not None and max_dir > self.windDirAvg:
+                to_bearing = max_dir - self.windDirAvg
+            else:
                 to_bearing = None
             bearing_range_to10 = self.windDirAvg + to_bearing if to_bearing is not None else 0.0
             if bearing_range_to10 < 0:
@@ -2115,51 +2364,45 @@ class RealtimeGaugeDataThread(threading.Thread):
         # WindRoseData -
         data['WindRoseData'] = self.rose
         # windrun - wind run (today)
-        last_ts = self.db_manager.lastGoodStamp()
+        last_ts = self.last_archive_ts
         try:
-            wind_sum_vt = ValueTuple(self.day_stats['wind'].sum,
-                                     self.p_wind_type,
-                                     self.p_wind_group)
             windrun_day_average = (last_ts - startOfDay(ts))/3600.0 * \
-                convert(wind_sum_vt, self.wind_group).value/self.day_stats['wind'].count
+                self.conv.wind(self.day_stats['wind'].sum)/self.day_stats['wind'].count
         except (ValueError, TypeError, ZeroDivisionError):
             windrun_day_average = 0.0
         if self.windrun_loop:   # is loop/realtime estimate
             loop_hours = (ts - last_ts)/3600.0
             try:
-                windrun = windrun_day_average + loop_hours * convert((self.buffer.windsum,
-                                                                      self.p_wind_type,
-                                                                      self.p_wind_group),
-                                                                     self.wind_group).value/self.buffer.windcount
+                windrun = windrun_day_average + loop_hours * \
+                    self.conv.wind(self.buffer.windsum)/self.buffer.windcount
             except (ValueError, TypeError):
                 windrun = windrun_day_average
         else:
             windrun = windrun_day_average
         data['windrun'] = self.dist_format % windrun
         # Tbeaufort - wind speed (Beaufort)
-        if packet_d['windSpeed'] is not None:
-            data['Tbeaufort'] = str(weewx.wxformulas.beaufort(convert(wlatest_vt,
-                                                                      'knot').value))
+        if packet['windSpeed'] is not None:
+            data['Tbeaufort'] = str(weewx.wxformulas.beaufort(self.conv.wind_knot(packet['windSpeed'])))
         else:
             data['Tbeaufort'] = "0"
         # UV - UV index
-        if 'UV' not in packet_d:
+        if 'UV' not in packet:
             uv = 0.0
         else:
-            uv = packet_d['UV'] if packet_d['UV'] is not None else 0.0
+            uv = packet['UV'] if packet['UV'] is not None else 0.0
         data['UV'] = self.uv_format % uv
         # UVTH - today's high UV index
         if 'UV' not in self.day_stats:
             uv_th = uv
         else:
             uv_th = self.day_stats['UV'].max
-        uv_th = weeutil.weeutil.max_with_none([self.buffer.UVH_loop[0], uv_th, uv, 0.0])
+        uv_th = weeutil.weeutil.max_with_none([self.buffer.stats.high('UV'), uv_th, uv, 0.0])
         data['UVTH'] = self.uv_format % uv_th
         # SolarRad - solar radiation W/m2
-        if 'radiation' not in packet_d:
+        if 'radiation' not in packet:
             solar_rad = 0.0
         else:
-            solar_rad = packet_d['radiation']
+            solar_rad = packet['radiation']
         solar_rad = solar_rad if solar_rad is not None else 0.0
         data['SolarRad'] = self.rad_format % solar_rad
         # SolarTM - today's maximum solar radiation W/m2
@@ -2167,7 +2410,7 @@ class RealtimeGaugeDataThread(threading.Thread):
             solar_tm = 0.0
         else:
             solar_tm = self.day_stats['radiation'].max
-        solar_tm = weeutil.weeutil.max_with_none([self.buffer.SolarH_loop[0], solar_tm, solar_rad, 0.0])
+        solar_tm = weeutil.weeutil.max_with_none([self.buffer.stats.high('radiation'), solar_tm, solar_rad, 0.0])
         data['SolarTM'] = self.rad_format % solar_tm
         # CurrentSolarMax - Current theoretical maximum solar radiation
         if self.solar_algorithm == 'Bras':
@@ -2184,16 +2427,14 @@ class RealtimeGaugeDataThread(threading.Thread):
                                                            self.atc)
         curr_solar_max = curr_solar_max if curr_solar_max is not None else 0.0
         data['CurrentSolarMax'] = self.rad_format % curr_solar_max
-        if 'cloudbase' in packet_d:
-            cb = packet_d['cloudbase']
-            cb_vt = ValueTuple(cb, self.p_alt_type, self.p_alt_group)
+        if 'cloudbase' in packet:
+            cloudbase = self.conv.alt(packet['cloudbase'])
         else:
-            temp_c = convert(temp_vt, 'degree_C').value
+            temp_c = self.conv.temp_c(packet['outTemp'])
             cb = weewx.wxformulas.cloudbase_Metric(temp_c,
-                                                   packet_d['outHumidity'],
+                                                   packet['outHumidity'],
                                                    self.altitude_m)
-            cb_vt = ValueTuple(cb, 'meter', self.p_alt_group)
-        cloudbase = convert(cb_vt, self.alt_group).value
+            cloudbase = self.conv_m_alt(cb)
         cloudbase = cloudbase if cloudbase is not None else 0.0
         data['cloudbasevalue'] = self.alt_format % cloudbase
         # forecast - forecast text
@@ -2213,9 +2454,8 @@ class RealtimeGaugeDataThread(threading.Thread):
         # month to date rain, only calculate if we have been asked
         if self.mtd_rain:
             if self.month_rain is not None:
-                rain_m = convert(self.month_rain, self.rain_group).value
-                rain_b_vt = ValueTuple(self.buffer.rainsum, self.p_rain_type, self.p_rain_group)
-                rain_b = convert(rain_b_vt, self.rain_group).value
+                rain_m = self.conv.get(self.month_rain.unit, self.rain_group)(self.month_rain.value)
+                rain_b = self.conv.rain(self.buffer.rainsum)
                 if rain_m is not None and rain_b is not None:
                     rain_m = rain_m + rain_b
                 else:
@@ -2226,9 +2466,8 @@ class RealtimeGaugeDataThread(threading.Thread):
         # year to date rain, only calculate if we have been asked
         if self.ytd_rain:
             if self.year_rain is not None:
-                rain_y = convert(self.year_rain, self.rain_group).value
-                rain_b_vt = ValueTuple(self.buffer.rainsum, self.p_rain_type, self.p_rain_group)
-                rain_b = convert(rain_b_vt, self.rain_group).value
+                rain_y = self.conv.get(self.year_rain.unit, self.rain_group)(self.year_rain.value)
+                rain_b = self.conv.rain(self.buffer.rainsum)
                 if rain_y is not None and rain_b is not None:
                     rain_y = rain_y + rain_b
                 else:
@@ -2236,13 +2475,53 @@ class RealtimeGaugeDataThread(threading.Thread):
             else:
                 rain_y = 0.0
             data['yrfall'] = self.rain_format % rain_y
+        # today's low and high of any extra_loop_stats obs
+        for (obs, obs_conv, obs_format) in self.extra_conv:
+            self.add_extra_stats(data, obs, obs_conv, obs_format)
         return data
 
+    def add_extra_stats(self, data, obs, obs_conv, obs_format):
+        """Add today's low and high of an extra_loop_stats obs to a data dict.
+
+        The loop period low and high are combined with the day stats low and
+        high, if the obs is archived, in the same manner as for outTemp.
+
+        Input:
+            data:       the gauge-data.txt data dict
+            obs:        the obs concerned
+            obs_conv:   function to convert the obs to gauge-data.txt units
+            obs_format: format string for the obs
+        """
+
+        day = self.day_stats[obs] if obs in self.day_stats else None
+        # <obs>TL and T<obs>TL - today's low and time of today's low
+        low_loop = obs_conv(self.buffer.stats.low(obs))
+        low = weeutil.weeutil.min_with_none([low_loop, obs_conv(day.min) if day is not None else None])
+        if day is not None and low_loop is not None and low is not None and low_loop >= low:
+            t_low = time.localtime(day.mintime)
+        else:
+            t_low = time.localtime(self.buffer.stats.low_time(obs))
+        data[''.join([obs, 'TL'])] = obs_format % (low if low is not None else 0.0)
+        data[''.join(['T', obs, 'TL'])] = time.strftime(self.time_format, t_low)
+        # <obs>TH and T<obs>TH - today's high and time of today's high
+        high_loop = obs_conv(self.buffer.stats.high(obs))
+        high = weeutil.weeutil.max_with_none([high_loop, obs_conv(day.max) if day is not None else None])
+        if day is not None and high_loop is not None and high is not None and high_loop <= high:
+            t_high = time.localtime(day.maxtime)
+        else:
+            t_high = time.localtime(self.buffer.stats.high_time(obs))
+        data[''.join([obs, 'TH'])] = obs_format % (high if high is not None else 0.0)
+        data[''.join(['T', obs, 'TH'])] = time.strftime(self.time_format, t_high)
+
     def new_archive_record(self, record):
         """Control processing when new a archive record is presented."""
 
         # set our lost contact flag if applicable
         self.lost_contact_flag = self.get_lost_contact(record, 'archive')
+        # add the record to our archive record cache
+        self.archive_cache.add(record)
+        # save the timestamp of the latest archive record
+        self.last_archive_ts = max_with_none([self.last_archive_ts, record['dateTime']])
         # save the windSpeed value to use as our archive period average
         if 'windSpeed' in record:
             self.windSpeedAvg_vt = weewx.units.as_value_tuple(record, 'windSpeed')
@@ -2257,12 +2536,41 @@ class RealtimeGaugeDataThread(threading.Thread):
         # jumped to the next day
         self.day_stats = self.db_manager._get_day_summary(record['dateTime'])
         self.apptemp_day_stats = self.apptemp_manager._get_day_summary(record['dateTime'])
+        # update our alltime and to date aggregates
+        self.aggregates.update(self.db_manager, self.day_stats, record)
+        self.process_aggregates()
+
+    def process_aggregates(self):
+        """Update our alltime and to date aggregate properties."""
+
+        self.process_stats(self.aggregates.get_stats())
+        if weewx.debug == 2:
+            log.debug("updated alltime and to date aggregates")
+        elif weewx.debug >= 3:
+            log.debug("updated alltime and to date aggregates: %s" % (self.aggregates.get_stats(),))
 
     def end_archive_period(self):
         """Control processing at the end of each archive period."""
 
         # Reset our loop stats.
         self.buffer.reset_loop_stats()
+        if weewx.debug >= 2:
+            log.debug("rtgd thread stats: %s" % (self.thread_stats(),))
+            for _thread in (self.post_thread, self.rsync_thread):
+                if _thread is not None:
+                    log.debug("%s stats: %s" % (_thread.name, _thread.stats()))
+            if self.snapshot_server is not None:
+                log.debug("http stats: %s" % (self.snapshot_server.stats(),))
+
+    def thread_stats(self):
+        """Return a dict of loop packet processing statistics."""
+
+        return {'wakes': self.wake_count,
+                'ingested': self.ingested_count,
+                'generated': self.generated_count,
+                'unchanged': self.unchanged_count,
+                'coalesced': self.coalesced_count,
+                'dropped': self.dropped_count}
 
     def get_lost_contact(self, rec, packet_type):
         """Determine is station has lost contact with sensors."""
@@ -2298,8 +2606,18 @@ class RtgdBuffer(object):
     reflected.
     """
 
-    def __init__(self):
-        """Initialise an instance of our class."""
+    # the loop packet fields used by set_lows_and_highs()
+    OBS = ["outTemp", "inTemp", "dewpoint", "appTemp", "windchill",
+           "heatindex", "barometer", "rain", "rainRate", "outHumidity", "UV",
+           "radiation", "windDir", "windSpeed"]
+
+    def __init__(self, extra_obs=None):
+        """Initialise an instance of our class.
+
+        Input:
+            extra_obs: list of additional loop packet obs for which loop
+                       period lows and highs are to be tracked
+        """
 
         # Initialise min/max for loop data received since last archive record
         # and sum/counter for windrun calculator
@@ -2308,34 +2626,22 @@ class RtgdBuffer(object):
         self.windcount = 0
         self.rainsum = 0
 
-        # initialise loop period low/high/max stats
-        self.tempL_loop = [None, None]
-        self.tempH_loop = [None, None]
-        self.intempL_loop = [None, None]
-        self.intempH_loop = [None, None]
-        self.dewpointL_loop = [None, None]
-        self.dewpointH_loop = [None, None]
-        self.apptempL_loop = [None, None]
-        self.apptempH_loop = [None, None]
-        self.wchillL_loop = [None, None]
-        self.heatindexH_loop = [None, None]
+        # initialise loop period low/high stats
+        _stats = list(LOOP_STATS)
+        for _obs in extra_obs or []:
+            _stats.extend([(_obs, 'min'), (_obs, 'max')])
+        self.stats = LoopStats(_stats)
+        # initialise loop period max wind gust (speed, direction, timestamp)
+        # and max average wind (speed, timestamp)
         self.wgustM_loop = [None, None, None]
-        self.pressL_loop = [None, None]
-        self.pressH_loop = [None, None]
-        self.rrateH_loop = [None, None]
-        self.humL_loop = [None, None]
-        self.humH_loop = [None, None]
         self.windM_loop = [None, None]
-        self.UVH_loop = [None, None]
-        self.SolarH_loop = [None, None]
-
-        # Setup lists/flags for 5 and 10 minute wind stats
-        self.wind_list = []
-        self.wind_dir_list = []
 
         # set length of time to retain wind obs
         self.wind_period = 600
 
+        # setup a sliding window for 5 and 10 minute wind stats
+        self.wind_window = WindWindow(self.wind_period)
+
     def reset_loop_stats(self):
         """Reset loop windrun sum/count and loop low/high/max stats.
 
@@ -2349,25 +2655,9 @@ class RtgdBuffer(object):
         self.rainsum = 0
 
         # reset loop period low/high/max stats
-        self.tempL_loop = [None, None]
-        self.tempH_loop = [None, None]
-        self.intempL_loop = [None, None]
-        self.intempH_loop = [None, None]
-        self.dewpointL_loop = [None, None]
-        self.dewpointH_loop = [None, None]
-        self.apptempL_loop = [None, None]
-        self.apptempH_loop = [None, None]
-        self.wchillL_loop = [None, None]
-        self.heatindexH_loop = [None, None]
-        self.wgustM_loop = [None, None, None]
-        self.pressL_loop = [None, None]
-        self.pressH_loop = [None, None]
-        self.rrateH_loop = [None, None]
-        self.humL_loop = [None, None]
-        self.humH_loop = [None, None]
-        self.windM_loop = [None, None]
-        self.UVH_loop = [None, None]
-        self.SolarH_loop = [None, None]
+        self.stats.reset()
+        self.wgustM_loop[:] = (None, None, None)
+        self.windM_loop[:] = (None, None)
 
     def average_wind(self):
         """ Calculate average wind speed over an archive interval period.
@@ -2376,7 +2666,7 @@ class RtgdBuffer(object):
         gauge-data.txt requires the average wind speed over the last
         'archive interval' seconds. This means calculating over the last
         'archive interval' seconds ending on the current loop period. This is
-        achieved by keeping a list of last 'archive interval' of loop wind
+        achieved by keeping a window of last 'archive interval' of loop wind
         speed data and calculating a simple average.
         Units used are loop data units so unit conversion of the result may be
         required.
@@ -2390,17 +2680,13 @@ class RtgdBuffer(object):
             Average wind speed over the last 'archive interval' seconds
         """
 
-        if len(self.wind_list) > 0:
-            average = sum(w for w, _ in self.wind_list)/float(len(self.wind_list))
-        else:
-            average = 0.0
-        return average
+        return self.wind_window.average_speed()
 
     def ten_minute_average_wind_dir(self):
         """ Calculate average wind direction over the last 10 minutes.
 
-        Takes list of last 10 minutes of loop wind speed and direction data and
-        calculates a vector average direction.
+        Uses the window of last 10 minutes of loop wind speed and direction
+        data to calculate a vector average direction.
         Result is only considered valid if a full 10 minutes of loop wind data
         is held.
 
@@ -2411,20 +2697,14 @@ class RtgdBuffer(object):
             10 minute vector average wind direction
         """
 
-        if len(self.wind_dir_list) > 0:
-            avg_dir = 90.0 - math.degrees(math.atan2(sum(y for x, y, s, d, t in self.wind_dir_list),
-                                                     sum(x for x, y, s, d, t in self.wind_dir_list)))
-            avg_dir = avg_dir if avg_dir > 0 else avg_dir + 360.0
-        else:
-            avg_dir = None
-        return avg_dir
+        return self.wind_window.average_dir()
 
     def ten_minute_wind_gust(self):
         """ Calculate 10 minute wind gust.
 
-        Takes list of last 10 minutes of loop wind speed data and finds the max
-        value.  Units used are loop data units so unit conversion of the result
-        may be required.
+        Uses the window of last 10 minutes of loop wind speed data to find the
+        max value. Units used are loop data units so unit conversion of the
+        result may be required.
         Result is only considered valid if a full 10 minutes of loop wind data
         is held.
 
@@ -2435,167 +2715,361 @@ class RtgdBuffer(object):
             10 minute wind gust
         """
 
-        gust = None
-        if len(self.wind_list) > 0:
-            gust = weeutil.weeutil.max_with_none([s for s, t in self.wind_list])
-        return gust
+        return self.wind_window.max_speed()
 
     def set_lows_and_highs(self, packet):
         """ Update loop highs and lows with new loop data.
 
         Almost operates as a mini weeWX accumulator but wind data is stored in
-        lists to allow samples to be added at one end and old samples dropped
-        at the other end.
+        a sliding window to allow samples to be added at one end and old
+        samples dropped at the other end.
 
         -   Look at each loop packet and update lows and highs as required.
-        -   Add wind speed/direction data to archive_interval and 10 minute
-            lists used for average and 10 minute wind stats
+        -   Add wind speed/direction data to the wind window used for average
+            and 10 minute wind stats
 
         Inputs:
             packet: loop data packet
 
         Returns:
-            Nothing but updates various low/high stats and 'archive interval'
-            and 10 minute wind data lists
-        """
-
-        packet_d = dict(packet)
-        ts = packet_d['dateTime']
-
-        # process outside temp
-        out_temp = packet_d.get('outTemp', None)
-        if out_temp is not None:
-            self.tempL_loop = [out_temp, ts] if (self.tempL_loop[0] is None or out_temp < self.tempL_loop[0]) else \
-                self.tempL_loop
-            self.tempH_loop = [out_temp, ts] if (self.tempH_loop[0] is None or out_temp > self.tempH_loop[0]) else \
-                self.tempH_loop
-
-        # process inside temp
-        in_temp = packet_d.get('inTemp', None)
-        if in_temp is not None:
-            self.intempL_loop = [in_temp, ts] if (self.intempL_loop[0] is None or in_temp < self.intempL_loop[0]) else \
-                self.intempL_loop
-            self.intempH_loop = [in_temp, ts] if (self.intempH_loop[0] is None or in_temp > self.intempH_loop[0]) else \
-                self.intempH_loop
-
-        # process dewpoint
-        dewpoint = packet_d.get('dewpoint', None)
-        if dewpoint is not None:
-            self.dewpointL_loop = [dewpoint, ts] if \
-                self.dewpointL_loop[0] is None or (dewpoint < self.dewpointL_loop[0]) else \
-                self.dewpointL_loop
-            self.dewpointH_loop = [dewpoint, ts] if \
-                (self.dewpointH_loop[0] is None or dewpoint > self.dewpointH_loop[0]) else \
-                self.dewpointH_loop
-
-        # process appTemp
-        app_temp = packet_d.get('appTemp', None)
-        if app_temp is not None:
-            self.apptempL_loop = [app_temp, ts] if \
-                (self.apptempL_loop[0] is None or app_temp < self.apptempL_loop[0]) else \
-                self.apptempL_loop
-            self.apptempH_loop = [app_temp, ts] if \
-                (self.apptempH_loop[0] is None or app_temp > self.apptempH_loop[0]) else \
-                self.apptempH_loop
-
-        # process windchill
-        windchill = packet_d.get('windchill', None)
-        if windchill is not None:
-            self.wchillL_loop = [windchill, ts] if \
-                (self.wchillL_loop[0] is None or windchill < self.wchillL_loop[0]) else \
-                self.wchillL_loop
-
-        # process heatindex
-        heatindex = packet_d.get('heatindex', None)
-        if heatindex is not None:
-            self.heatindexH_loop = [heatindex, ts] if \
-                (self.heatindexH_loop[0] is None or heatindex > self.heatindexH_loop[0]) else \
-                self.heatindexH_loop
-
-        # process barometer
-        barometer = packet_d.get('barometer', None)
-        if barometer is not None:
-            self.pressL_loop = [barometer, ts] if \
-                (self.pressL_loop[0] is None or barometer < self.pressL_loop[0]) else \
-                self.pressL_loop
-            self.pressH_loop = [barometer, ts] if \
-                (self.pressH_loop[0] is None or barometer > self.pressH_loop[0]) else \
-                self.pressH_loop
+            Nothing but updates various low/high stats and the 10 minute wind
+            window
+        """
+
+        ts = packet['dateTime']
+
+        # update the loop period lows and highs
+        self.stats.add(packet, ts)
 
         # process rain
-        rain = packet_d.get('rain', None)
+        rain = packet.get('rain', None)
         self.rainsum += rain if rain is not None else self.rainsum
 
-        # process rainRate
-        rain_rate = packet_d.get('rainRate', None)
-        if rain_rate is not None:
-            self.rrateH_loop = [rain_rate, ts] if \
-                (self.rrateH_loop[0] is None or rain_rate > self.rrateH_loop[0]) else \
-                self.rrateH_loop
-
-        # process humidity
-        out_humidity = packet_d.get('outHumidity', None)
-        if out_humidity is not None:
-            self.humL_loop = [out_humidity, ts] if \
-                (self.humL_loop[0] is None or out_humidity < self.humL_loop[0]) else \
-                self.humL_loop
-            self.humH_loop = [out_humidity, ts] if \
-                (self.humH_loop[0] is None or out_humidity > self.humH_loop[0]) else \
-                self.humH_loop
-
-        # process UV
-        uv = packet_d.get('UV', None)
-        if uv is not None:
-            self.UVH_loop = [uv, ts] if (self.UVH_loop[0] is None or uv > self.UVH_loop[0]) else \
-                self.UVH_loop
-
-        # process radiation
-        radiation = packet_d.get('radiation', None)
-        if radiation is not None:
-            self.SolarH_loop = [radiation, ts] if \
-                (self.SolarH_loop[0] is None or radiation > self.SolarH_loop[0]) else \
-                self.SolarH_loop
-
         # process windSpeed/windDir
         # if windDir exists then get it, if it does not exist get None
-        wind_dir = packet_d.get('windDir', None)
+        wind_dir = packet.get('windDir', None)
         # if windSpeed exists get it, if it does not exist or is None then
         # get 0.0
-        wind_speed = packet_d.get('windSpeed', 0.0)
+        wind_speed = packet.get('windSpeed', 0.0)
         wind_speed = 0.0 if wind_speed is None else wind_speed
         self.windsum += wind_speed
         self.windcount += 1
         # Have we seen a new high gust? If so update self.wgustM_loop but only
         # if we have a corresponding wind direction
-        if (self.wgustM_loop[0] is None or wind_speed > self.wgustM_loop[0]) and wind_dir is not None:
-            self.wgustM_loop = [wind_speed, wind_dir, ts]
-        # average wind speed
-        self.wind_list.append([wind_speed, ts])
-        # if we have samples in our list then delete any too old
-        if len(self.wind_list) > 0:
-            # calc ts of oldest sample we want to retain
-            old_ts = ts - self.wind_period
-            # remove any samples older than 5 minutes
-            self.wind_list = [s for s in self.wind_list if s[1] > old_ts]
+        wgust_m_loop = self.wgustM_loop
+        if (wgust_m_loop[0] is None or wind_speed > wgust_m_loop[0]) and wind_dir is not None:
+            wgust_m_loop[0] = wind_speed
+            wgust_m_loop[1] = wind_dir
+            wgust_m_loop[2] = ts
+        # add the wind sample to our wind window, the window takes care of
+        # discarding any samples that are too old
+        self.wind_window.add(wind_speed, wind_dir, ts)
         # get our latest (archive_interval) average wind
         wind_m_loop = self.average_wind()
         # have we seen a new high (archive_interval) avg wind? if so update
         # self.windM_loop
-        self.windM_loop = [wind_m_loop, ts] if \
-            (self.windM_loop[0] is None or wind_m_loop > self.windM_loop[0]) else \
-            self.windM_loop
-        # update the 10 minute wind direction list, but only if windDir is not
-        # None
-        if wind_dir is not None:
-            self.wind_dir_list.append([wind_speed * math.cos(math.radians(90.0 - wind_dir)),
-                                      wind_speed * math.sin(math.radians(90.0 - wind_dir)),
-                                      wind_speed, wind_dir, ts])
-        # if we have samples in our list then delete any too old
-        if len(self.wind_dir_list) > 0:
-            # calc ts of oldest sample we want to retain
-            old_ts = ts - self.wind_period
-            # remove any samples older than 10 minutes
-            self.wind_dir_list = [s for s in self.wind_dir_list if s[4] > old_ts]
+        if self.windM_loop[0] is None or wind_m_loop > self.windM_loop[0]:
+            self.windM_loop[0] = wind_m_loop
+            self.windM_loop[1] = ts
+
+
+# ============================================================================
+#                             class LoopStats
+# ============================================================================
+
+
+class LoopStats(object):
+    """Class to track the lows and highs of loop packet obs.
+
+    The stats to be tracked are defined by a table of (obs, aggregate) pairs
+    where aggregate is 'min' or 'max'. The value and timestamp of each stat
+    are held in preallocated lists that are updated in place, so updating the
+    stats from a loop packet does not allocate any objects.
+    """
+
+    __slots__ = ('table', 'low_index', 'high_index', 'values', 'stamps', 'empty')
+
+    def __init__(self, stats):
+        """Initialise a LoopStats object.
+
+        Input:
+            stats: iterable of (obs, aggregate) pairs to be tracked
+        """
+
+        # positions of the low and high stats of each obs in the lists below
+        self.low_index = dict()
+        self.high_index = dict()
+        _obs_list = []
+        _count = 0
+        for obs, aggregate in stats:
+            if aggregate == 'min':
+                _index = self.low_index
+            elif aggregate == 'max':
+                _index = self.high_index
+            else:
+                raise ValueError("Unknown aggregate '%s' for '%s'" % (aggregate, obs))
+            if obs not in _index:
+                _index[obs] = _count
+                _count += 1
+            if obs not in _obs_list:
+                _obs_list.append(obs)
+        # the update table, one (obs, low position, high position) entry per
+        # obs with None for any aggregate that is not tracked
+        self.table = [(obs, self.low_index.get(obs), self.high_index.get(obs))
+                      for obs in _obs_list]
+        # stat values and timestamps
+        self.empty = (None,) * _count
+        self.values = list(self.empty)
+        self.stamps = list(self.empty)
+
+    def add(self, packet, ts):
+        """Update the stats with the obs in a loop packet."""
+
+        values = self.values
+        stamps = self.stamps
+        for obs, low, high in self.table:
+            value = packet.get(obs)
+            if value is None:
+                continue
+            if low is not None and (values[low] is None or value < values[low]):
+                values[low] = value
+                stamps[low] = ts
+            if high is not None and (values[high] is None or value > values[high]):
+                values[high] = value
+                stamps[high] = ts
+
+    def reset(self):
+        """Reset all stats to None."""
+
+        self.values[:] = self.empty
+        self.stamps[:] = self.empty
+
+    def low(self, obs):
+        """Return the low value of an obs."""
+
+        return self.values[self.low_index[obs]]
+
+    def low_time(self, obs):
+        """Return the timestamp of the low value of an obs."""
+
+        return self.stamps[self.low_index[obs]]
+
+    def high(self, obs):
+        """Return the high value of an obs."""
+
+        return self.values[self.high_index[obs]]
+
+    def high_time(self, obs):
+        """Return the timestamp of the high value of an obs."""
+
+        return self.stamps[self.high_index[obs]]
+
+
+# ============================================================================
+#                              class ExactSum
+# ============================================================================
+
+
+class ExactSum(object):
+    """Class to hold a running sum of floats without rounding error.
+
+    A running sum that is maintained by adding and subtracting floats
+    accumulates rounding error. Instead finite values are summed exactly as
+    integers (see exact_value()) and the sum is only rounded to a float when
+    read, so the value is the same as that returned by math.fsum() over the
+    values held, however many values have been added and subtracted.
+
+    Non-finite values cannot be represented exactly, so the number of NaN,
+    +inf and -inf values held is counted instead. While any are held the
+    value is the NaN or infinity that sum() would return.
+    """
+
+    __slots__ = ('exact', 'nans', 'pos_infs', 'neg_infs')
+
+    def __init__(self):
+        """Initialise an ExactSum object."""
+
+        self.exact = 0
+        self.nans = 0
+        self.pos_infs = 0
+        self.neg_infs = 0
+
+    def add(self, x, count=1):
+        """Add a value to the sum, a count of -1 subtracts the value."""
+
+        if math.isnan(x):
+            self.nans += count
+        elif math.isinf(x):
+            if x > 0:
+                self.pos_infs += count
+            else:
+                self.neg_infs += count
+        else:
+            self.exact += count * exact_value(x)
+
+    def subtract(self, x):
+        """Subtract a value previously added to the sum."""
+
+        self.add(x, -1)
+
+    def value(self):
+        """Return the sum as a float."""
+
+        if self.nans or (self.pos_infs and self.neg_infs):
+            return float('nan')
+        if self.pos_infs:
+            return float('inf')
+        if self.neg_infs:
+            return float('-inf')
+        return exact_float(self.exact)
+
+
+# ============================================================================
+#                             class WindWindow
+# ============================================================================
+
+
+class WindWindow(object):
+    """Class to hold a sliding window of loop wind samples.
+
+    The window holds the loop wind speed and wind direction samples received
+    in the last 'period' seconds. Rather than rebuilding and rescanning lists
+    of samples on every loop packet the window keeps running sums of wind
+    speed and of the wind vector components as well as monotonic deques of
+    wind speeds and of the wind directions of samples with a non-zero wind
+    speed, the heads of which are the window maximum speed and the window
+    minimum and maximum direction. Samples are evicted from the head of the
+    window as they age, so adding a sample, evicting a sample and obtaining any
+    window stat are all amortized O(1).
+
+    Adding and subtracting floats accumulates rounding error, so the running
+    sums are held as ExactSum objects. The average wind speed and the vector
+    average wind direction are therefore those obtained from math.fsum() over
+    the samples held, however long the window has been running. These may
+    differ in the last bit from a sum() over the samples held.
+
+    Wind speed samples are held for every loop packet, wind direction samples
+    are held only for loop packets with a non-None windDir. Sample timestamps
+    are assumed to be non-decreasing.
+    """
+
+    def __init__(self, period=600):
+        """Initialise a WindWindow object."""
+
+        # length of time in seconds to retain wind samples
+        self.period = period
+        # wind speed samples, each is a (speed, ts) tuple
+        self.speed_samples = collections.deque()
+        # wind speed samples in decreasing order of speed, each is a
+        # (speed, ts) tuple
+        self.gust_samples = collections.deque()
+        # wind direction samples, each is a (x, y, speed, dir, ts) tuple
+        self.dir_samples = collections.deque()
+        # wind direction samples with a non-zero speed in increasing and
+        # decreasing order of direction respectively, the same tuples as held
+        # in self.dir_samples
+        self.dir_min_samples = collections.deque()
+        self.dir_max_samples = collections.deque()
+        # running sums
+        self.speed_sum = ExactSum()
+        self.x_sum = ExactSum()
+        self.y_sum = ExactSum()
+
+    def add(self, speed, direction, ts):
+        """Add a wind sample to the window and evict any aged samples.
+
+        Inputs:
+            speed:     wind speed, must not be None
+            direction: wind direction, may be None
+            ts:        timestamp of the sample
+        """
+
+        self.speed_samples.append((speed, ts))
+        self.speed_sum.add(speed)
+        # discard any samples that can no longer be the window max
+        while self.gust_samples and self.gust_samples[-1][0] <= speed:
+            self.gust_samples.pop()
+        self.gust_samples.append((speed, ts))
+        if direction is not None:
+            x = speed * math.cos(math.radians(90.0 - direction))
+            y = speed * math.sin(math.radians(90.0 - direction))
+            sample = (x, y, speed, direction, ts)
+            self.dir_samples.append(sample)
+            self.x_sum.add(x)
+            self.y_sum.add(y)
+            if speed > 0:
+                # discard any samples that can no longer be the window min or
+                # max direction
+                while self.dir_min_samples and self.dir_min_samples[-1][3] >= direction:
+                    self.dir_min_samples.pop()
+                self.dir_min_samples.append(sample)
+                while self.dir_max_samples and self.dir_max_samples[-1][3] <= direction:
+                    self.dir_max_samples.pop()
+                self.dir_max_samples.append(sample)
+        self.expire(ts - self.period)
+
+    def expire(self, old_ts):
+        """Evict any samples with a timestamp at or before old_ts."""
+
+        while self.speed_samples and self.speed_samples[0][1] <= old_ts:
+            self.speed_sum.subtract(self.speed_samples.popleft()[0])
+        while self.gust_samples and self.gust_samples[0][1] <= old_ts:
+            self.gust_samples.popleft()
+        while self.dir_samples and self.dir_samples[0][4] <= old_ts:
+            sample = self.dir_samples.popleft()
+            self.x_sum.subtract(sample[0])
+            self.y_sum.subtract(sample[1])
+            if self.dir_min_samples and self.dir_min_samples[0] is sample:
+                self.dir_min_samples.popleft()
+            if self.dir_max_samples and self.dir_max_samples[0] is sample:
+                self.dir_max_samples.popleft()
+
+    def average_speed(self):
+        """Return the average wind speed of the samples in the window."""
+
+        if len(self.speed_samples) > 0:
+            return self.speed_sum.value()/float(len(self.speed_samples))
+        return 0.0
+
+    def max_speed(self):
+        """Return the max wind speed in the window or None if no samples."""
+
+        if self.gust_samples:
+            return self.gust_samples[0][0]
+        return None
+
+    def min_dir(self):
+        """Return the min wind direction of the samples with a non-zero speed.
+
+        Returns None if there are no such samples in the window.
+        """
+
+        if self.dir_min_samples:
+            return self.dir_min_samples[0][3]
+        return None
+
+    def max_dir(self):
+        """Return the max wind direction of the samples with a non-zero speed.
+
+        Returns None if there are no such samples in the window.
+        """
+
+        if self.dir_max_samples:
+            return self.dir_max_samples[0][3]
+        return None
+
+    def average_dir(self):
+        """Return the vector average wind direction of the window.
+
+        Returns None if there are no wind direction samples in the window.
+        """
+
+        if len(self.dir_samples) > 0:
+            avg_dir = 90.0 - math.degrees(math.atan2(self.y_sum.value(),
+                                                self.x_sum.value()))
+            return avg_dir if avg_dir > 0 else avg_dir + 360.0
+        return None
+
 
 # ============================================================================
 #                            Class CachedPacket
@@ -2614,13 +3088,26 @@ class CachedPacket(object):
     is missing an essential field, or overly complex code in method calculate()
     if field caching was to occur.
 
-    The cache consists of a dictionary of value, timestamp pairs where
-    timestamp is the timestamp of the packet when obs was last seen and value
-    is the value of the obs at that time. None values may be cached.
+    The cache consists of a list of field names, a parallel list of values and
+    a parallel list of timestamps where timestamp is the timestamp of the
+    packet when obs was last seen and value is the value of the obs at that
+    time. None values may be cached. A dict maps each field name to its
+    position in the lists so a packet can be cached without allocating any
+    per-field objects.
+
+    To avoid checking the age of every cached field each time a packet is
+    obtained the cache keeps a lower bound on the timestamps of all fields
+    bar those that were found to be stale when the field timestamps were last
+    scanned. The field timestamps need only be scanned again once this lower
+    bound exceeds max_age, in the meantime only the previously stale fields
+    need be checked.
 
     A cached loop packet may be obtained by calling the get_packet() method.
     """
 
+    __slots__ = ('fields', 'values', 'stamps', 'index', 'oldest', 'stale',
+                 'unit_system', 'convert_obs', 'converters')
+
     # These fields must be available in every loop packet read from the
     # cache.
     OBS = ["cloudbase", "windDir", "windrun", "inHumidity", "outHumidity",
@@ -2628,7 +3115,7 @@ class CachedPacket(object):
            "appTemp", "dewpoint", "heatindex", "humidex", "inTemp",
            "outTemp", "windchill", "UV"]
 
-    def __init__(self, rec):
+    def __init__(self, rec, extra_obs=None):
         """Initialise our cache object.
 
         The cache needs to be initialised to include all of the fields required
@@ -2639,43 +3126,107 @@ class CachedPacket(object):
         last archive record. As the archive may have many more fields than rtgd
         requires, only prime those fields that rtgd requires.
 
-        This approach does have the drawback that in situations where the
-        archive unit system is different to the loop packet unit system the
-        entire loop packet will be converted each time the cache is updated.
-        This is inefficient.
+        In situations where the archive unit system is different to the loop
+        packet unit system loop packets need to be converted before being
+        cached. Rather than convert the entire loop packet only those fields
+        in CachedPacket.OBS and any fields in extra_obs are converted and
+        cached, the conversion functions for each field being resolved once
+        per loop packet unit system.
         """
 
-        self.cache = dict()
+        # cached field names, values and last seen timestamps
+        self.fields = []
+        self.values = []
+        self.stamps = []
+        # map of field name to position in the above lists
+        self.index = dict()
         # if we have a dateTime field in our record block use that otherwise
         # use the current system time
         _ts = rec['dateTime'] if 'dateTime' in rec else int(time.time() + 0.5)
+        # lower bound of the timestamps of all fields not in self.stale
+        self.oldest = _ts
+        # positions of the fields that were stale when last scanned
+        self.stale = set()
         # only prime those fields in CachedPacket.OBS
         for _obs in CachedPacket.OBS:
             if _obs in rec and 'usUnits' in rec:
                 # only add a value if it exists and we know what units its in
-                self.cache[_obs] = {'value': rec[_obs], 'ts': _ts}
+                self.add_field(_obs, rec[_obs], _ts)
             else:
                 # otherwise set it to None
-                self.cache[_obs] = {'value': None, 'ts': _ts}
+                self.add_field(_obs, None, _ts)
         # set the cache unit system if known
         self.unit_system = rec['usUnits'] if 'usUnits' in rec else None
+        # the fields to be converted and cached when a loop packet uses a
+        # different unit system to the cache
+        self.convert_obs = list(CachedPacket.OBS)
+        for _obs in extra_obs or []:
+            if _obs not in self.convert_obs:
+                self.convert_obs.append(_obs)
+        # field conversion functions keyed by loop packet unit system
+        self.converters = dict()
+
+    def add_field(self, obs, value, ts):
+        """Add a field that has not been seen before to the cache."""
+
+        self.index[obs] = len(self.fields)
+        self.fields.append(obs)
+        self.values.append(value)
+        self.stamps.append(ts)
+        if ts < self.oldest:
+            self.oldest = ts
 
     def update(self, packet, ts):
         """Update the cache from a loop packet.
 
         If the loop packet uses a different unit system to that of the cache
-        then convert the loop packet before adding it to the cache. Update any
-        previously seen cache fields and add any loop fields that have not been
-        seen before.
+        then convert those loop packet fields we use before adding them to the
+        cache. Update any previously seen cache fields and add any loop fields
+        that have not been seen before.
         """
 
         if self.unit_system is None:
             self.unit_system = packet['usUnits']
         elif self.unit_system != packet['usUnits']:
-            packet = weewx.units.to_std_system(packet, self.unit_system)
-        for obs in [x for x in packet if x not in ['dateTime', 'usUnits']]:
-            if packet[obs] is not None:
-                self.cache[obs] = {'value': packet[obs], 'ts': ts}
+            packet = dict((obs, func(packet[obs]))
+                          for obs, func in self.get_converters(packet['usUnits'])
+                          if obs in packet)
+        index = self.index
+        values = self.values
+        stamps = self.stamps
+        for obs, value in six.iteritems(packet):
+            if value is None or obs == 'dateTime' or obs == 'usUnits':
+                continue
+            idx = index.get(obs)
+            if idx is None:
+                self.add_field(obs, value, ts)
+            else:
+                values[idx] = value
+                stamps[idx] = ts
+
+    def get_converters(self, unit_system):
+        """Get the field conversion functions for a loop packet unit system.
+
+        Returns a list of (field, function) tuples where function converts a
+        field value from unit_system to the cache unit system. Fields that do
+        not belong to a unit group are not converted.
+        """
+
+        try:
+            return self.converters[unit_system]
+        except KeyError:
+            pass
+        plan = ConversionPlan(unit_system)
+        converters = []
+        for obs in self.convert_obs:
+            (from_unit, _group) = getStandardUnitType(unit_system, obs)
+            (to_unit, _group) = getStandardUnitType(self.unit_system, obs)
+            if from_unit is None or to_unit is None:
+                converters.append((obs, _no_conversion))
+            else:
+                converters.append((obs, plan.get(from_unit, to_unit)))
+        self.converters[unit_system] = converters
+        return converters
 
     def get_value(self, obs, ts, max_age):
         """Get an obs value from the cache.
@@ -2684,10 +3235,22 @@ class CachedPacket(object):
         than max_age then None is returned.
         """
 
-        if obs in self.cache and ts - self.cache[obs]['ts'] <= max_age:
-            return self.cache[obs]['value']
+        idx = self.index.get(obs)
+        if idx is not None and ts - self.stamps[idx] <= max_age:
+            return self.values[idx]
         return None
 
+    def scan(self, ts, max_age):
+        """Find the stale fields and the oldest timestamp of the rest."""
+
+        self.stale = set()
+        self.oldest = ts
+        for idx, seen in enumerate(self.stamps):
+            if ts - seen > max_age:
+                self.stale.add(idx)
+            elif seen < self.oldest:
+                self.oldest = seen
+
     def get_packet(self, ts=None, max_age=600):
         """Get a loop packet from the cache.
 
@@ -2696,44 +3259,1587 @@ class CachedPacket(object):
 
         if ts is None:
             ts = int(time.time() + 0.5)
-        packet = {'dateTime': ts, 'usUnits': self.unit_system}
-        for obs in self.cache:
-            packet[obs] = self.get_value(obs, ts, max_age)
+        if ts - self.oldest > max_age:
+            # one or more fields may have become stale, rescan
+            self.scan(ts, max_age)
+        packet = dict(zip(self.fields, self.values))
+        for idx in self.stale:
+            if ts - self.stamps[idx] > max_age:
+                packet[self.fields[idx]] = None
+        packet['dateTime'] = ts
+        packet['usUnits'] = self.unit_system
         return packet
 
 
 # ============================================================================
-#                            Utility Functions
+#                            class ArchiveCache
 # ============================================================================
 
 
-def degree_to_compass(x):
-    """Convert degrees to ordinal compass point.
+class ArchiveCache(object):
+    """Class to cache recent archive records.
 
-    Input:
-        x: degrees
+    Trend calculations require the archive record from (about) an hour ago.
+    Obtaining this record from the database on every loop packet results in a
+    database range query per trend per loop packet. Instead the most recent
+    'period' seconds of archive records are held in memory in timestamp order
+    and records are located using a binary search.
 
-    Returns:
-        Corresponding ordinal compass point from COMPASS_POINTS. Can return
-        None.
+    The cache is primed from the database once on startup and then extended
+    as each new archive record is received. The cache provides a getRecord()
+    method with the same semantics as the weeWX database manager getRecord()
+    method so it can be used in lieu of a database manager when obtaining
+    records.
     """
 
-    if x is None:
-        return None
-    idx = int((x + 11.25) / 22.5)
-    return COMPASS_POINTS[idx]
+    def __init__(self, period=7200):
+        """Initialise an ArchiveCache object."""
 
+        # length of time in seconds to retain archive records
+        self.period = period
+        # list of cached record timestamps in ascending order
+        self.stamps = []
+        # list of cached records, in the same order as self.stamps
+        self.records = []
 
-def calc_trend(obs_type, now_vt, group, db_manager, then_ts, grace=0):
-    """ Calculate change in an observation over a specified period.
+    def prime(self, db_manager, now):
+        """Prime the cache with archive records from the database.
 
-    Inputs:
-        obs_type:   database field name of observation concerned
-        now_vt:     value of observation now (ie the finishing value)
-        group:      group our returned value must be in
-        db_manager: manager to be used
-        then_ts:    timestamp of start of trend period
-        grace:      the largest difference in time when finding the then_ts
+        Inputs:
+            db_manager: manager for the database to be used
+            now:        timestamp of the end of the period to be cached
+        """
+
+        for _rec in db_manager.genBatchRecords(now - self.period, now):
+            self.add(_rec)
+
+    def add(self, record):
+        """Add an archive record to the cache and discard any aged records."""
+
+        _ts = record['dateTime']
+        idx = bisect.bisect_left(self.stamps, _ts)
+        if idx < len(self.stamps) and self.stamps[idx] == _ts:
+            # we already have a record with this timestamp, replace it
+            self.records[idx] = dict(record)
+        else:
+            self.stamps.insert(idx, _ts)
+            self.records.insert(idx, dict(record))
+        # discard any records that have aged out of the cache
+        old_idx = bisect.bisect_left(self.stamps, self.stamps[-1] - self.period)
+        if old_idx > 0:
+            del self.stamps[:old_idx]
+            del self.records[:old_idx]
+
+    def getRecord(self, timestamp, max_delta=None):
+        """Get a single archive record with a given timestamp.
+
+        If max_delta is specified return the record closest to timestamp that
+        is no more than max_delta seconds either side of timestamp. Where two
+        records are equally close the earlier record is returned.
+
+        Inputs:
+            timestamp: the timestamp of the record required
+            max_delta: the largest difference in time that is acceptable
+
+        Returns:
+            A record dict or None if a suitable record does not exist.
+        """
+
+        if max_delta:
+            lo = bisect.bisect_left(self.stamps, timestamp - max_delta)
+            hi = bisect.bisect_right(self.stamps, timestamp + max_delta)
+            if lo >= hi:
+                return None
+            # the closest record is either side of the insertion point of
+            # timestamp
+            idx = bisect.bisect_left(self.stamps, timestamp, lo, hi)
+            if idx == hi or (idx > lo and
+                             timestamp - self.stamps[idx - 1] <= self.stamps[idx] - timestamp):
+                idx -= 1
+            return self.records[idx]
+        idx = bisect.bisect_left(self.stamps, timestamp)
+        if idx < len(self.stamps) and self.stamps[idx] == timestamp:
+            return self.records[idx]
+        return None
+
+
+# ============================================================================
+#                         class WindroseAccumulator
+# ============================================================================
+
+
+class WindroseAccumulator(object):
+    """Class to maintain a SteelSeries Weather Gauges windrose array.
+
+    The windrose is an array representing the 'amount of wind' from each of
+    the 8 or 16 compass points. The value for each compass point is determined
+    by summing the archive windSpeed values for wind from that compass point
+    over the period concerned. Resulting values are rounded to one decimal
+    point.
+
+    Rather than summing the entire period of archive data on receipt of each
+    archive record, the accumulator is seeded once from the database and then
+    updated from each archive record. Each new record is added to its compass
+    point and any records that have aged out of the period are subtracted, so
+    the cost of an update does not depend on the length of the period.
+
+    Per compass point sums are held as ExactSum objects so that no rounding
+    error accumulates as records are added and removed. Records are assumed
+    to arrive in timestamp order, any record that is no newer than the newest
+    record seen is ignored. As the database stores a NaN as NULL, records with
+    a NaN or infinite windDir or a NaN windSpeed are ignored as SQL ignores a
+    NULL windDir or windSpeed.
+    """
+
+    def __init__(self, period, points):
+        """Initialise a WindroseAccumulator object.
+
+        Inputs:
+            period: Calculate the windrose using the last period (in seconds)
+                    of archive data.
+            points: The number of compass points to use, normally 8 or 16.
+        """
+
+        self.period = period
+        self.points = points
+        # determine the factor to be used to divide numerical windDir into
+        # cardinal/ordinal compass points
+        self.angle = 360.0/points
+        # the unit system used by the database
+        self.unit_system = None
+        # records in the period, each is a (ts, compass point, speed) tuple
+        self.samples = collections.deque()
+        # sum of windSpeed for each compass point
+        self.sums = [ExactSum() for x in range(points)]
+        # timestamp of the newest sample seen
+        self.last_ts = None
+
+    def prime(self, db_manager, now):
+        """Seed the accumulator with archive data from the database.
+
+        Inputs:
+            db_manager: A manager object for the database to be used.
+            now:        Timestamp of the end of the windrose period.
+        """
+
+        self.unit_system = db_manager.std_unit_system
+        # create an interpolation dict for our query
+        inter_dict = {'table_name': db_manager.table_name,
+                      'ts': now - self.period}
+        # the query to be used
+        windrose_sql = "SELECT dateTime,windDir,windSpeed "\
+                       "FROM %(table_name)s WHERE dateTime>%(ts)s "\
+                       "ORDER BY dateTime"
+        for _row in db_manager.genSql(windrose_sql % inter_dict):
+            self.add(*_row)
+        self.expire(now - self.period)
+
+    def add_record(self, record):
+        """Update the accumulator with an archive record.
+
+        Records not in the unit system of the database are converted before
+        use. Any records that have aged out of the period are removed.
+        """
+
+        if self.unit_system is not None and record['usUnits'] != self.unit_system:
+            record = weewx.units.to_std_system(record, self.unit_system)
+        self.add(record['dateTime'], record.get('windDir'), record.get('windSpeed'))
+        self.expire(record['dateTime'] - self.period)
+
+    def add(self, ts, wind_dir, wind_speed):
+        """Add a windDir/windSpeed sample to the accumulator.
+
+        Samples that are no newer than the newest sample seen are ignored, a
+        record may be seen both when priming from the database and when
+        received from the queue.
+        """
+
+        if self.last_ts is not None and ts <= self.last_ts:
+            return
+        self.last_ts = ts
+        # we can ignore any samples with a None windDir or windSpeed, or a
+        # windDir or windSpeed the database would not hold
+        if wind_dir is None or wind_speed is None:
+            return
+        if math.isnan(wind_dir) or math.isinf(wind_dir) or math.isnan(wind_speed):
+            return
+        # determine the compass point, rounding half away from zero as SQL
+        # ROUND() does, north will be either the '0' or the 'points' compass
+        # point
+        _x = wind_dir/self.angle
+        point = int(math.copysign(math.floor(abs(_x) + 0.5), _x)) % self.points
+        self.samples.append((ts, point, wind_speed))
+        self.sums[point].add(wind_speed)
+
+    def expire(self, old_ts):
+        """Remove any samples with a timestamp at or before old_ts."""
+
+        while self.samples and self.samples[0][0] <= old_ts:
+            _ts, point, wind_speed = self.samples.popleft()
+            self.sums[point].subtract(wind_speed)
+
+    def get_rose(self):
+        """Return the windrose array with values rounded to one decimal place.
+
+        Return:
+            List containing windrose data with 'points' elements.
+        """
+
+        return [round(x.value(), 1) for x in self.sums]
+
+
+# ============================================================================
+#                            class AggregateStore
+# ============================================================================
+
+
+class AggregateStore(object):
+    """Class to maintain alltime and to date aggregates.
+
+    gauge-data.txt requires the alltime barometer min/max and, optionally,
+    month and year to date rainfall. Obtaining these from the database on
+    receipt of each archive record requires scanning the daily summary tables.
+    Instead the aggregates are seeded once from the daily summaries and then
+    updated from the current day summary each archive record:
+
+    -   alltime barometer min/max is the min/max of the seeded values and of
+        each day summary seen
+    -   month and year to date rainfall are held as the total for the
+        completed days of the month/year plus the rain total from the current
+        day summary. When the day changes the final rain total for the
+        completed day is added to the month and year totals, which are reset
+        on the change of month and year respectively.
+
+    Month and year to date rainfall are only seeded, maintained and
+    checkpointed if they are enabled.
+
+    The aggregate state is saved to a JSON format checkpoint file each time it
+    is updated. On startup a valid checkpoint for the current or previous day
+    is used in lieu of seeding from the database.
+
+    All values are in the unit system used by the database.
+    """
+
+    # version number of the checkpoint file format
+    CHECKPOINT_VERSION = 2
+
+    def __init__(self, checkpoint_file=None, month_rain=True, year_rain=True):
+        """Initialise an AggregateStore object."""
+
+        # path and file name of checkpoint file, None if not used
+        self.checkpoint_file = checkpoint_file
+        # whether month and year to date rainfall are maintained
+        self.month_rain = month_rain
+        self.year_rain = year_rain
+        # database name, table name and unit system, used to validate a
+        # checkpoint
+        self.database_name = None
+        self.table_name = None
+        self.unit_system = None
+        # start of day timestamp of the current day
+        self.day_ts = None
+        # rainfall for the completed days of the current month/year
+        self.month_base = None
+        self.year_base = None
+        # rainfall for the current day to date
+        self.day_rain = None
+        # alltime barometer min/max
+        self.min_barometer = None
+        self.max_barometer = None
+
+    def setup(self, db_manager, day_stats):
+        """Initialise the aggregates from a checkpoint or the database.
+
+        Inputs:
+            db_manager: manager for the database to be used
+            day_stats:  day summary for the current day
+        """
+
+        self.database_name = getattr(db_manager.connection, 'database_name', None)
+        self.table_name = db_manager.table_name
+        self.unit_system = db_manager.std_unit_system
+        if not self.load(day_stats.timespan.start):
+            self.seed(db_manager, day_stats.timespan.start)
+        self.update(db_manager, day_stats)
+
+    def seed(self, db_manager, day_ts):
+        """Seed the aggregates from the database daily summaries."""
+
+        # alltime barometer min/max
+        inter_dict = {'table_name': db_manager.table_name}
+        minmax_sql = "SELECT MIN(min), MAX(max) FROM %(table_name)s_day_barometer"
+        _row = db_manager.getSql(minmax_sql % inter_dict)
+        if not _row or None in _row:
+            self.min_barometer = self.max_barometer = None
+        else:
+            self.min_barometer, self.max_barometer = _row
+        # rainfall for the completed days of the month and year
+        if self.month_rain:
+            self.month_base = self.get_rain(db_manager,
+                                            weeutil.weeutil.TimeSpan(self.month_start(day_ts),
+                                                                     day_ts))
+        if self.year_rain:
+            self.year_base = self.get_rain(db_manager,
+                                           weeutil.weeutil.TimeSpan(self.year_start(day_ts),
+                                                                    day_ts))
+        self.day_ts = day_ts
+        if weewx.debug >= 2:
+            log.debug("aggregates seeded from database")
+
+    def update(self, db_manager, day_stats, record=None):
+        """Update the aggregates with the current day summary.
+
+        Inputs:
+            db_manager: manager for the database to be used
+            day_stats:  day summary for the current day
+            record:     the archive record that prompted the update, if any
+        """
+
+        # a new or empty database has no unit system until the first record
+        # is saved, so take the unit system from the record if we need to
+        if self.unit_system is None and record is not None:
+            self.unit_system = record.get('usUnits')
+        day_ts = day_stats.timespan.start
+        if day_ts != self.day_ts:
+            if self.day_ts is not None and day_ts == startOfDay(self.day_ts + 36 * 3600):
+                # we have moved on to the next day, include the completed day
+                # in our aggregates
+                self.roll_day(db_manager, day_ts)
+            else:
+                # we have jumped more than a day, or gone backwards, our
+                # aggregates cannot be rolled forward so seed them again
+                self.seed(db_manager, day_ts)
+        # update from the current day summary
+        if 'barometer' in day_stats:
+            self.update_barometer(day_stats['barometer'].min, day_stats['barometer'].max)
+        if self.month_rain or self.year_rain:
+            if 'rain' in day_stats and day_stats['rain'].sum is not None:
+                self.day_rain = day_stats['rain'].sum
+            else:
+                self.day_rain = 0.0
+        self.save()
+
+    def roll_day(self, db_manager, day_ts):
+        """Fold the final stats for the completed day into our aggregates."""
+
+        inter_dict = {'table_name': db_manager.table_name,
+                      'ts': self.day_ts}
+        # final barometer min/max for the completed day
+        _row = db_manager.getSql("SELECT min, max FROM %(table_name)s_day_barometer "
+                                 "WHERE dateTime=%(ts)s" % inter_dict)
+        if _row:
+            self.update_barometer(_row[0], _row[1])
+        # final rain total for the completed day
+        if self.month_rain or self.year_rain:
+            _row = db_manager.getSql("SELECT sum FROM %(table_name)s_day_rain "
+                                     "WHERE dateTime=%(ts)s" % inter_dict)
+            _rain = _row[0] if _row and _row[0] is not None else 0.0
+            if self.month_rain:
+                if self.month_start(day_ts) == self.month_start(self.day_ts):
+                    self.month_base += _rain
+                else:
+                    self.month_base = 0.0
+            if self.year_rain:
+                if self.year_start(day_ts) == self.year_start(self.day_ts):
+                    self.year_base += _rain
+                else:
+                    self.year_base = 0.0
+        self.day_ts = day_ts
+
+    def update_barometer(self, min_baro, max_baro):
+        """Update the alltime barometer min/max."""
+
+        self.min_barometer = min_with_none([self.min_barometer, min_baro])
+        self.max_barometer = max_with_none([self.max_barometer, max_baro])
+
+    def get_stats(self):
+        """Get the aggregates as a dict.
+
+        Returns a dict keyed by the names of the RealtimeGaugeDataThread
+        properties used to hold the aggregates. Rainfall values are returned
+        as ValueTuples or None if the database unit system is not yet known,
+        and are only included if enabled.
+        """
+
+        _stats = {'min_barometer': self.min_barometer,
+                  'max_barometer': self.max_barometer}
+        for _key, _enabled, _base in (('month_rain', self.month_rain, self.month_base),
+                                      ('year_rain', self.year_rain, self.year_base)):
+            if not _enabled:
+                continue
+            if self.unit_system is None:
+                _stats[_key] = None
+            else:
+                _unit, _group = getStandardUnitType(self.unit_system, 'rain')
+                _day_rain = self.day_rain if self.day_rain is not None else 0.0
+                _rain = _base + _day_rain if _base is not None else None
+                _stats[_key] = ValueTuple(_rain, _unit, _group)
+        return _stats
+
+    def load(self, day_ts):
+        """Load the aggregates from the checkpoint file.
+
+        A checkpoint is only used if it was saved from the same database and
+        is for the current or previous day.
+
+        Returns:
+            True if a valid checkpoint was loaded otherwise False.
+        """
+
+        if self.checkpoint_file is None:
+            return False
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                _state = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            if weewx.debug >= 2:
+                log.debug("Unable to load checkpoint file '%s': %s" % (self.checkpoint_file, e))
+            return False
+        try:
+            if (_state['version'] != self.CHECKPOINT_VERSION or
+                    _state['database_name'] != self.database_name or
+                    _state['table_name'] != self.table_name or
+                    _state['unit_system'] != self.unit_system):
+                return False
+            if _state['day_ts'] != day_ts and startOfDay(_state['day_ts'] + 36 * 3600) != day_ts:
+                return False
+            # a checkpoint saved while a rainfall aggregate was disabled cannot
+            # be used to provide that aggregate
+            if ((self.month_rain and _state['month_base'] is None) or
+                    (self.year_rain and _state['year_base'] is None)):
+                return False
+            self.day_ts = _state['day_ts']
+            self.month_base = _state['month_base'] if self.month_rain else None
+            self.year_base = _state['year_base'] if self.year_rain else None
+            self.min_barometer = _state['min_barometer']
+            self.max_barometer = _state['max_barometer']
+        except (KeyError, TypeError):
+            return False
+        if weewx.debug >= 2:
+            log.debug("aggregates loaded from checkpoint file '%s'" % self.checkpoint_file)
+        return True
+
+    def save(self):
+        """Save the aggregates to the checkpoint file.
+
+        An atomic write is used so an interrupted write does not leave a
+        corrupt checkpoint file.
+        """
+
+        if self.checkpoint_file is None:
+            return
+        _state = {'version': self.CHECKPOINT_VERSION,
+                  'database_name': self.database_name,
+                  'table_name': self.table_name,
+                  'unit_system': self.unit_system,
+                  'day_ts': self.day_ts,
+                  'month_base': self.month_base,
+                  'year_base': self.year_base,
+                  'min_barometer': self.min_barometer,
+                  'max_barometer': self.max_barometer}
+        _tmp_file = self.checkpoint_file + '.tmp'
+        try:
+            with open(_tmp_file, 'w') as f:
+                json.dump(_state, f)
+            os.rename(_tmp_file, self.checkpoint_file)
+        except (IOError, OSError) as e:
+            log.error("Unable to save checkpoint file '%s': %s" % (self.checkpoint_file, e))
+
+    @staticmethod
+    def get_rain(db_manager, tspan):
+        """Calculate rainfall over a given timespan."""
+
+        if tspan.start >= tspan.stop:
+            return 0.0
+        _rain_vt = db_manager.getAggregate(tspan, 'rain', 'sum')
+        if _rain_vt and _rain_vt.value is not None:
+            return _rain_vt.value
+        return 0.0
+
+    @staticmethod
+    def month_start(day_ts):
+        """Get the timestamp of the start of the month containing day_ts."""
+
+        _date = datetime.date.fromtimestamp(day_ts).replace(day=1)
+        return int(time.mktime(_date.timetuple()))
+
+    @staticmethod
+    def year_start(day_ts):
+        """Get the timestamp of the start of the year containing day_ts."""
+
+        _date = datetime.date.fromtimestamp(day_ts).replace(month=1, day=1)
+        return int(time.mktime(_date.timetuple()))
+
+
+# ============================================================================
+#                          class ConversionPlan
+# ============================================================================
+
+
+class ConversionPlan(object):
+    """Class to hold pre-resolved unit conversions.
+
+    Converting each value via weewx.units.convert() requires a ValueTuple to
+    be constructed and the conversion function to be looked up on every
+    call. Since the source and target units only change when the packet unit
+    system changes the conversion functions are resolved once and each
+    conversion is then a single function call.
+
+    Conversions are specified as keyword arguments of the form:
+
+        name=(obs_type, target_unit)
+
+    where obs_type is used to determine the source unit in the packet unit
+    system. Each conversion is available as a callable attribute 'name' that
+    takes a value in the source unit and returns the value in the target
+    unit. None values are returned as None.
+    """
+
+    def __init__(self, unit_system, **conversions):
+        """Initialise a ConversionPlan object."""
+
+        self.unit_system = unit_system
+        # cache of conversion functions keyed by (from unit, to unit)
+        self.cache = {}
+        for name, (obs_type, target_unit) in six.iteritems(conversions):
+            (_unit, _group) = getStandardUnitType(unit_system, obs_type)
+            setattr(self, name, self.get(_unit, target_unit))
+
+    def get(self, from_unit, to_unit):
+        """Get a function to convert values between two units.
+
+        Raises a KeyError if the conversion is not supported.
+        """
+
+        try:
+            return self.cache[(from_unit, to_unit)]
+        except KeyError:
+            pass
+        if from_unit == to_unit:
+            func = _no_conversion
+        else:
+            func = _make_conversion(weewx.units.conversionDict[from_unit][to_unit])
+        self.cache[(from_unit, to_unit)] = func
+        return func
+
+
+def _no_conversion(value):
+    """Return a value unchanged."""
+
+    return value
+
+
+def _make_conversion(conversion_func):
+    """Wrap a conversion function so that None is returned as None."""
+
+    def convert_value(value):
+        return conversion_func(value) if value is not None else None
+    return convert_value
+
+
+# ============================================================================
+#                           class DbQueryCounter
+# ============================================================================
+
+
+class DbQueryCounter(object):
+    """Class to count the queries made via a weeWX database manager.
+
+    Wraps a weeWX database manager object and passes through all attribute
+    access to the manager. Calls to any of the manager query methods are
+    counted.
+    """
+
+    # manager methods that query the database
+    QUERY_METHODS = ('getSql', 'genSql', 'getSqlVectors', 'getRecord',
+                     'genBatchRecords', 'lastGoodStamp', 'firstGoodStamp',
+                     'getAggregate', '_get_day_summary')
+
+    def __init__(self, manager):
+        """Initialise a DbQueryCounter object."""
+
+        self.manager = manager
+        # number of queries made
+        self.count = 0
+
+    def __getattr__(self, name):
+        """Pass through attribute access, counting any query method calls."""
+
+        attr = getattr(self.manager, name)
+        if name in self.QUERY_METHODS:
+            def counted(*args, **kwargs):
+                self.count += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+# ============================================================================
+#                            class UploadThread
+# ============================================================================
+
+
+class UploadThread(threading.Thread):
+    """Thread to upload data to a remote destination.
+
+    Uploading data inline from the rtgd thread means a slow or unreachable
+    destination stalls generation of gauge-data.txt. Instead data to be
+    uploaded is placed in a single slot and uploaded by this thread. If data
+    is submitted while an earlier submission is waiting in the slot the
+    earlier submission is replaced, so only the latest data is ever uploaded
+    and the rtgd thread never waits on the network.
+    """
+
+    def __init__(self, name, upload):
+        """Initialise an UploadThread object.
+
+        Inputs:
+            name:   name to be used for the thread
+            upload: function to be called with each submission to perform the
+                    upload, returns True if the upload succeeded
+        """
+
+        # initialize my superclass
+        super(UploadThread, self).__init__()
+
+        self.name = name
+        self.daemon = True
+        self.upload = upload
+        # our slot, None if there is nothing waiting to be uploaded
+        self.slot = None
+        self.condition = threading.Condition()
+        self.stopping = False
+        # number of submissions received, uploaded, whose upload failed, was
+        # not attempted or raised an exception and replaced by a later
+        # submission before being uploaded
+        self.submitted = 0
+        self.uploaded = 0
+        self.failed = 0
+        self.superseded = 0
+        # most recent successful upload latencies in seconds
+        self.latencies = collections.deque(maxlen=1000)
+
+    def submit(self, data):
+        """Submit data to be uploaded, replacing any data waiting upload."""
+
+        with self.condition:
+            if self.slot is not None:
+                self.superseded += 1
+            self.slot = data
+            self.submitted += 1
+            self.condition.notify()
+
+    def stats(self):
+        """Return a dict of submission statistics."""
+
+        return {'submitted': self.submitted,
+                'uploaded': self.uploaded,
+                'failed': self.failed,
+                'superseded': self.superseded,
+                'latency': calc_percentiles(self.latencies)}
+
+    def stop(self, timeout=None):
+        """Stop the thread, any data waiting upload is discarded."""
+
+        with self.condition:
+            self.stopping = True
+            self.slot = None
+            self.condition.notify()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        """Wait for data to be submitted and upload it."""
+
+        while True:
+            with self.condition:
+                while self.slot is None and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                data = self.slot
+                self.slot = None
+            # wrap in a try..except so a failed upload does not kill the
+            # thread
+            t1 = time.time()
+            try:
+                result = self.upload(data)
+            except Exception as e:
+                result = False
+                log.error("%s: Unexpected exception of type %s: %s" % (self.name,
+                                                                      type(e),
+                                                                      e))
+            if result:
+                self.uploaded += 1
+                self.latencies.append(time.time() - t1)
+            else:
+                self.failed += 1
+
+
+# ============================================================================
+#                           class CircuitBreaker
+# ============================================================================
+
+
+class CircuitBreaker(object):
+    """Class to track the health of a remote destination.
+
+    Uploading to a dead destination costs a full timeout on every attempt. A
+    CircuitBreaker is used to stop attempting uploads to a failing
+    destination and to only re-try the destination after an exponentially
+    increasing backoff period.
+
+    The breaker has three states:
+
+    closed:    the destination is healthy and all uploads are attempted
+    open:      the destination has failed threshold consecutive times, uploads
+               are not attempted until the backoff period has expired
+    half-open: the backoff period has expired, a single trial upload is
+               attempted. If the trial succeeds the breaker is closed,
+               otherwise the breaker is re-opened with double the previous
+               backoff period up to a maximum of max_backoff seconds.
+
+    Each change of state is logged at info level.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, threshold=3, backoff=5, max_backoff=300):
+        """Initialise a CircuitBreaker object."""
+
+        self.name = name
+        # number of consecutive failures that will open the breaker
+        self.threshold = max(threshold, 1)
+        # initial and maximum backoff periods in seconds
+        self.initial_backoff = backoff
+        self.max_backoff = max_backoff
+        self.state = CircuitBreaker.CLOSED
+        # number of consecutive failures
+        self.failures = 0
+        # current backoff period and the time the backoff period expires
+        self.backoff = None
+        self.retry_ts = None
+        # number of times the breaker has been checked, number of times the
+        # breaker has opened and number of uploads not attempted because the
+        # breaker was open
+        self.checks = 0
+        self.opened = 0
+        self.skipped = 0
+
+    def allow(self):
+        """Return True if an upload should be attempted."""
+
+        self.checks += 1
+        if self.state == CircuitBreaker.OPEN:
+            if time.time() < self.retry_ts:
+                self.skipped += 1
+                return False
+            # the backoff period has expired so allow a trial upload
+            self.state = CircuitBreaker.HALF_OPEN
+            log.info("%s: backoff period expired, attempting a trial upload" % self.name)
+        return True
+
+    def success(self):
+        """Record a successful upload."""
+
+        if self.state != CircuitBreaker.CLOSED:
+            log.info("%s: destination has recovered" % self.name)
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.backoff = None
+        self.retry_ts = None
+
+    def failure(self):
+        """Record a failed upload."""
+
+        self.failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN:
+            # the trial upload failed so back off for longer
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        elif self.state == CircuitBreaker.CLOSED and self.failures >= self.threshold:
+            self.backoff = self.initial_backoff
+        else:
+            return
+        self.state = CircuitBreaker.OPEN
+        self.retry_ts = time.time() + self.backoff
+        self.opened += 1
+        log.info("%s: %d consecutive failures, "
+                 "uploads suspended for %d seconds" % (self.name,
+                                                       self.failures,
+                                                       self.backoff))
+
+    def stats(self):
+        """Return a dict of breaker state and statistics."""
+
+        return {'state': self.state,
+                'checks': self.checks,
+                'failures': self.failures,
+                'backoff': self.backoff,
+                'retry_ts': self.retry_ts,
+                'opened': self.opened,
+                'skipped': self.skipped}
+
+
+# ============================================================================
+#                          class KeepAliveHttpClient
+# ============================================================================
+
+
+class KeepAliveHttpClient(object):
+    """Class to POST data to a URL over a persistent HTTP/1.1 connection.
+
+    Opening a new connection for every POST results in a TCP connect, and for
+    https URLs a TLS handshake, for every loop packet. Instead a single
+    connection is opened and re-used for subsequent POSTs. If the connection
+    has been closed by the server or otherwise failed it is discarded and the
+    request is re-tried once on a new connection.
+
+    A persistent connection is made directly to the host in the URL and does
+    not follow redirects. So that the behaviour of urlopen() is retained, if a
+    proxy is configured for the URL (eg via the http_proxy or https_proxy
+    environment variables) all POSTs are made via urlopen(). A POST that
+    receives a redirect response is not repeated, instead the redirect is
+    followed once with a GET request via urlopen() as urlopen() would have
+    followed it.
+
+    Connection re-use and POST latency statistics are kept for monitoring.
+    """
+
+    # number of POST latencies to retain for calculating percentiles
+    LATENCY_SAMPLES = 1000
+    # response status codes that urlopen() would follow as a redirect of a
+    # POST, the redirect is followed with a GET request
+    REDIRECT_CODES = (301, 302, 303)
+
+    def __init__(self, url, timeout=2):
+        """Initialise a KeepAliveHttpClient object."""
+
+        self.url = url
+        self.timeout = timeout
+        _parts = urllib.parse.urlsplit(url)
+        self.scheme = _parts.scheme.lower()
+        self.host = _parts.hostname
+        self.port = _parts.port
+        self.path = _parts.path or '/'
+        if _parts.query:
+            self.path = '?'.join([self.path, _parts.query])
+        # our connection, None if we do not have an open connection
+        self.connection = None
+        # if a proxy is to be used for our URL we must use urlopen()
+        self.use_urllib = (self.scheme in urllib.request.getproxies() and
+                           not urllib.request.proxy_bypass(self.host))
+        # opener used for urlopen() style POSTs, this picks up any proxy
+        # settings in force when we are created
+        self.opener = urllib.request.build_opener()
+        # number of POSTs made, number of POSTs that re-used an open
+        # connection, number of connections opened and number of POSTs made
+        # via urlopen()
+        self.requests = 0
+        self.reused = 0
+        self.connections = 0
+        self.urllib_requests = 0
+        # most recent POST latencies in seconds
+        self.latencies = collections.deque(maxlen=self.LATENCY_SAMPLES)
+
+    def connect(self):
+        """Open a new connection to our host."""
+
+        self.close()
+        if self.scheme == 'https':
+            self.connection = http_client.HTTPSConnection(self.host, self.port,
+                                                          timeout=self.timeout)
+        else:
+            self.connection = http_client.HTTPConnection(self.host, self.port,
+                                                         timeout=self.timeout)
+        self.connections += 1
+
+    def close(self):
+        """Close our connection if it is open."""
+
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except (socket.error, http_client.HTTPException):
+                pass
+            self.connection = None
+
+    def post(self, body, headers=None):
+        """POST data to our URL.
+
+        If a re-used connection fails before a response is received the
+        connection is discarded and the POST is made once more on a new
+        connection. Any other failure is raised to the caller.
+
+        Inputs:
+            body:    the data to be posted, str or bytes
+            headers: dict of additional headers to send
+
+        Returns:
+            A tuple consisting of the response status code and response body
+        """
+
+        # under python 3 POST data should be bytes
+        try:
+            body_b = body.encode('utf-8')
+        except (TypeError, AttributeError, UnicodeDecodeError):
+            body_b = body
+        t1 = time.time()
+        if self.use_urllib:
+            return self.post_urllib(body_b, headers, t1)
+        _headers = {'Connection': 'keep-alive'}
+        if headers is not None:
+            _headers.update(headers)
+        for attempt in range(2):
+            reused = self.connection is not None
+            if not reused:
+                self.connect()
+            try:
+                self.connection.request('POST', self.path, body_b, _headers)
+                response = self.connection.getresponse()
+                # we must read the entire response before the connection can
+                # be re-used
+                response_body = response.read()
+            except (socket.error, http_client.HTTPException):
+                self.close()
+                # a stale re-used connection is the likely cause so retry
+                # once on a new connection
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.getheader('connection', '').lower() == 'close':
+                self.close()
+            self.requests += 1
+            if reused:
+                self.reused += 1
+            if response.status in self.REDIRECT_CODES and response.getheader('location'):
+                # the POST has been made so do not repeat it, just follow the
+                # redirect
+                return self.follow_redirect(response.getheader('location'), t1)
+            self.latencies.append(time.time() - t1)
+            return response.status, response_body.decode('utf-8', 'replace')
+
+    def post_urllib(self, body, headers, t1):
+        """POST data to our URL as urlopen() would.
+
+        Used when a proxy is configured or to follow a redirect. An HTTPError
+        response is returned rather than raised so that all responses are
+        handled in the same way.
+
+        Inputs:
+            body:    the data to be posted, bytes
+            headers: dict of additional headers to send
+            t1:      time the POST commenced
+
+        Returns:
+            A tuple consisting of the response status code and response body
+        """
+
+        self.requests += 1
+        return self.open_urllib(urllib.request.Request(self.url, body, headers or {}), t1)
+
+    def follow_redirect(self, location, t1):
+        """Follow a redirect response to a POST as urlopen() would.
+
+        urlopen() follows a 301, 302 or 303 redirect of a POST with a GET
+        request to the new location without any data, any further redirects
+        are followed by urlopen().
+
+        Inputs:
+            location: the Location header of the redirect response
+            t1:       time the POST commenced
+
+        Returns:
+            A tuple consisting of the response status code and response body
+        """
+
+        _url = urllib.parse.urljoin(self.url, location)
+        return self.open_urllib(urllib.request.Request(_url), t1)
+
+    def open_urllib(self, request, t1):
+        """Make a request via urlopen().
+
+        An HTTPError response is returned rather than raised so that all
+        responses are handled in the same way.
+
+        Inputs:
+            request: the urllib Request to be made
+            t1:      time the POST commenced
+
+        Returns:
+            A tuple consisting of the response status code and response body
+        """
+
+        try:
+            response = self.opener.open(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            response = e
+        response_body = response.read()
+        self.urllib_requests += 1
+        self.latencies.append(time.time() - t1)
+        return response.getcode(), response_body.decode('utf-8', 'replace')
+
+    def reuse_rate(self):
+        """Return the proportion of POSTs that re-used an open connection."""
+
+        return float(self.reused) / self.requests if self.requests else None
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        """Return POST latency percentiles in seconds.
+
+        Uses the nearest rank method over the most recent POST latencies.
+
+        Inputs:
+            percentiles: iterable of percentiles to calculate
+
+        Returns:
+            A dict of latencies keyed by percentile, latencies are None if no
+            POSTs have been made.
+        """
+
+        return calc_percentiles(self.latencies, percentiles)
+
+    def stats(self):
+        """Return a dict of connection and latency statistics."""
+
+        return {'requests': self.requests,
+                'connections': self.connections,
+                'urllib_requests': self.urllib_requests,
+                'reuse_rate': self.reuse_rate(),
+                'latency': self.latency_percentiles()}
+
+
+# ============================================================================
+#                          class SnapshotEncoder
+# ============================================================================
+
+
+class SnapshotEncoder(object):
+    """Class to serialise gauge-data snapshots to JSON.
+
+    Output is identical to json.dumps(data, separators=(',', ':'),
+    sort_keys=True). Rather than sorting and encoding the keys on every call
+    the sorted key order and a format template containing the encoded keys
+    are computed once and re-used for as long as the snapshot keys do not
+    change. Only the values are encoded on each call.
+    """
+
+    # types encoded directly as JSON strings
+    STRING_TYPES = (str, six.text_type)
+
+    def __init__(self):
+        """Initialise a SnapshotEncoder object."""
+
+        # snapshot keys in sorted order
+        self.keys = None
+        # callable returning a tuple of snapshot values in key order
+        self.getter = None
+        # format template with the encoded keys and a placeholder for each
+        # encoded value
+        self.template = None
+        # the encoded values of the last snapshot
+        self.parts = None
+        # encoders for string and other values, re-using a single encoder
+        # avoids json.dumps() constructing an encoder for every value
+        self.encode_string = json.encoder.encode_basestring_ascii
+        self.encode_value = json.JSONEncoder(separators=(',', ':'),
+                                             sort_keys=True).encode
+
+    def encode(self, data):
+        """Serialise a snapshot to a JSON string.
+
+        Inputs:
+            data: dictionary of gauge-data.txt data elements
+
+        Returns:
+            The serialised snapshot.
+        """
+
+        try:
+            if len(data) != len(self.keys):
+                raise KeyError
+            values = self.getter(data)
+        except (KeyError, TypeError):
+            # the keys have changed so (re)compute our key order and template
+            self.compile(data)
+            values = self.getter(data)
+        _str_types = self.STRING_TYPES
+        _encode_string = self.encode_string
+        _encode_value = self.encode_value
+        self.parts = tuple([_encode_string(v) if v.__class__ in _str_types else _encode_value(v)
+                            for v in values])
+        return self.template % self.parts
+
+    def compile(self, data):
+        """Compute the key order and template for a given set of keys."""
+
+        self.keys = sorted(data)
+        if len(self.keys) == 0:
+            self.getter = lambda d: ()
+        elif len(self.keys) == 1:
+            # itemgetter with a single key does not return a tuple
+            _key = self.keys[0]
+            self.getter = lambda d: (d[_key],)
+        else:
+            self.getter = operator.itemgetter(*self.keys)
+        self.template = ''.join(['{',
+                                 ','.join([self.encode_string(k).replace('%', '%%') + ':%s'
+                                           for k in self.keys]),
+                                 '}'])
+
+    def fingerprint(self, exclude):
+        """Return the last serialised snapshot less the excluded keys.
+
+        Inputs:
+            exclude: set of keys to exclude from the fingerprint
+
+        Returns:
+            A string identifying the content of the last snapshot.
+        """
+
+        return ','.join([''.join([k, ':', part])
+                         for k, part in zip(self.keys, self.parts) if k not in exclude])
+
+
+# ============================================================================
+#                          class SnapshotServer
+# ============================================================================
+
+
+class SnapshotServer(threading.Thread):
+    """Thread to serve the latest gauge-data snapshot via HTTP.
+
+    Serving gauge-data.txt from file requires an external web server and a
+    write, rename and read cycle per snapshot. Instead the latest snapshot is
+    held in memory and served directly by a multi-threaded HTTP server.
+
+    Each snapshot is served with an ETag derived from the snapshot dateTime
+    and sequence number, so snapshots sharing a dateTime have distinct ETags.
+    Requests that include a matching If-None-Match header are answered with a
+    304 response. Clients that accept gzip encoding are sent a gzip
+    compressed snapshot, the snapshot is compressed at most once.
+
+    Clients may also subscribe to a Server-Sent Events stream, each new
+    snapshot is then pushed to the client as it is published. Each snapshot
+    event is serialised once and shared by all subscribers. Each subscriber
+    has a bounded queue of pending events, a subscriber whose queue is full
+    is too slow and is disconnected rather than buffering events without
+    limit.
+
+    Subscribers may instead request a delta stream. Each snapshot is given a
+    sequence number and delta subscribers are sent only those fields that
+    have changed since the previous snapshot. A keyframe containing the full
+    snapshot is sent to each new delta subscriber and to all delta
+    subscribers every keyframe_interval snapshots. Field values in a delta are
+    absolute values so a delta with a sequence number no greater than that of
+    the last keyframe received may be safely applied or ignored.
+    """
+
+    # seconds between keep alive comments sent to idle event subscribers
+    KEEPALIVE = 15
+
+    def __init__(self, host='', port=8080, path='/gauge-data.txt',
+                 events_path='/events', max_pending=10, keyframe_interval=60):
+        """Initialise a SnapshotServer object."""
+
+        # initialize my superclass
+        super(SnapshotServer, self).__init__()
+
+        self.name = 'RtgdHttpThread'
+        self.daemon = True
+        self.path = path
+        self.events_path = events_path
+        # maximum number of events queued for a subscriber, must be at least
+        # one as a queue with a maxsize of 0 is unbounded
+        self.max_pending = max(max_pending, 1)
+        # our event subscribers and delta event subscribers, each is a bounded
+        # queue of pending events
+        self.subscribers = set()
+        self.delta_subscribers = set()
+        self.subscribers_lock = threading.Lock()
+        # number of snapshots between delta stream keyframes
+        self.keyframe_interval = max(keyframe_interval, 1)
+        # sequence number of the latest snapshot
+        self.seq = 0
+        # data dict of the latest snapshot
+        self.last_data = None
+        # number of events published and number of subscribers disconnected
+        # for being too slow
+        self.events = 0
+        self.dropped = 0
+        # the latest snapshot, None until the first snapshot is published
+        self.snapshot = None
+        # number of requests served and number of 304 responses
+        self.requests = 0
+        self.not_modified = 0
+        self.server = _ThreadingHTTPServer((host, port), _SnapshotRequestHandler)
+        self.server.owner = self
+
+    def publish(self, body, ts, data=None):
+        """Make a new snapshot available to clients.
+
+        Inputs:
+            body: the serialised snapshot
+            ts:   the snapshot dateTime
+            data: the snapshot data dict, used to construct delta events. If
+                  omitted delta subscribers are sent a keyframe.
+        """
+
+        try:
+            body_b = body.encode('utf-8')
+        except (TypeError, AttributeError, UnicodeDecodeError):
+            body_b = body
+        self.seq += 1
+        # replace the snapshot in a single assignment so request handlers
+        # always see a consistent snapshot
+        self.snapshot = _Snapshot(body_b, '"%d-%d"' % (ts, self.seq), self.seq)
+        # push the snapshot to our subscribers
+        if self.subscribers:
+            self.push(self.snapshot.event(), self.subscribers)
+        if self.delta_subscribers:
+            if data is None or self.last_data is None or self.seq % self.keyframe_interval == 0:
+                event = self.snapshot.keyframe()
+            else:
+                event = delta_event(self.last_data, data, self.seq)
+            self.push(event, self.delta_subscribers)
+        self.last_data = data
+
+    def push(self, event, subscribers):
+        """Queue an event for each of a set of subscribers.
+
+        Any subscriber whose queue is full is disconnected.
+
+        Inputs:
+            event:       the serialised event to be sent to each subscriber
+            subscribers: the set of subscribers to receive the event
+        """
+
+        self.events += 1
+        with self.subscribers_lock:
+            for subscriber in list(subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    self.drop(subscriber)
+                    self.dropped += 1
+                    log.info("http: slow event subscriber disconnected, "
+                             "%d subscribers disconnected in total" % self.dropped)
+
+    def subscribe(self, delta=False):
+        """Add a subscriber and return the subscriber's event queue.
+
+        Inputs:
+            delta: whether the subscriber is to receive delta events
+        """
+
+        subscriber = queue.Queue(maxsize=self.max_pending)
+        with self.subscribers_lock:
+            if delta:
+                self.delta_subscribers.add(subscriber)
+            else:
+                self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber."""
+
+        with self.subscribers_lock:
+            self.subscribers.discard(subscriber)
+            self.delta_subscribers.discard(subscriber)
+
+    def drop(self, subscriber):
+        """Disconnect a subscriber, the caller must hold subscribers_lock."""
+
+        self.subscribers.discard(subscriber)
+        self.delta_subscribers.discard(subscriber)
+        # discard any pending events and signal the subscriber to disconnect
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(None)
+
+    def stats(self):
+        """Return a dict of request and event statistics."""
+
+        return {'requests': self.requests,
+                'not_modified': self.not_modified,
+                'events': self.events,
+                'subscribers': len(self.subscribers) + len(self.delta_subscribers),
+                'dropped': self.dropped}
+
+    def run(self):
+        """Serve HTTP requests until stopped."""
+
+        self.server.serve_forever()
+
+    def stop(self):
+        """Stop serving and close the server socket."""
+
+        # disconnect our subscribers
+        with self.subscribers_lock:
+            for subscriber in list(self.subscribers | self.delta_subscribers):
+                self.drop(subscriber)
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Snapshot(object):
+    """A serialised snapshot, its ETag and its gzip compressed form."""
+
+    __slots__ = ('body', 'etag', 'seq', 'gz_body', 'event_body', 'keyframe_body')
+
+    def __init__(self, body, etag, seq=0):
+        self.body = body
+        self.etag = etag
+        self.seq = seq
+        self.gz_body = None
+        self.event_body = None
+        self.keyframe_body = None
+
+    def event(self):
+        """Return the snapshot as a Server-Sent Event."""
+
+        if self.event_body is None:
+            self.event_body = b''.join([b'id: ', str(self.seq).encode('utf-8'),
+                                        b'\ndata: ', self.body, b'\n\n'])
+        return self.event_body
+
+    def keyframe(self):
+        """Return the snapshot as a delta stream keyframe event."""
+
+        if self.keyframe_body is None:
+            _seq = str(self.seq).encode('utf-8')
+            self.keyframe_body = b''.join([b'event: keyframe\nid: ', _seq,
+                                           b'\ndata: {"data":', self.body,
+                                           b',"seq":', _seq, b'}\n\n'])
+        return self.keyframe_body
+
+    def gzipped(self):
+        """Return the gzip compressed body, compressing it on first use."""
+
+        if self.gz_body is None:
+            _buffer = six.BytesIO()
+            with gzip.GzipFile(mode='wb', fileobj=_buffer) as gz:
+                gz.write(self.body)
+            self.gz_body = _buffer.getvalue()
+        return self.gz_body
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Multi-threaded HTTP server."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # allow for many clients connecting at once
+    request_queue_size = 128
+
+
+class _SnapshotRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handle HTTP requests for the latest snapshot."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        """Respond to a GET request."""
+
+        owner = self.server.owner
+        _path, _sep, _query = self.path.partition('?')
+        if owner.events_path and _path == owner.events_path:
+            _delta = urllib.parse.parse_qs(_query).get('delta', [''])[0].lower() in ('1', 'true', 'yes')
+            self.stream_events(delta=_delta)
+            return
+        if _path != owner.path:
+            self.send_error(404)
+            return
+        snapshot = owner.snapshot
+        if snapshot is None:
+            self.send_error(503)
+            return
+        owner.requests += 1
+        _match = self.headers.get('If-None-Match')
+        if _match is not None and snapshot.etag in [t.strip() for t in _match.split(',')]:
+            owner.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', snapshot.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = snapshot.body
+        _gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if _gzip:
+            body = snapshot.gzipped()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', snapshot.etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        if _gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self, delta=False):
+        """Stream snapshot events to the client until it disconnects.
+
+        Inputs:
+            delta: whether to stream delta events rather than full snapshots
+        """
+
+        owner = self.server.owner
+        subscriber = owner.subscribe(delta=delta)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            # start the client off with the latest snapshot
+            snapshot = owner.snapshot
+            if snapshot is not None:
+                self.wfile.write(snapshot.keyframe() if delta else snapshot.event())
+            while True:
+                try:
+                    event = subscriber.get(timeout=owner.KEEPALIVE)
+                except queue.Empty:
+                    # send a comment to keep the connection alive
+                    event = b': keepalive\n\n'
+                if event is None:
+                    # we have been disconnected
+                    break
+                self.wfile.write(event)
+                self.wfile.flush()
+        except (socket.error, ValueError):
+            # the client has gone away
+            pass
+        finally:
+            owner.unsubscribe(subscriber)
+
+    def log_message(self, format, *args):
+        """Log requests at debug level only."""
+
+        if weewx.debug >= 3:
+            log.debug("http: %s - %s" % (self.address_string(), format % args))
+
+
+# ============================================================================
+#                            Utility Functions
+# ============================================================================
+
+
+def degree_to_compass(x):
+    """Convert degrees to ordinal compass point.
+
+    Input:
+        x: degrees
+
+    Returns:
+        Corresponding ordinal compass point from COMPASS_POINTS. Can return
+        None.
+    """
+
+    if x is None:
+        return None
+    idx = int((x + 11.25) / 22.5)
+    return COMPASS_POINTS[idx]
+
+
+def delta_event(old_data, new_data, seq):
+    """Construct a delta stream event.
+
+    The event data is a JSON object containing the snapshot sequence number,
+    the fields whose values have changed or been added and a list of any
+    fields that have been removed.
+
+    Inputs:
+        old_data: data dict of the previous snapshot
+        new_data: data dict of the current snapshot
+        seq:      sequence number of the current snapshot
+
+    Returns:
+        The serialised event as bytes.
+    """
+
+    _delta = {'seq': seq,
+              'changes': dict((k, v) for k, v in six.iteritems(new_data)
+                              if k not in old_data or old_data[k] != v)}
+    _removed = [k for k in old_data if k not in new_data]
+    if _removed:
+        _delta['removed'] = sorted(_removed)
+    return ''.join(['event: delta\nid: %d\ndata: ' % seq,
+                    json.dumps(_delta, separators=(',', ':'), sort_keys=True),
+                    '\n\n']).encode('utf-8')
+
+
+def exact_value(x):
+    """Represent a float exactly as an integer.
+
+    Every finite float is an integer multiple of 2**-1074 so scaling by
+    2**1074 gives an integer that can be added and subtracted without any
+    rounding error.
+
+    Inputs:
+        x: the value to be represented, must be finite
+
+    Returns:
+        The value scaled by 2**1074 as an integer.
+    """
+
+    _num, _den = float(x).as_integer_ratio()
+    return _num << (EXACT_SCALE_BITS - _den.bit_length() + 1)
+
+
+def exact_float(value):
+    """Convert an integer obtained from exact_value() back to a float.
+
+    Integer true division is correctly rounded so the result is the float
+    nearest the exact value, as returned by math.fsum().
+    """
+
+    return operator.truediv(value, 1 << EXACT_SCALE_BITS)
+
+
+def calc_percentiles(values, percentiles=(50, 90, 99)):
+    """Calculate percentiles of a sequence of values.
+
+    Uses the nearest rank method.
+
+    Inputs:
+        values:      iterable of numeric values
+        percentiles: iterable of percentiles to calculate
+
+    Returns:
+        A dict of values keyed by percentile, values are None if values is
+        empty.
+    """
+
+    _sorted = sorted(values)
+    result = {}
+    for pc in percentiles:
+        if _sorted:
+            _rank = int(math.ceil(pc / 100.0 * len(_sorted)))
+            result[pc] = _sorted[max(_rank - 1, 0)]
+        else:
+            result[pc] = None
+    return result
+
+
+def calc_trend(obs_type, now_vt, group, db_manager, then_ts, grace=0):
+    """ Calculate change in an observation over a specified period.
+
+    Inputs:
+        obs_type:   database field name of observation concerned
+        now_vt:     value of observation now (ie the finishing value)
+        group:      group our returned value must be in
+        db_manager: manager to be used, may be any object that provides a
+                    getRecord() method eg an ArchiveCache object
+        then_ts:    timestamp of start of trend period
+        grace:      the largest difference in time when finding the then_ts
                     record that is acceptable
 
     Returns:
@@ -2760,58 +4866,6 @@ def calc_trend(obs_type, now_vt, group, db_manager, then_ts, grace=0):
                 return None
 
 
-def calc_windrose(now, db_manager, period, points):
-    """Calculate a SteelSeries Weather Gauges windrose array.
-
-    Calculate an array representing the 'amount of wind' from each of the 8 or
-    16 compass points. The value for each compass point is determined by
-    summing the archive windSpeed values for wind from that compass point over
-    the period concerned. Resulting values are rounded to one decimal point.
-
-    Inputs:
-        db_manager: A manager object for the database to be used.
-        period:     Calculate the windrose using the last period (in
-                    seconds) of data in the archive.
-        points:     The number of compass points to use, normally 8 or 16.
-
-    Return:
-        List containing windrose data with 'points' elements.
-    """
-
-    # initialise our result
-    rose = [0.0 for x in range(points)]
-    # get the earliest ts we will use
-    ts = now - period
-    # determine the factor to be used to divide numerical windDir into
-    # cardinal/ordinal compass points
-    angle = 360.0/points
-    # create an interpolation dict for our query
-    inter_dict = {'table_name': db_manager.table_name,
-                  'ts': ts,
-                  'angle': angle}
-    # the query to be used
-    windrose_sql = "SELECT ROUND(windDir/%(angle)s),sum(windSpeed) "\
-                   "FROM %(table_name)s WHERE dateTime>%(ts)s "\
-                   "GROUP BY ROUND(windDir/%(angle)s)"
-
-    # we expect at least 'points' rows in our result so use genSql
-    for _row in db_manager.genSql(windrose_sql % inter_dict):
-        # for windDir==None we expect some results with None, we can ignore
-        # those
-        if _row is None or None in _row:
-            pass
-        else:
-            # Because of the structure of the compass and the limitations in
-            # SQL maths our 'North' result will be returned in 2 parts. It will
-            # be the sum of the '0' group and the 'points' group.
-            if int(_row[0]) != int(points):
-                rose[int(_row[0])] += _row[1]
-            else:
-                rose[0] += _row[1]
-    # now  round our results and return
-    return [round(x, 1) for x in rose]
-
-
 # ============================================================================
 #                           class ThreadedSource
 # ============================================================================
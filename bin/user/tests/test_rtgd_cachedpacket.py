@@ -0,0 +1,104 @@
+"""
+test_rtgd_cachedpacket.py
+
+Tests for the rtgd CachedPacket class.
+
+CachedPacket originally held a dict of {'value': value, 'ts': ts} entries
+and checked the age of every field each time a packet was obtained. It now
+holds parallel lists of values and timestamps and only rescans the field
+timestamps once a field may have become stale. These tests check the cached
+packet against the original per field age check.
+"""
+from __future__ import absolute_import
+
+import os.path
+import random
+import sys
+import unittest
+
+import weewx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rtgd
+
+
+def scan_packet(seen, ts, max_age):
+    """The original calculation, seen is a dict of obs: (value, ts)."""
+
+    packet = dict((obs, value if ts - seen_ts <= max_age else None)
+                  for obs, (value, seen_ts) in seen.items())
+    packet['dateTime'] = ts
+    packet['usUnits'] = weewx.US
+    return packet
+
+
+class CachedPacketTest(unittest.TestCase):
+
+    def test_primed_from_record(self):
+        cache = rtgd.CachedPacket({'dateTime': 1000, 'usUnits': weewx.US,
+                                   'outTemp': 70.0, 'extraTemp1': 60.0})
+        packet = cache.get_packet(1000)
+        self.assertEqual(packet['outTemp'], 70.0)
+        self.assertEqual(packet['usUnits'], weewx.US)
+        # only CachedPacket.OBS fields are primed
+        self.assertNotIn('extraTemp1', packet)
+        self.assertEqual(set(packet), set(rtgd.CachedPacket.OBS) | set(['dateTime', 'usUnits']))
+
+    def test_stale_across_rescan(self):
+        cache = rtgd.CachedPacket({'dateTime': 0, 'usUnits': weewx.US, 'outTemp': 70.0})
+        cache.update({'dateTime': 500, 'usUnits': weewx.US, 'outTemp': 71.0, 'inTemp': 68.0}, 500)
+        cache.update({'dateTime': 900, 'usUnits': weewx.US, 'outTemp': 72.0}, 900)
+        # the primed fields are now stale, inTemp is not
+        packet = cache.get_packet(1000, 600)
+        self.assertIsNone(packet['barometer'])
+        self.assertEqual(packet['inTemp'], 68.0)
+        self.assertEqual(packet['outTemp'], 72.0)
+        # inTemp becomes stale after the rescan without another rescan
+        packet = cache.get_packet(1101, 600)
+        self.assertIsNone(packet['inTemp'])
+        self.assertEqual(packet['outTemp'], 72.0)
+
+    def test_stale_field_refreshed(self):
+        cache = rtgd.CachedPacket({'dateTime': 0, 'usUnits': weewx.US, 'barometer': 30.0})
+        self.assertIsNone(cache.get_packet(700, 600)['barometer'])
+        cache.update({'dateTime': 710, 'usUnits': weewx.US, 'barometer': 30.1}, 710)
+        self.assertEqual(cache.get_packet(720, 600)['barometer'], 30.1)
+
+    def test_earlier_query(self):
+        cache = rtgd.CachedPacket({'dateTime': 0, 'usUnits': weewx.US, 'outTemp': 70.0})
+        cache.update({'dateTime': 400, 'usUnits': weewx.US, 'inTemp': 68.0}, 400)
+        self.assertIsNone(cache.get_packet(1100, 600)['inTemp'])
+        # a query for an earlier time sees the fields that were fresh then
+        packet = cache.get_packet(900, 600)
+        self.assertEqual(packet['inTemp'], 68.0)
+        self.assertIsNone(packet['outTemp'])
+        packet = cache.get_packet(500, 600)
+        self.assertEqual(packet['inTemp'], 68.0)
+        self.assertEqual(packet['outTemp'], 70.0)
+
+    def test_matches_scan(self):
+        rnd = random.Random(7)
+        obs_list = rtgd.CachedPacket.OBS + ['extraTemp1', 'soilMoist1']
+        for trial in range(20):
+            cache = rtgd.CachedPacket({'dateTime': 0, 'usUnits': weewx.US})
+            seen = dict((obs, (None, 0)) for obs in rtgd.CachedPacket.OBS)
+            ts = 0
+            for i in range(300):
+                ts += rnd.choice([2, 10, 60, 300])
+                packet = {'dateTime': ts, 'usUnits': weewx.US}
+                for obs in rnd.sample(obs_list, rnd.randint(0, len(obs_list))):
+                    packet[obs] = rnd.choice([None, rnd.random() * 100])
+                cache.update(packet, ts)
+                for obs, value in packet.items():
+                    if value is not None and obs not in ('dateTime', 'usUnits'):
+                        seen[obs] = (value, ts)
+                max_age = rnd.choice([60, 600])
+                # query at, before and after the latest packet
+                for query_ts in (ts, ts - rnd.randint(0, 300), ts + rnd.randint(0, 900)):
+                    self.assertEqual(cache.get_packet(query_ts, max_age),
+                                     scan_packet(seen, query_ts, max_age),
+                                     "trial %d packet %d" % (trial, i))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,287 @@
+"""
+test_rtgd_http.py
+
+Tests for the rtgd KeepAliveHttpClient and SnapshotServer classes.
+
+The client is exercised against a local http.server based server so that
+connection re-use, re-trying after the server closes a connection, following
+redirects and use of a proxy can be checked without a remote server. The
+SnapshotServer is run on a local port and its ETag handling, gzip encoding,
+Server-Sent Events stream, delta stream and handling of slow event
+subscribers checked.
+"""
+from __future__ import absolute_import
+
+import gzip
+import json
+import os
+import os.path
+import sys
+import threading
+import unittest
+
+import six
+from six.moves import BaseHTTPServer
+from six.moves import http_client
+from six.moves import socketserver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rtgd
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Request handler that records each request and responds 'success'."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.handle_request(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def do_GET(self):
+        self.handle_request(None)
+
+    def handle_request(self, body):
+        server = self.server
+        server.requests.append((self.command, self.path, body, self.client_address))
+        if self.command == 'POST' and self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/target')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content = b'success'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        if server.close_after_response:
+            # close the connection without telling the client
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class KeepAliveHttpClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.requests = []
+        self.server.close_after_response = False
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        # make sure no proxy from our environment is used
+        self.saved_env = dict(os.environ)
+        for name in ('http_proxy', 'HTTP_PROXY', 'https_proxy', 'HTTPS_PROXY',
+                     'no_proxy', 'NO_PROXY'):
+            os.environ.pop(name, None)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved_env)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        client = rtgd.KeepAliveHttpClient(self.base_url + '/post', timeout=2)
+        try:
+            for i in range(3):
+                code, response = client.post('{"n":%d}' % i,
+                                             {'Content-Type': 'application/json'})
+                self.assertEqual(code, 200)
+                self.assertEqual(response, 'success')
+        finally:
+            client.close()
+        self.assertEqual(client.requests, 3)
+        self.assertEqual(client.connections, 1)
+        self.assertEqual(client.reused, 2)
+        self.assertEqual([r[2] for r in self.server.requests],
+                         [b'{"n":0}', b'{"n":1}', b'{"n":2}'])
+        # all requests were made over the same connection
+        self.assertEqual(len(set(r[3] for r in self.server.requests)), 1)
+
+    def test_retry_after_server_close(self):
+        self.server.close_after_response = True
+        client = rtgd.KeepAliveHttpClient(self.base_url + '/post', timeout=2)
+        try:
+            for i in range(3):
+                code, response = client.post('{"n":%d}' % i)
+                self.assertEqual(code, 200)
+                self.assertEqual(response, 'success')
+        finally:
+            client.close()
+        self.assertEqual(client.requests, 3)
+        # each stale connection was replaced by a new connection
+        self.assertEqual(client.connections, 3)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_redirect_followed(self):
+        client = rtgd.KeepAliveHttpClient(self.base_url + '/redirect', timeout=2)
+        try:
+            code, response = client.post('{}')
+        finally:
+            client.close()
+        self.assertEqual(code, 200)
+        self.assertEqual(response, 'success')
+        self.assertEqual(client.urllib_requests, 1)
+        # the POST was made once and redirected as a GET as urlopen() does
+        self.assertEqual([(r[0], r[1]) for r in self.server.requests],
+                         [('POST', '/redirect'), ('GET', '/target')])
+
+    def test_proxy_used(self):
+        os.environ['http_proxy'] = self.base_url
+        client = rtgd.KeepAliveHttpClient('http://weather.example.com/post', timeout=2)
+        try:
+            self.assertTrue(client.use_urllib)
+            code, response = client.post('{}')
+        finally:
+            client.close()
+        self.assertEqual(code, 200)
+        self.assertEqual(response, 'success')
+        self.assertEqual(client.connections, 0)
+        # the request was made to the proxy using the absolute URL
+        self.assertEqual(self.server.requests[0][1], 'http://weather.example.com/post')
+
+
+class SnapshotServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = rtgd.SnapshotServer(host='127.0.0.1', port=0)
+        self.server.start()
+        self.port = self.server.server.server_address[1]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def get(self, headers=None):
+        conn = http_client.HTTPConnection('127.0.0.1', self.port, timeout=2)
+        try:
+            conn.request('GET', '/gauge-data.txt', headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.getheader('ETag'), response.read()
+        finally:
+            conn.close()
+
+    def test_not_modified(self):
+        self.server.publish('{"a":1}', 1000)
+        status, etag, body = self.get()
+        self.assertEqual((status, body), (200, b'{"a":1}'))
+        status, etag2, body = self.get({'If-None-Match': etag})
+        self.assertEqual((status, etag2, body), (304, etag, b''))
+
+    def test_same_timestamp_new_body(self):
+        self.server.publish('{"a":1}', 1000)
+        status, etag, body = self.get()
+        # a second snapshot with the same dateTime but a different body
+        self.server.publish('{"a":2}', 1000)
+        status, etag2, body = self.get({'If-None-Match': etag})
+        self.assertEqual((status, body), (200, b'{"a":2}'))
+        self.assertNotEqual(etag2, etag)
+
+    def test_gzip(self):
+        body = ('{"a":"%s"}' % ('x' * 1000)).encode('utf-8')
+        self.server.publish(body, 1000)
+        conn = http_client.HTTPConnection('127.0.0.1', self.port, timeout=2)
+        try:
+            conn.request('GET', '/gauge-data.txt', headers={'Accept-Encoding': 'gzip, deflate'})
+            response = conn.getresponse()
+            gz_body = response.read()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+            self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+            self.assertEqual(int(response.getheader('Content-Length')), len(gz_body))
+            self.assertLess(len(gz_body), len(body))
+            self.assertEqual(gzip.GzipFile(fileobj=six.BytesIO(gz_body)).read(), body)
+            # a client that does not accept gzip is sent the plain body
+            conn.request('GET', '/gauge-data.txt')
+            response = conn.getresponse()
+            self.assertIsNone(response.getheader('Content-Encoding'))
+            self.assertEqual(response.read(), body)
+        finally:
+            conn.close()
+
+    def open_events(self, path='/events'):
+        """Open an event stream and return the connection and response."""
+
+        conn = http_client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        conn.request('GET', path)
+        response = conn.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Type'), 'text/event-stream')
+        return conn, response
+
+    def read_event(self, response):
+        """Read an event from an event stream as a dict of field values."""
+
+        event = {}
+        while True:
+            line = response.fp.readline().decode('utf-8').rstrip('\n')
+            if not line:
+                return event
+            name, _sep, value = line.partition(': ')
+            event[name] = value
+
+    def test_events(self):
+        self.server.publish('{"a":1}', 1000)
+        conn, response = self.open_events()
+        try:
+            # a new subscriber is sent the latest snapshot
+            self.assertEqual(self.read_event(response), {'id': '1', 'data': '{"a":1}'})
+            self.server.publish('{"a":2}', 1002)
+            self.assertEqual(self.read_event(response), {'id': '2', 'data': '{"a":2}'})
+        finally:
+            conn.close()
+
+    def test_delta_events(self):
+        self.server.keyframe_interval = 3
+        self.server.publish('{"a":1,"b":1}', 1000, {'a': 1, 'b': 1})
+        conn, response = self.open_events('/events?delta=1')
+        try:
+            # a new delta subscriber is sent a keyframe of the latest snapshot
+            event = self.read_event(response)
+            self.assertEqual((event['event'], event['id']), ('keyframe', '1'))
+            self.assertEqual(json.loads(event['data']), {'data': {'a': 1, 'b': 1}, 'seq': 1})
+            # then only the changed and removed fields
+            self.server.publish('{"a":2,"c":3}', 1002, {'a': 2, 'c': 3})
+            event = self.read_event(response)
+            self.assertEqual((event['event'], event['id']), ('delta', '2'))
+            self.assertEqual(json.loads(event['data']),
+                             {'seq': 2, 'changes': {'a': 2, 'c': 3}, 'removed': ['b']})
+            # and a keyframe every keyframe_interval snapshots
+            self.server.publish('{"a":2,"c":4}', 1004, {'a': 2, 'c': 4})
+            event = self.read_event(response)
+            self.assertEqual((event['event'], event['id']), ('keyframe', '3'))
+            self.assertEqual(json.loads(event['data']), {'data': {'a': 2, 'c': 4}, 'seq': 3})
+            self.server.publish('{"a":2,"c":4}', 1006, {'a': 2, 'c': 4})
+            event = self.read_event(response)
+            self.assertEqual(json.loads(event['data']), {'seq': 4, 'changes': {}})
+        finally:
+            conn.close()
+
+    def test_delta_event(self):
+        self.assertEqual(rtgd.delta_event({'a': 1, 'b': 2}, {'a': 1, 'b': 3, 'c': None}, 7),
+                         b'event: delta\nid: 7\ndata: {"changes":{"b":3,"c":null},"seq":7}\n\n')
+        self.assertEqual(rtgd.delta_event({'a': 1, 'b': 2}, {'b': 2}, 8),
+                         b'event: delta\nid: 8\ndata: {"changes":{},"removed":["a"],"seq":8}\n\n')
+
+    def test_slow_subscriber_dropped(self):
+        self.server.max_pending = 2
+        subscriber = self.server.subscribe()
+        for i in range(3):
+            self.server.publish('{"a":%d}' % i, 1000 + i)
+        self.assertEqual(self.server.dropped, 1)
+        self.assertEqual(self.server.stats()['subscribers'], 0)
+        # the subscriber has been signalled to disconnect
+        self.assertIsNone(subscriber.get_nowait())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+test_rtgd_loopstats.py
+
+Tests for the rtgd LoopStats class.
+
+Loop period lows and highs were originally tracked with a separate
+attribute and comparison for each stat. They are now tracked by a table
+driven LoopStats object. These tests check LoopStats, including the stats
+for any extra_loop_stats obs, against a straightforward min/max over the
+loop packets seen since the last reset.
+"""
+from __future__ import absolute_import
+
+import os.path
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rtgd
+
+
+def scan_stat(packets, obs, aggregate):
+    """The low or high of an obs and its timestamp, the earliest if tied."""
+
+    result = (None, None)
+    for ts, packet in packets:
+        value = packet.get(obs)
+        if value is None:
+            continue
+        if (result[0] is None or
+                (aggregate == 'min' and value < result[0]) or
+                (aggregate == 'max' and value > result[0])):
+            result = (value, ts)
+    return result
+
+
+class LoopStatsTest(unittest.TestCase):
+
+    def test_unknown_aggregate(self):
+        self.assertRaises(ValueError, rtgd.LoopStats, [('outTemp', 'min'), ('outTemp', 'avg')])
+
+    def test_add_and_reset(self):
+        stats = rtgd.LoopStats([('outTemp', 'min'), ('outTemp', 'max'), ('windchill', 'min')])
+        self.assertIsNone(stats.low('outTemp'))
+        stats.add({'outTemp': 70.0, 'windchill': None}, 100)
+        stats.add({'outTemp': 68.0}, 102)
+        stats.add({'outTemp': 72.0, 'windchill': 65.0}, 104)
+        stats.add({'outTemp': 68.0}, 106)
+        self.assertEqual((stats.low('outTemp'), stats.low_time('outTemp')), (68.0, 102))
+        self.assertEqual((stats.high('outTemp'), stats.high_time('outTemp')), (72.0, 104))
+        self.assertEqual((stats.low('windchill'), stats.low_time('windchill')), (65.0, 104))
+        # windchill high is not tracked
+        self.assertRaises(KeyError, stats.high, 'windchill')
+        stats.reset()
+        self.assertIsNone(stats.low('outTemp'))
+        self.assertIsNone(stats.high_time('outTemp'))
+        stats.add({'outTemp': 71.0}, 108)
+        self.assertEqual((stats.low('outTemp'), stats.high('outTemp')), (71.0, 71.0))
+
+    def test_extra_loop_stats(self):
+        extra_obs = ['extraTemp1', 'soilMoist1', 'outTemp']
+        buffer = rtgd.RtgdBuffer(extra_obs)
+        table = list(rtgd.LOOP_STATS)
+        for obs in extra_obs:
+            table.extend([(obs, 'min'), (obs, 'max')])
+        rnd = random.Random(9)
+        packets = []
+        for i in range(500):
+            ts = 1000 + 2 * i
+            packet = dict((obs, rnd.choice([None, rnd.randint(0, 20) / 2.0]))
+                          for obs, aggregate in table)
+            buffer.stats.add(packet, ts)
+            packets.append((ts, packet))
+            if i % 100 == 99:
+                for obs, aggregate in table:
+                    if aggregate == 'min':
+                        result = (buffer.stats.low(obs), buffer.stats.low_time(obs))
+                    else:
+                        result = (buffer.stats.high(obs), buffer.stats.high_time(obs))
+                    self.assertEqual(result, scan_stat(packets, obs, aggregate),
+                                     "%s %s packet %d" % (obs, aggregate, i))
+            if i == 249:
+                # the end of an archive period
+                buffer.reset_loop_stats()
+                packets = []
+
+
+if __name__ == '__main__':
+    unittest.main()
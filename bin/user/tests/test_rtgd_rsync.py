@@ -0,0 +1,131 @@
+"""
+test_rtgd_rsync.py
+
+Tests for rsync uploads by the rtgd thread.
+
+rsync_data() is driven against a fake rsync command placed at the front of
+PATH. The fake command records its arguments so the ssh command line passed
+to rsync via -e, including the multiplexed ssh master connection options,
+can be checked without a remote server.
+"""
+from __future__ import absolute_import
+
+import datetime
+import os
+import os.path
+import shutil
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+import configobj
+from six.moves import queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rtgd
+
+FAKE_RSYNC = """#!/bin/sh
+for arg in "$@"; do
+    printf '%s\\n' "$arg" >> "$RTGD_TEST_ARGS"
+done
+echo "Number of files transferred: 1"
+"""
+
+
+def make_thread(tmp_dir, **options):
+    """Create a RealtimeGaugeDataThread that rsyncs to a remote server."""
+
+    rtgd_dict = {'Groups': {},
+                 'StringFormats': {},
+                 'rtgd_path': tmp_dir,
+                 'rsync_server': 'weather.example.com',
+                 'rsync_user': 'rtgd',
+                 'rsync_remote_rtgd_dir': '/var/www/html',
+                 'rsync_skip_if_older_than': 0}
+    rtgd_dict.update(options)
+    config_dict = configobj.ConfigObj({'WEEWX_ROOT': tmp_dir,
+                                       'StdReport': {},
+                                       'Station': {'station_type': 'Simulator'},
+                                       'RealtimeGaugeData': rtgd_dict})
+    return rtgd.RealtimeGaugeDataThread(queue.Queue(), config_dict, {},
+                                        0, 0, (0, 'meter', 'group_altitude'))
+
+
+class RsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        _rsync = os.path.join(self.tmp_dir, 'rsync')
+        with open(_rsync, 'w') as f:
+            f.write(FAKE_RSYNC)
+        os.chmod(_rsync, os.stat(_rsync).st_mode | stat.S_IEXEC)
+        self.args_file = os.path.join(self.tmp_dir, 'args')
+        self.saved_env = dict(os.environ)
+        os.environ['PATH'] = os.pathsep.join([self.tmp_dir, os.environ.get('PATH', '')])
+        os.environ['RTGD_TEST_ARGS'] = self.args_file
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved_env)
+        shutil.rmtree(self.tmp_dir)
+
+    def rsync_args(self):
+        with open(self.args_file) as f:
+            return f.read().splitlines()
+
+    def ssh_command(self):
+        _args = self.rsync_args()
+        return _args[_args.index('-e') + 1]
+
+    def test_rsync(self):
+        thread = make_thread(self.tmp_dir)
+        self.assertTrue(thread.rsync_data(datetime.datetime.now()))
+        self.assertEqual(self.ssh_command(), 'ssh -o ConnectTimeout=1')
+        self.assertEqual(self.rsync_args()[-1],
+                         'rtgd@weather.example.com:/var/www/html/gauge-data.txt')
+        self.assertEqual(thread.rsync_count, 1)
+        self.assertEqual(len(thread.rsync_latencies), 1)
+
+    def test_multiplex(self):
+        _path = os.path.join(self.tmp_dir, 'ssh_%r@%h:%p')
+        thread = make_thread(self.tmp_dir,
+                             rsync_ssh_multiplex=True,
+                             rsync_control_path=_path,
+                             rsync_control_persist=60)
+        self.assertTrue(thread.rsync_ssh_multiplex)
+        self.assertTrue(thread.rsync_data(datetime.datetime.now()))
+        self.assertEqual(self.ssh_command(),
+                         'ssh -o ConnectTimeout=1 -o ControlMaster=auto '
+                         '-o ControlPath=%s -o ControlPersist=60' % _path)
+
+    def test_control_path_rejected(self):
+        for _path in ('/var/tmp/rtgd ssh_%r@%h:%p', '/var/tmp/rtgd"ssh', "/var/tmp/rtgd'ssh",
+                      '/var/tmp/rtgd\\ssh'):
+            thread = make_thread(self.tmp_dir,
+                                 rsync_ssh_multiplex=True,
+                                 rsync_control_path=_path)
+            # multiplexing is disabled rather than passing a broken -e option
+            self.assertFalse(thread.rsync_ssh_multiplex)
+            self.assertEqual(thread.rsync_ssh_options, '-o ConnectTimeout=1')
+
+    def test_upload_thread_latency(self):
+        thread = make_thread(self.tmp_dir)
+        uploader = rtgd.UploadThread('RtgdRsyncThread', thread.rsync_data)
+        uploader.start()
+        try:
+            uploader.submit(datetime.datetime.now())
+            _timeout = time.time() + 10
+            while uploader.uploaded + uploader.failed == 0 and time.time() < _timeout:
+                time.sleep(0.01)
+        finally:
+            uploader.stop(5)
+        _stats = uploader.stats()
+        self.assertEqual(_stats['uploaded'], 1)
+        self.assertEqual(_stats['failed'], 0)
+        self.assertIsNotNone(_stats['latency'][50])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+test_rtgd_thread.py
+
+Tests for the rtgd thread queue processing.
+
+The rtgd thread blocks on a single queue for all incoming packages. Any
+backlog of packages is processed in order, consecutive loop packets are
+ingested as a batch and only the newest loop packet in the backlog is used
+to generate output. These tests queue a backlog of mixed packages and check
+how often output is generated and how many loop packets are coalesced.
+"""
+from __future__ import absolute_import
+
+import os.path
+import sys
+import tempfile
+import unittest
+
+import configobj
+from six.moves import queue
+
+import weewx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rtgd
+
+
+def make_thread(tmp_dir):
+    """Create a RealtimeGaugeDataThread with no remote outputs."""
+
+    config_dict = configobj.ConfigObj({'WEEWX_ROOT': tmp_dir,
+                                       'StdReport': {},
+                                       'Station': {'station_type': 'Simulator'},
+                                       'RealtimeGaugeData': {'Groups': {},
+                                                             'StringFormats': {},
+                                                             'rtgd_path': tmp_dir}})
+    return rtgd.RealtimeGaugeDataThread(queue.Queue(), config_dict, {},
+                                        0, 0, (0, 'meter', 'group_altitude'))
+
+
+class ProcessQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.thread = make_thread(tempfile.gettempdir())
+        self.ingested = []
+        self.generated = []
+        self.archived = []
+        # replace the methods that need a database or a full loop packet
+        self.thread.ingest_packet = self.ingest_packet
+        self.thread.generate = lambda ts, t1=None: self.generated.append(ts)
+        self.thread.new_archive_record = lambda record: self.archived.append(record['dateTime'])
+
+    def ingest_packet(self, packet):
+        if self.thread.last_packet_ts is not None and packet['dateTime'] < self.thread.last_packet_ts:
+            self.thread.dropped_count += 1
+            return False
+        self.thread.last_packet_ts = packet['dateTime']
+        self.ingested.append(packet['dateTime'])
+        return True
+
+    def queue_packages(self, packages):
+        for _package in packages:
+            self.thread.control_queue.put(_package)
+        # our signal to stop
+        self.thread.control_queue.put(None)
+        self.thread.process_queue()
+
+    @staticmethod
+    def loop(ts):
+        return {'type': 'loop', 'payload': {'dateTime': ts, 'usUnits': weewx.US}}
+
+    @staticmethod
+    def archive(ts):
+        return {'type': 'archive', 'payload': {'dateTime': ts, 'usUnits': weewx.US}}
+
+    def test_mixed_backlog(self):
+        self.queue_packages([self.loop(100),
+                             self.archive(100),
+                             self.loop(102),
+                             {'type': 'stats', 'payload': {'min_barometer': 29.5}},
+                             self.loop(104),
+                             self.loop(106),
+                             {'type': 'event', 'payload': weewx.END_ARCHIVE_PERIOD},
+                             {'type': 'forecast', 'payload': 'Fine'}])
+        # every package was processed in order
+        self.assertEqual(self.ingested, [100, 102, 104, 106])
+        self.assertEqual(self.archived, [100])
+        self.assertEqual(self.thread.min_barometer, 29.5)
+        self.assertEqual(self.thread.scroller_text, 'Fine')
+        # output was generated once from the newest loop packet, the other
+        # loop packets were coalesced
+        self.assertEqual(self.generated, [106])
+        self.assertEqual(self.thread.coalesced_count, 3)
+        self.assertEqual(self.thread.ingested_count, 4)
+        self.assertEqual(self.thread.wake_count, 1)
+
+    def test_stale_packet_dropped(self):
+        self.queue_packages([self.loop(100),
+                             self.archive(100),
+                             self.loop(98),
+                             self.loop(102)])
+        self.assertEqual(self.ingested, [100, 102])
+        self.assertEqual(self.generated, [102])
+        self.assertEqual(self.thread.dropped_count, 1)
+        self.assertEqual(self.thread.coalesced_count, 1)
+
+    def test_no_backlog(self):
+        for ts in (100, 102):
+            self.thread.control_queue.put(self.loop(ts))
+            # process a single package by stopping after it
+            self.thread.control_queue.put(None)
+            self.thread.process_queue()
+        self.assertEqual(self.generated, [100, 102])
+        self.assertEqual(self.thread.coalesced_count, 0)
+        self.assertEqual(self.thread.wake_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+test_rtgd_windrose.py
+
+Tests for the rtgd WindroseAccumulator class.
+
+WindRoseData was originally calculated by summing the archive windSpeed for
+each compass point over the windrose period with an SQL GROUP BY query on
+every archive record. It is now maintained incrementally by a
+WindroseAccumulator. These tests check the accumulator gives the same result
+as the original query over a sliding window of archive records held in an
+in-memory SQLite database.
+"""
+from __future__ import absolute_import
+
+import os.path
+import random
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rtgd
+
+
+class _Manager(object):
+    """Minimal database manager backed by an in-memory SQLite database."""
+
+    table_name = 'archive'
+    std_unit_system = 1
+
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute("CREATE TABLE archive (dateTime INTEGER PRIMARY KEY, "
+                                "usUnits INTEGER, windDir REAL, windSpeed REAL)")
+
+    def add_record(self, record):
+        self.connection.execute("INSERT INTO archive VALUES (?, ?, ?, ?)",
+                                (record['dateTime'], record['usUnits'],
+                                 record['windDir'], record['windSpeed']))
+
+    def genSql(self, sql):
+        for row in self.connection.execute(sql):
+            yield row
+
+
+def calc_windrose(now, db_manager, period, points):
+    """The original WindRoseData calculation."""
+
+    rose = [0.0 for x in range(points)]
+    inter_dict = {'table_name': db_manager.table_name,
+                  'ts': now - period,
+                  'angle': 360.0/points}
+    windrose_sql = "SELECT ROUND(windDir/%(angle)s),sum(windSpeed) "\
+                   "FROM %(table_name)s WHERE dateTime>%(ts)s "\
+                   "GROUP BY ROUND(windDir/%(angle)s)"
+    for _row in db_manager.genSql(windrose_sql % inter_dict):
+        if _row is None or None in _row:
+            pass
+        elif int(_row[0]) != int(points):
+            rose[int(_row[0])] += _row[1]
+        else:
+            rose[0] += _row[1]
+    return [round(x, 1) for x in rose]
+
+
+class WindroseAccumulatorTest(unittest.TestCase):
+
+    def record(self, ts, wind_dir, wind_speed):
+        return {'dateTime': ts, 'usUnits': 1, 'windDir': wind_dir, 'windSpeed': wind_speed}
+
+    def test_prime(self):
+        manager = _Manager()
+        for ts in range(300, 3900, 300):
+            manager.add_record(self.record(ts, ts / 10.0, ts / 100.0))
+        accumulator = rtgd.WindroseAccumulator(1800, 8)
+        accumulator.prime(manager, 3600)
+        self.assertEqual(accumulator.get_rose(), calc_windrose(3600, manager, 1800, 8))
+        # a record seen when priming is ignored when received again
+        accumulator.add_record(self.record(3600, 90.0, 5.0))
+        self.assertEqual(accumulator.get_rose(), calc_windrose(3600, manager, 1800, 8))
+
+    def test_non_finite_ignored(self):
+        accumulator = rtgd.WindroseAccumulator(1800, 8)
+        accumulator.add_record(self.record(300, 90.0, 2.0))
+        accumulator.add_record(self.record(600, float('nan'), 3.0))
+        accumulator.add_record(self.record(900, float('inf'), 3.0))
+        accumulator.add_record(self.record(1200, 90.0, float('nan')))
+        self.assertEqual(accumulator.get_rose(), [0.0, 0.0, 2.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+
+    def test_matches_query(self):
+        rnd = random.Random(3)
+        for points, period in ((8, 3600), (16, 86400)):
+            manager = _Manager()
+            accumulator = rtgd.WindroseAccumulator(period, points)
+            accumulator.prime(manager, 0)
+            ts = 0
+            for i in range(2000):
+                ts += rnd.choice([60, 300, 300, 3600])
+                wind_dir = rnd.choice([None, 0.0, 360.0, rnd.randint(0, 72) * 5.0,
+                                       rnd.random() * 360])
+                wind_speed = rnd.choice([None, 0.0, rnd.randint(0, 300) / 10.0])
+                record = self.record(ts, wind_dir, wind_speed)
+                manager.add_record(record)
+                accumulator.add_record(record)
+                self.assertEqual(accumulator.get_rose(),
+                                 calc_windrose(ts, manager, period, points),
+                                 "points %d record %d" % (points, i))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+"""
+test_rtgd_windwindow.py
+
+Tests for the rtgd WindWindow class.
+
+BearingRangeFrom10 and BearingRangeTo10 were originally calculated by
+scanning every wind direction sample in the window. They are now obtained
+from the window min and max direction maintained by WindWindow. These tests
+check the incrementally maintained values give the same result as the
+original calculation.
+
+The average wind speed and vector average wind direction were originally
+calculated by summing every sample in the window. They are now obtained from
+exact running sums, these tests check the results are identical to the exact
+sum of the samples held and agree with the original sum() calculation.
+"""
+from __future__ import absolute_import
+
+import math
+import os.path
+import random
+import sys
+import unittest
+
+import weeutil.weeutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rtgd
+
+
+def scan_range(window, avg_dir):
+    """The original BearingRangeFrom10/BearingRangeTo10 calculation."""
+
+    try:
+        from_bearing = weeutil.weeutil.max_with_none([avg_dir - d if ((d - avg_dir) < 0 < s) else
+                                                      None for x, y, s, d, t in window.dir_samples])
+    except (TypeError, ValueError):
+        from_bearing = None
+    try:
+        to_bearing = weeutil.weeutil.max_with_none([d - avg_dir if ((d - avg_dir) > 0 and s > 0) else
+                                                    None for x, y, s, d, t in window.dir_samples])
+    except (TypeError, ValueError):
+        to_bearing = None
+    return from_bearing, to_bearing
+
+
+def window_range(window, avg_dir):
+    """The BearingRangeFrom10/BearingRangeTo10 calculation used by calculate()."""
+
+    min_dir = window.min_dir()
+    max_dir = window.max_dir()
+    from_bearing = avg_dir - min_dir if min_dir is not None and min_dir < avg_dir else None
+    to_bearing = max_dir - avg_dir if max_dir is not None and max_dir > avg_dir else None
+    return from_bearing, to_bearing
+
+
+def sum_average_speed(window):
+    """The original average wind speed calculation."""
+
+    return sum(s for s, t in window.speed_samples)/float(len(window.speed_samples))
+
+
+def fsum_average_speed(window):
+    """The average wind speed calculated from the exact sum of the samples."""
+
+    return math.fsum(s for s, t in window.speed_samples)/float(len(window.speed_samples))
+
+
+def fsum_average_dir(window):
+    """The vector average wind direction calculated from exact sums."""
+
+    avg_dir = 90.0 - math.degrees(math.atan2(math.fsum(y for x, y, s, d, t in window.dir_samples),
+                                             math.fsum(x for x, y, s, d, t in window.dir_samples)))
+    return avg_dir if avg_dir > 0 else avg_dir + 360.0
+
+
+class WindWindowSumTest(unittest.TestCase):
+
+    def test_empty_window(self):
+        window = rtgd.WindWindow(600)
+        self.assertEqual(window.average_speed(), 0.0)
+        self.assertIsNone(window.average_dir())
+
+    def test_exact_value_round_trip(self):
+        for value in (0, 0.0, 0.1, -3.2, 7, 5e-324, 1.7e308):
+            self.assertEqual(rtgd.exact_float(rtgd.exact_value(value)), value)
+
+    def test_exact_sum(self):
+        total = rtgd.ExactSum()
+        for value in (0.1, 0.2, 0.3, 1e16, -1e16):
+            total.add(value)
+        self.assertEqual(total.value(), math.fsum([0.1, 0.2, 0.3]))
+        total.subtract(0.2)
+        self.assertEqual(total.value(), math.fsum([0.1, 0.3]))
+
+    def test_exact_sum_non_finite(self):
+        total = rtgd.ExactSum()
+        total.add(1.0)
+        total.add(float('inf'))
+        self.assertEqual(total.value(), float('inf'))
+        total.add(float('-inf'))
+        self.assertTrue(math.isnan(total.value()))
+        total.subtract(float('inf'))
+        self.assertEqual(total.value(), float('-inf'))
+        total.subtract(float('-inf'))
+        total.add(float('nan'))
+        self.assertTrue(math.isnan(total.value()))
+        total.subtract(float('nan'))
+        self.assertEqual(total.value(), 1.0)
+
+    def test_non_finite_samples(self):
+        # a NaN sample gives a NaN average, as sum() did, until it expires
+        window = rtgd.WindWindow(10)
+        window.add(2.0, 90.0, 0)
+        window.add(float('nan'), 10.0, 1)
+        window.add(4.0, float('nan'), 2)
+        self.assertTrue(math.isnan(window.average_speed()))
+        self.assertTrue(math.isnan(window.average_dir()))
+        window.add(float('inf'), 90.0, 5)
+        self.assertTrue(math.isnan(window.average_speed()))
+        window.add(6.0, 270.0, 12)
+        # only the inf and 6.0 samples remain
+        self.assertEqual(window.average_speed(), float('inf'))
+        window.add(6.0, 270.0, 16)
+        self.assertEqual(window.average_speed(), 6.0)
+        self.assertEqual(window.average_dir(), 270.0)
+
+    def test_long_stream(self):
+        rnd = random.Random(11)
+        window = rtgd.WindWindow(600)
+        ts = 0
+        for i in range(60000):
+            ts += rnd.choice([1, 2, 2.5, 10])
+            direction = rnd.choice([None, rnd.random() * 360])
+            window.add(rnd.random() * 20, direction, ts)
+            # identical to the exact sum of the samples held
+            self.assertEqual(window.average_speed(), fsum_average_speed(window),
+                             "sample %d" % i)
+            if window.dir_samples:
+                self.assertEqual(window.average_dir(), fsum_average_dir(window),
+                                 "sample %d" % i)
+            # and within rounding error of the original calculation
+            self.assertAlmostEqual(window.average_speed(), sum_average_speed(window),
+                                   places=9, msg="sample %d" % i)
+
+
+class WindWindowRangeTest(unittest.TestCase):
+
+    def test_empty_window(self):
+        window = rtgd.WindWindow(600)
+        self.assertIsNone(window.min_dir())
+        self.assertIsNone(window.max_dir())
+        self.assertEqual(window_range(window, 180.0), scan_range(window, 180.0))
+
+    def test_calm_samples_ignored(self):
+        window = rtgd.WindWindow(600)
+        window.add(0.0, 10.0, 0)
+        window.add(0.0, 350.0, 1)
+        window.add(2.0, 180.0, 2)
+        self.assertEqual(window.min_dir(), 180.0)
+        self.assertEqual(window.max_dir(), 180.0)
+        self.assertEqual(window_range(window, 90.0), scan_range(window, 90.0))
+
+    def test_expiry(self):
+        window = rtgd.WindWindow(10)
+        window.add(1.0, 10.0, 0)
+        window.add(1.0, 350.0, 5)
+        window.add(1.0, 180.0, 12)
+        # the 10 degree sample has expired
+        self.assertEqual(window.min_dir(), 180.0)
+        self.assertEqual(window.max_dir(), 350.0)
+        window.add(1.0, 200.0, 16)
+        # the 350 degree sample has expired
+        self.assertEqual(window.min_dir(), 180.0)
+        self.assertEqual(window.max_dir(), 200.0)
+
+    def test_matches_scan(self):
+        rnd = random.Random(5)
+        for trial in range(50):
+            window = rtgd.WindWindow(rnd.choice([30, 120, 600]))
+            ts = 0
+            for i in range(500):
+                # include repeated timestamps and gaps longer than the window
+                ts += rnd.choice([0, 1, 2, 2.5, 10, 60, 700])
+                speed = rnd.choice([0.0, 3.0, rnd.random() * 20])
+                direction = rnd.choice([None, 90.0, rnd.randint(0, 35) * 10.0, rnd.random() * 360])
+                window.add(speed, direction, ts)
+                for avg_dir in (rnd.random() * 360, 90.0, 180.0):
+                    self.assertEqual(window_range(window, avg_dir),
+                                     scan_range(window, avg_dir),
+                                     "trial %d sample %d" % (trial, i))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,10 +10,12 @@ PARTICULAR PURPOSE.  See the GNU General Public License for more details.
 
                      Installer for Realtime gauge-data
 
-Version: 0.5.0                                        Date: 5 July 2020
+Version: 0.5.1                                        Date: 16 October 2026
 
 Revision History
 
+    16 October 2026     v0.5.1
+        - bumped version only
     13 January 2020     v0.5.0
         - bumped version only
     23 November 2019    v0.4.2
@@ -81,7 +83,7 @@ from distutils.version import StrictVersion
 from setup import ExtensionInstaller
 
 REQUIRED_VERSION = "4.0.0b1"
-RTGD_VERSION = "0.5.0"
+RTGD_VERSION = "0.5.1"
 
 
 def loader():